@@ -0,0 +1,76 @@
+"""
+Compare the old bit-by-bit SHT30 CRC check with the table driven one in
+mysht30, on frames read from the fake I2C bus in sim/machine.py.
+
+    python bench/bench_crc.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import upy
+
+upy.install()
+
+import machine
+import mysht30
+
+POLYNOMIAL = 0x131
+FRAMES = 2000
+
+
+def check_crc_bitwise(data):
+    # MySht30._check_crc as it was before the lookup table
+    crc = 0xFF
+    for b in data[:-1]:
+        crc ^= b
+        for _ in range(8, 0, -1):
+            if crc & 0x80:
+                crc = (crc << 1) ^ POLYNOMIAL
+            else:
+                crc <<= 1
+    return data[-1] == crc
+
+
+def validate_sliced(buf, count):
+    ok = 0
+    for n in range(count):
+        frame = buf[n * 6:(n + 1) * 6]
+        if check_crc_bitwise(frame[0:3]) and check_crc_bitwise(frame[3:6]):
+            ok += 1
+    return ok
+
+
+def validate_table(buf, count):
+    ok = 0
+    for n in range(count):
+        if mysht30.check_frame(buf, n * 6):
+            ok += 1
+    return ok
+
+
+def validate_batch(buf, count):
+    return sum(mysht30.check_frames(buf, count))
+
+
+def timed(name, fn, buf):
+    start = time.perf_counter()
+    ok = fn(buf, FRAMES)
+    elapsed = time.perf_counter() - start
+    print("%-14s %5d/%d valid  %7.2f us/frame" % (name, ok, FRAMES, elapsed / FRAMES * 1e6))
+
+
+if __name__ == "__main__":
+    sensor = machine.i2c_devices[0x45]
+    bus = machine.SoftI2C()
+    buf = bytearray()
+    for n in range(FRAMES):
+        sensor.temp_c = 20 + n % 80
+        sensor.corrupt = 1 if n % 100 == 0 else 0
+        buf += bus.readfrom(0x45, 6)
+    mv = memoryview(buf)
+
+    timed("bitwise+slice", validate_sliced, buf)
+    timed("table", validate_table, mv)
+    timed("check_frames", validate_batch, mv)
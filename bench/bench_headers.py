@@ -0,0 +1,152 @@
+"""
+Cost of parsing a response head, by how the headers are kept.
+
+    python bench/bench_headers.py             # CPython, through sim/
+    mpremote run bench/bench_headers.py       # on the board
+
+The head is what CouchDB sends with a _bulk_docs answer. For each
+parse_headers / capture mode of auth_urequests: time per head and the
+heap it costs. On the board that's every byte allocated while parsing
+(gc off, gc.mem_alloc() before and after); CPython frees as it goes, so
+there it's the peak. Times are the best of 5 batches. Under CPython also the gateway's client
+(gateway/httpio.py): the old line by line dict against one readuntil()
+and Headers, looking up what the client needs for the framing.
+"""
+import gc
+import os
+import sys
+import time
+
+try:
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(ROOT, "sim"))
+    import upy
+
+    upy.install()
+except (AttributeError, ImportError):
+    ROOT = None  # on the board
+
+import auth_urequests
+
+ROUNDS = 500  # per batch, the best of 5 batches counts
+
+HEAD = (
+    b"HTTP/1.1 201 Created\r\n"
+    b"Cache-Control: must-revalidate\r\n"
+    b"Content-Length: 312\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Date: Tue, 14 Nov 2023 22:13:20 GMT\r\n"
+    b'ETag: "1-9a7f3c2e51d04b6f8e0a1b2c3d4e5f60"\r\n'
+    b"Server: CouchDB/3.3.2 (Erlang OTP/24)\r\n"
+    b"X-Couch-Request-ID: 4f0c6a9e2b\r\n"
+    b"X-CouchDB-Body-Time: 0\r\n"
+    b"\r\n"
+)
+LINES = [l + b"\n" for l in HEAD.split(b"\n")[:-1]]
+
+MODES = (
+    ("dict", {"parse_headers": True}),
+    ("none", {"parse_headers": False}),
+    ("raw", {"parse_headers": auth_urequests.RAW}),
+    ("capture", {"parse_headers": True, "capture": (b"etag",)}),
+)
+
+
+class Lines:
+    """Just enough of a socket for _read_head()."""
+
+    def __init__(self):
+        self.i = 0
+
+    def readline(self):
+        line = LINES[self.i]
+        self.i += 1
+        return line
+
+
+def parse(kw):
+    resp, redirect = auth_urequests._read_head(Lines(), "POST", kw["parse_headers"], kw.get("capture"))
+    return resp
+
+
+def heap(kw):
+    try:
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        resp = parse(kw)
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used, resp
+    except AttributeError:
+        import tracemalloc
+
+        tracemalloc.start()
+        resp = parse(kw)
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return used, resp
+
+
+def device():
+    print("auth_urequests, %d header lines" % (len(LINES) - 2))
+    print("  %-8s %9s %8s  %s" % ("mode", "us/head", "bytes", "ETag"))
+    for name, kw in MODES:
+        used, resp = heap(kw)
+        us = None
+        for _ in range(5):
+            start = time.ticks_us()
+            for _ in range(ROUNDS):
+                parse(kw)
+            batch = time.ticks_diff(time.ticks_us(), start) / ROUNDS
+            if us is None or batch < us:
+                us = batch
+        headers = getattr(resp, "headers", None)
+        if headers is None:
+            etag = None
+        elif name == "dict":
+            etag = headers.get("ETag")
+        else:
+            etag = headers.get(b"etag")
+        print("  %-8s %9.1f %8d  %s" % (name, us, used, etag))
+
+
+def gateway():
+    import asyncio
+
+    sys.path.insert(0, os.path.join(ROOT, "gateway"))
+    import httpio
+
+    async def old(reader):
+        int((await reader.readline()).split()[1])
+        headers = await httpio._read_headers(reader)
+        return "content-length" in headers or "chunked" in headers.get("transfer-encoding", "")
+
+    async def new(reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        space = head.index(b" ")
+        int(head[space + 1 : space + 4])
+        headers = httpio.Headers(head)
+        return "content-length" in headers or "chunked" in headers.get("transfer-encoding", "")
+
+    async def run(read):
+        rounds = ROUNDS * 10
+        reader = asyncio.StreamReader()
+        reader.feed_data(HEAD * rounds)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            assert await read(reader)
+        return (time.perf_counter() - start) / rounds * 1000000
+
+    print("gateway/httpio.py client")
+    print("  %-22s %9.1f us/head" % ("readline + dict", asyncio.run(run(old))))
+    print("  %-22s %9.1f us/head" % ("readuntil + Headers", asyncio.run(run(new))))
+
+
+def main():
+    device()
+    if ROOT is not None:
+        gateway()
+
+
+main()
@@ -0,0 +1,68 @@
+"""
+Import cost audit: time and heap each module under py/ costs to import.
+
+    python bench/bench_imports.py              # CPython, through sim/
+    mpremote run bench/bench_imports.py        # on the board, after a reset
+
+Modules are imported leaves first, so each one is charged only for
+itself and whatever it pulls in that wasn't loaded yet. On the board
+the numbers differ a lot between .py and the precompiled .mpy files
+tools/build_mpy.py produces, run it against both.
+"""
+import gc
+import os
+import sys
+import time
+
+try:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+    import upy
+
+    upy.install()
+except (AttributeError, ImportError):
+    pass  # on the board: no os.path, and nothing to install
+
+# leaves first; the second group is only needed when a wake goes online
+ALWAYS = ("mysht30", "sensorbus", "sampler", "readinglog", "uploader", "timesource", "scheduler", "tracer", "uasyncio", "wake")
+ONLINE = ("network", "wifi", "usocket", "dnscache", "deadline", "auth_urequests", "tlscache", "async_urequests", "jsonpull")
+
+
+def heap_used():
+    gc.collect()
+    try:
+        return -gc.mem_free()
+    except AttributeError:
+        import tracemalloc
+
+        return tracemalloc.get_traced_memory()[0]
+
+
+def measure(name):
+    before = heap_used()
+    start = time.ticks_us()
+    __import__(name)
+    us = time.ticks_diff(time.ticks_us(), start)
+    return us, heap_used() - before
+
+
+def main():
+    if not hasattr(gc, "mem_free"):
+        import tracemalloc
+
+        tracemalloc.start()
+    total_us = 0
+    total_bytes = 0
+    for group, names in (("every wake", ALWAYS), ("online only", ONLINE)):
+        print(group)
+        for name in names:
+            if name in sys.modules:
+                print("  %-16s already loaded" % name)
+                continue
+            us, nbytes = measure(name)
+            total_us += us
+            total_bytes += nbytes
+            print("  %-16s %7d us %7d bytes" % (name, us, nbytes))
+    print("total            %7d us %7d bytes" % (total_us, total_bytes))
+
+
+main()
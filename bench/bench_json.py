@@ -0,0 +1,131 @@
+"""
+Compare Response.json() with the streaming Response.json(paths=...)
+(py/jsonpull.py) on bodies served by a local HTTP server.
+
+    python bench/bench_json.py
+
+For each body: peak bytes allocated while reading it (tracemalloc), the
+bytes pulled off the socket, and time per request. Bodies go out with
+Content-Length or chunked, the wanted value at the start or at the end.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import upy
+
+upy.install()
+
+import auth_urequests
+import jsonpull  # noqa: F401, imported here so its import isn't measured
+from tracer import Tracer
+
+ROUNDS = 20
+
+# what worldtimeapi.org answers, give or take
+TIME = {
+    "abbreviation": "UTC",
+    "client_ip": "203.0.113.7",
+    "datetime": "2023-11-14T22:13:20.123456+00:00",
+    "day_of_week": 2,
+    "day_of_year": 318,
+    "dst": False,
+    "dst_from": None,
+    "dst_offset": 0,
+    "dst_until": None,
+    "raw_offset": 0,
+    "timezone": "Etc/UTC",
+    "unixtime": 1700000000,
+    "utc_datetime": "2023-11-14T22:13:20.123456+00:00",
+    "utc_offset": "+00:00",
+    "week_number": 46,
+}
+
+
+def rows(n):
+    return [{"id": "r%d" % i, "key": i, "value": {"rev": "1-%032x" % i}} for i in range(n)]
+
+
+BODIES = {
+    "/time": json.dumps(TIME).encode(),
+    # the wanted value first, then lots the caller doesn't need
+    "/head": json.dumps({"unixtime": 1700000000, "rows": rows(2000)}).encode(),
+    # the wanted value last: everything has to be parsed, nothing kept
+    "/tail": json.dumps({"rows": rows(2000), "total_rows": 2000}).encode(),
+}
+PATHS = {"/time": ("unixtime",), "/head": ("unixtime",), "/tail": ("total_rows",)}
+
+
+class Server(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path, _, mode = self.path.partition("?")
+        body = BODIES[path]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        try:
+            if mode == "chunked":
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(body), 1024):
+                    piece = body[i : i + 1024]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the streaming client hung up once it had what it wanted
+
+
+def run(url, paths):
+    trace = Tracer()
+    auth_urequests.trace = trace
+    resp = auth_urequests.get(url)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    value = resp.json() if paths is None else resp.json(paths=paths)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    resp.close()
+    auth_urequests.trace = None
+    rx = trace.summary()["rx"]
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        resp = auth_urequests.get(url)
+        resp.json() if paths is None else resp.json(paths=paths)
+        resp.close()
+    elapsed = time.perf_counter() - start
+    return value, peak, rx, elapsed / ROUNDS * 1000
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Server)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % server.server_address[1]
+    print("%-14s %-8s %8s %9s %10s %9s" % ("body", "parse", "bytes", "peak", "read", "ms/req"))
+    for path in BODIES:
+        for mode in ("length", "chunked"):
+            full, full_peak, full_rx, full_ms = run(base + path + "?" + mode, None)
+            found, peak, rx, ms = run(base + path + "?" + mode, PATHS[path])
+            for name in PATHS[path]:
+                assert found[name] == full[name], (path, found, full[name])
+            label = "%s %s" % (path, mode)
+            print("%-14s %-8s %8d %9d %10d %9.2f" % (label, "json()", len(BODIES[path]), full_peak, full_rx, full_ms))
+            print("%-14s %-8s %8s %9d %10d %9.2f" % ("", "paths", "", peak, rx, ms))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
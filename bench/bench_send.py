@@ -0,0 +1,100 @@
+"""
+Compare the old one-write-per-fragment request serialization with the
+buffered _Writer path in auth_urequests, against a fake socket.
+
+    python bench/bench_send.py
+
+Reports socket writes per request, peak bytes allocated while sending
+(tracemalloc) and time per request.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import upy
+
+upy.install()
+
+import auth_urequests
+import ubinascii
+import ujson
+
+URL_PATH = "home-sensors"
+HOST = "192.168.1.101"
+AUTH = ("COUCHUSER", "COUCHPW")
+DOC = {
+    "tempF": 172.4,
+    "humRel": 12.31,
+    "dt": "2022-10-01T18:21:07.123456-07:00",
+    "loc": "sauna",
+    "deviceModel": "esp32",
+    "deviceId": "b'\\x0c\\xb8\\x15\\xc4\\xa1\\x9c'",
+    "deviceRelease": "1.19.1",
+}
+ROUNDS = 2000
+
+
+class FakeSocket:
+    def __init__(self):
+        self.writes = 0
+        self.nbytes = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.nbytes += len(data)
+        return len(data)
+
+
+def send_fragments(s, method, host, path, headers, auth, json):
+    # request serialization as it was before the send buffer
+    headers = dict(headers)
+    username, password = auth
+    formated = ("%s:%s" % (username, password)).encode()
+    formated = str(ubinascii.b2a_base64(formated)[:-1], "ascii")
+    headers["Authorization"] = "Basic {}".format(formated)
+    s.write(("%s /%s HTTP/1.0\r\n" % (method, path)).encode())
+    if not "Host" in headers:
+        s.write(("Host: %s\r\n" % host).encode())
+    for k in headers:
+        s.write(k.encode())
+        s.write(b": ")
+        s.write(headers[k].encode())
+        s.write(b"\r\n")
+    data = ujson.dumps(json)
+    s.write(b"Content-Type: application/json\r\n")
+    s.write(b"Content-Length: %d\r\n" % len(data))
+    s.write(b"Connection: close\r\n\r\n")
+    s.write(data.encode())
+
+
+def send_buffered(s, method, host, path, headers, auth, json, session):
+    auth_line = session._auth_header(auth)
+    auth_urequests._send(session._writer, s, method, host, path, headers, json=json,
+                         data=None, keep_alive=True, auth_line=auth_line)
+
+
+def run(name, fn, *args):
+    s = FakeSocket()
+    fn(s, "POST", HOST, URL_PATH, {}, AUTH, DOC, *args)  # warm up
+    s.writes = s.nbytes = 0
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    fn(s, "POST", HOST, URL_PATH, {}, AUTH, DOC, *args)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    writes = s.writes
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(s, "POST", HOST, URL_PATH, {}, AUTH, DOC, *args)
+    elapsed = time.perf_counter() - start
+    print("%-10s %3d writes/request  %5d peak bytes  %6.1f us/request" % (
+        name, writes, peak, elapsed / ROUNDS * 1e6))
+
+
+if __name__ == "__main__":
+    run("fragments", send_fragments)
+    run("buffered", send_buffered, auth_urequests.Session())
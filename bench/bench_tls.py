@@ -0,0 +1,104 @@
+"""
+https connections of auth_urequests with and without the shared SSL
+context of py/tlscache.py, against a local HTTPS server with a
+self-signed certificate.
+
+    python bench/bench_tls.py
+
+Needs the openssl command line tool for the certificate. Two ways to
+connect, ROUNDS requests each, every one on a new connection:
+
+    wrap_socket  ussl.wrap_socket() per connection, as before tlscache
+    context      one SSLContext for all of them
+
+Every handshake is a full one either way (see tlscache). For each, the
+handshakes counted, their mean ms and the mean ms per request. CPython
+does in microseconds what takes the ESP32 seconds, so the ratio is what
+to look at.
+"""
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import upy
+
+upy.install()
+
+import auth_urequests
+import tlscache
+
+ROUNDS = 50
+
+
+class Server(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{"ok":true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def self_signed(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost", "-keyout", key, "-out", cert],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def run(url, mode):
+    for name in tlscache.stats:
+        tlscache.stats[name] = 0
+    context = tlscache.context
+    if mode == "wrap_socket":
+        tlscache.context = lambda: None  # a port without SSLContext
+    tlscache._context = None
+    try:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            resp = auth_urequests.get(url)
+            assert resp.json() == {"ok": True}
+            resp.close()
+        elapsed = time.perf_counter() - start
+    finally:
+        tlscache.context = context
+        tlscache._context = None
+    return dict(tlscache.stats), elapsed / ROUNDS * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = self_signed(tmp)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Server)
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(cert, key)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "https://localhost:%d/" % server.server_address[1]
+
+        print("%-12s %5s %8s %8s" % ("connect", "full", "ms", "ms/req"))
+        for mode in ("wrap_socket", "context"):
+            stats, ms = run(url, mode)
+            print("%-12s %5d %8.2f %8.2f" % (mode, stats["full"], stats["full_ms"] / max(1, stats["full"]), ms))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Run the gateway against the in-process fake CouchDB with a crowd of
+simulated boards, and show what it batched, deduplicated, rolled up and
+served.
+
+    python gateway/demo.py
+"""
+import asyncio
+import json
+import random
+
+import httpio
+from fakecouch import FakeCouch
+from gateway import Gateway
+
+DEVICES = 20
+READINGS = 3
+
+
+def reading(device, n):
+    return {
+        "_id": "%s-%d-0" % (device, 1700000000 + n * 60),
+        "tempF": round(random.uniform(60, 190), 2),
+        "humRel": round(random.uniform(10, 40), 2),
+        "dt": "2023-11-14T22:%02d:00.000000Z" % n,
+        "loc": "sauna",
+        "deviceId": device,
+    }
+
+
+async def board(url, device):
+    # one wake per reading, each posting a _bulk_docs batch of one
+    for n in range(READINGS):
+        await asyncio.sleep(random.uniform(0, 0.3))
+        status, headers, body = await httpio.request("POST", url + "/home-sensors/_bulk_docs", {"docs": [reading(device, n)]})
+        assert status == 201, (status, body)
+
+
+async def main():
+    random.seed(1)
+    couch = await FakeCouch(users={"admin": "admin"}).start()
+    gateway = await Gateway(couch.url.replace("http://", "http://admin:admin@"), batch_ms=100).start()
+    url = "http://127.0.0.1:%d" % gateway.port
+
+    devices = ["dev%02d" % i for i in range(DEVICES)]
+    await asyncio.gather(*[board(url, d) for d in devices])
+    writes = sum(1 for method, path in couch.requests if path.endswith("_bulk_docs"))
+    print("%d readings from %d boards -> %d _bulk_docs writes" % (DEVICES * READINGS, DEVICES, writes))
+
+    # a board whose response got lost posts the same batch again
+    random.seed(1)
+    await board(url, devices[0])
+    print("after a retried batch: %d docs stored, stats %s" % (len(couch.dbs["home-sensors"].docs), gateway.stats))
+
+    # readings without an _id are keyed on deviceId + dt + loc
+    doc = {"tempF": 150.1, "humRel": 12.0, "dt": "2023-11-14T23:00:00.000000Z", "loc": "sauna", "deviceId": "dev00"}
+    for _ in range(2):
+        status, headers, body = await httpio.request("POST", url + "/home-sensors", dict(doc))
+        print("POST without _id:", status, json.loads(body))
+
+    status, headers, body = await httpio.request("GET", url + "/latest")
+    etag = headers["etag"]
+    print("GET /latest: %d, %d devices, %d bytes, ETag %s" % (status, len(json.loads(body)["devices"]), len(body), etag))
+    status, headers, body = await httpio.request("GET", url + "/latest", headers={"If-None-Match": etag})
+    print("poll with If-None-Match: %d, %d bytes" % (status, len(body)))
+    await httpio.request("POST", url + "/home-sensors/_bulk_docs", {"docs": [reading("dev05", 9)]})
+    status, headers, body = await httpio.request("GET", url + "/latest", headers={"If-None-Match": etag})
+    print("after dev05 reported: %d, ETag %s" % (status, headers["etag"]))
+    # a second zone of the same board shows up next to the first
+    changing = dict(reading("dev05", 9), _id="dev05-changing-0", loc="changing", dt="2023-11-14T22:08:00.000000Z")
+    await httpio.request("POST", url + "/home-sensors/_bulk_docs", {"docs": [changing]})
+    status, headers, body = await httpio.request("GET", url + "/latest/dev05")
+    print("GET /latest/dev05:", status, {loc: doc["dt"] for loc, doc in json.loads(body).items()})
+    status, headers, body = await httpio.request("GET", url + "/latest/dev05?loc=changing")
+    print("GET /latest/dev05?loc=changing:", status, json.loads(body)["dt"])
+
+    await gateway.rollup.run()
+    status, headers, body = await httpio.request("GET", url + "/history/dev00?start=1699999200&end=1700006400&points=200")
+    history = json.loads(body)
+    print("GET /history/dev00: %d, step %ds, %d buckets, tempF max %s" % (status, history["step"], len(history["t"]), history["tempF"]["max"]))
+
+    await gateway.stop()
+    await couch.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
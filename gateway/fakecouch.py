@@ -0,0 +1,182 @@
+"""
+In-process fake CouchDB for running the gateway (and anything else that
+talks to home-sensors) without a real server.
+
+    couch = FakeCouch(users={"admin": "admin"})
+    await couch.start()                 # couch.url: http://127.0.0.1:<port>
+    ...
+    couch.dbs["home-sensors"].docs      # id -> stored doc
+
+Covers the subset of the API this repo uses: database create/info,
+POST of a single doc, _bulk_docs with conflict detection, GET/PUT of a
+doc (including _local docs) with revision checks, _all_docs (optionally
+for a list of keys) and the normal _changes feed with since / limit /
+include_docs. Sequences are opaque strings like CouchDB 2+'s. Set
+fail_next to answer the next N requests with a 500.
+"""
+import asyncio
+import base64
+import uuid
+
+from httpio import HTTPError, Response, serve
+
+
+class Database:
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}  # id -> doc with _id and _rev
+        self.local = {}  # _local docs, not in the changes feed
+        self.seq = 0
+        self.changes = []  # (seq, id) of the latest change per doc, in order
+
+    def _seq(self):
+        return "%d-fake" % self.seq
+
+    def put(self, doc, store=None):
+        """Store doc, returns the result row _bulk_docs would give for it."""
+        store = self.docs if store is None else store
+        doc_id = doc.get("_id") or uuid.uuid4().hex
+        current = store.get(doc_id)
+        if current is not None and doc.get("_rev") != current["_rev"]:
+            return {"id": doc_id, "error": "conflict", "reason": "Document update conflict."}
+        if current is None and doc.get("_rev"):
+            return {"id": doc_id, "error": "not_found", "reason": "missing"}
+        generation = int(current["_rev"].split("-", 1)[0]) + 1 if current else 1
+        doc = dict(doc)
+        doc["_id"] = doc_id
+        doc["_rev"] = "%d-%s" % (generation, uuid.uuid4().hex)
+        store[doc_id] = doc
+        if store is self.docs:
+            self.seq += 1
+            self.changes = [c for c in self.changes if c[1] != doc_id]
+            self.changes.append((self.seq, doc_id))
+        return {"ok": True, "id": doc_id, "rev": doc["_rev"]}
+
+    def all_docs(self, keys=None, include_docs=False):
+        rows = []
+        for key in sorted(self.docs) if keys is None else keys:
+            doc = self.docs.get(key)
+            if doc is None:
+                rows.append({"key": key, "error": "not_found"})
+                continue
+            row = {"id": key, "key": key, "value": {"rev": doc["_rev"]}}
+            if include_docs:
+                row["doc"] = doc
+            rows.append(row)
+        return {"total_rows": len(self.docs), "offset": 0, "rows": rows}
+
+    def changes_since(self, since, limit=None, include_docs=False):
+        since = int(str(since).split("-", 1)[0]) if since not in (None, "", "0") else 0
+        rows = []
+        last = since
+        for seq, doc_id in self.changes:
+            if seq <= since:
+                continue
+            if limit is not None and len(rows) >= limit:
+                break
+            doc = self.docs[doc_id]
+            row = {"seq": "%d-fake" % seq, "id": doc_id, "changes": [{"rev": doc["_rev"]}]}
+            if include_docs:
+                row["doc"] = doc
+            rows.append(row)
+            last = seq
+        pending = sum(1 for seq, doc_id in self.changes if seq > last)
+        return {"results": rows, "last_seq": "%d-fake" % last, "pending": pending}
+
+
+class FakeCouch:
+    def __init__(self, users=None, dbs=("home-sensors",)):
+        self.users = users  # {name: password}, None to skip auth
+        self.dbs = {}
+        for name in dbs:
+            self.dbs[name] = Database(name)
+        self.requests = []  # (method, path) of every request, for checking batching
+        self.fail_next = 0
+        self.delay = 0.0  # seconds added to every request, like a busy disk
+        self.server = None
+        self.url = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await serve(self.handle, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = "http://%s:%d" % (host, port)
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _check_auth(self, req):
+        if self.users is None:
+            return
+        scheme, _, token = req.headers.get("authorization", "").partition(" ")
+        if scheme == "Basic":
+            name, _, password = base64.b64decode(token).decode().partition(":")
+            if self.users.get(name) == password:
+                return
+        raise HTTPError(401, "Name or password is incorrect.")
+
+    def _db(self, name):
+        try:
+            return self.dbs[name]
+        except KeyError:
+            raise HTTPError(404, "Database does not exist.")
+
+    async def handle(self, req):
+        self.requests.append((req.method, req.path))
+        self._check_auth(req)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail_next:
+            self.fail_next -= 1
+            raise HTTPError(500, "injected failure")
+        parts = [p for p in req.path.split("/") if p]
+        if not parts:
+            return Response(200, {"couchdb": "Welcome", "version": "fake"})
+        name, rest = parts[0], parts[1:]
+        if not rest:
+            if req.method == "PUT":
+                if name in self.dbs:
+                    return Response(412, {"error": "file_exists"})
+                self.dbs[name] = Database(name)
+                return Response(201, {"ok": True})
+            db = self._db(name)
+            if req.method == "GET":
+                return Response(200, {"db_name": name, "doc_count": len(db.docs), "update_seq": db._seq()})
+            if req.method == "POST":
+                result = db.put(req.json())
+                if "error" in result:
+                    return Response(409, result)
+                return Response(201, result)
+            raise HTTPError(405)
+        db = self._db(name)
+        if rest == ["_bulk_docs"] and req.method == "POST":
+            docs = req.json().get("docs", [])
+            return Response(201, [db.put(doc) for doc in docs])
+        if rest == ["_all_docs"] and req.method in ("GET", "POST"):
+            keys = req.json().get("keys") if req.method == "POST" else None
+            return Response(200, db.all_docs(keys, req.query.get("include_docs") == "true"))
+        if rest == ["_changes"] and req.method in ("GET", "POST"):
+            limit = req.query.get("limit")
+            include_docs = req.query.get("include_docs") == "true"
+            return Response(200, db.changes_since(req.query.get("since"), limit and int(limit), include_docs))
+        store = db.docs
+        if rest[0] == "_local" and len(rest) == 2:
+            store = db.local
+            doc_id = "_local/" + rest[1]
+        elif len(rest) == 1:
+            doc_id = rest[0]
+        else:
+            raise HTTPError(404)
+        if req.method == "GET":
+            if doc_id not in store:
+                raise HTTPError(404, "missing")
+            return Response(200, store[doc_id])
+        if req.method == "PUT":
+            doc = req.json()
+            doc["_id"] = doc_id
+            result = db.put(doc, store)
+            if "error" in result:
+                return Response(409, result)
+            return Response(201, result)
+        raise HTTPError(405)
@@ -0,0 +1,260 @@
+"""
+Just enough HTTP/1.1 on asyncio streams for the gateway and the fake
+CouchDB: a keep-alive server that hands parsed requests to a handler,
+and a one-shot client for talking to CouchDB. Standard library only.
+
+    async def handler(req):
+        return Response(200, {"ok": True})
+
+    server = await serve(handler, "0.0.0.0", 8080)
+
+Request bodies may be sent with Content-Length or chunked, the way the
+boards' BulkUploader streams _bulk_docs.
+"""
+import asyncio
+import base64
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    202: "Accepted",
+    304: "Not Modified",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    412: "Precondition Failed",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+MAX_BODY = 4 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, reason=""):
+        super().__init__(reason or REASONS.get(status, ""))
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # lowercased names
+        self.body = body
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "invalid JSON")
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class Response:
+    def __init__(self, status=200, body=None, headers=None):
+        self.status = status
+        self.headers = dict(headers or {})
+        if body is None:
+            body = b""
+        elif not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body, separators=(",", ":")).encode()
+            self.headers.setdefault("Content-Type", "application/json")
+        self.body = body
+
+
+class Headers:
+    """
+    Headers of a response to request(), kept as the bytes of the head they
+    came in. A lookup (any case) searches a lowercased copy, made the first
+    time; nothing is decoded or split for the headers nobody asks for.
+    """
+
+    def __init__(self, head):
+        self.head = head  # status line and headers, up to the blank line
+        self._lower = None
+
+    def _value(self, name):
+        lower = self._lower
+        if lower is None:
+            lower = self._lower = self.head.lower()
+        key = b"\n" + name.lower().encode("latin-1") + b":"
+        i = lower.find(key)
+        if i < 0:
+            return None
+        start = i + len(key)
+        return self.head[start : lower.index(b"\n", start)].strip().decode("latin-1")
+
+    def get(self, name, default=None):
+        value = self._value(name)
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        value = self._value(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self._value(name) is not None
+
+    def items(self):
+        for line in self.head.split(b"\r\n")[1:]:
+            name, sep, value = line.decode("latin-1").partition(":")
+            if sep:
+                yield name.strip().lower(), value.strip()
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed in headers")
+        if line in (b"\r\n", b"\n"):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_body(reader, headers):
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0], 16)
+            if not size:
+                await _read_headers(reader)  # trailers up to the blank line
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+            if len(body) > MAX_BODY:
+                raise HTTPError(400, "body too large")
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise HTTPError(400, "body too large")
+    return await reader.readexactly(length) if length else b""
+
+
+async def read_request(reader):
+    """Next request on the connection, or None once the client hung up."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "bad request line")
+    headers = await _read_headers(reader)
+    body = await _read_body(reader, headers)
+    return Request(method, target, version, headers, body)
+
+
+def write_response(writer, resp, keep_alive):
+    head = ["HTTP/1.1 %d %s" % (resp.status, REASONS.get(resp.status, ""))]
+    for name, value in resp.headers.items():
+        head.append("%s: %s" % (name, value))
+    head.append("Content-Length: %d" % len(resp.body))
+    head.append("Connection: %s" % ("keep-alive" if keep_alive else "close"))
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + resp.body)
+
+
+async def serve(handler, host="127.0.0.1", port=0):
+    """
+    Start a server calling await handler(request) -> Response for every
+    request. HTTPError raised by the handler becomes that status; any other
+    exception is logged and answered with 502 when it's the network's
+    (whatever the handler asked upstream failed) and 500 otherwise.
+    """
+
+    async def connection(reader, writer):
+        try:
+            while True:
+                try:
+                    req = await read_request(reader)
+                except HTTPError as e:
+                    write_response(writer, Response(e.status, {"error": str(e)}), False)
+                    break
+                if req is None:
+                    break
+                try:
+                    resp = await handler(req)
+                except HTTPError as e:
+                    resp = Response(e.status, {"error": REASONS.get(e.status, "error"), "reason": str(e)})
+                except Exception as e:
+                    status = 502 if isinstance(e, (OSError, EOFError, asyncio.TimeoutError)) else 500
+                    print("%s %s: %d, %r" % (req.method, req.target, status, e))
+                    resp = Response(status, {"error": REASONS[status], "reason": str(e) or type(e).__name__})
+                write_response(writer, resp, req.keep_alive)
+                await writer.drain()
+                if not req.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(connection, host, port)
+
+
+def basic_auth(username, password):
+    token = base64.b64encode(("%s:%s" % (username, password)).encode()).decode()
+    return "Basic " + token
+
+
+async def request(method, url, body=None, headers=None, timeout=10):
+    """
+    One request on its own connection. Returns (status, Headers, body
+    bytes); a dict or list body is sent as JSON.
+    """
+    parts = urlsplit(url)
+    headers = dict(headers or {})
+    if parts.username:
+        headers["Authorization"] = basic_auth(parts.username, parts.password or "")
+    if body is not None and not isinstance(body, (bytes, bytearray)):
+        body = json.dumps(body, separators=(",", ":")).encode()
+        headers.setdefault("Content-Type", "application/json")
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            head = ["%s %s HTTP/1.1" % (method, target), "Host: %s" % parts.netloc.rpartition("@")[2]]
+            for name, value in headers.items():
+                head.append("%s: %s" % (name, value))
+            head.append("Content-Length: %d" % len(body or b""))
+            head.append("Connection: close")
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (body or b""))
+            await writer.drain()
+            # the whole head in one read, headers are only parsed when looked up
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                raise ConnectionError("connection closed in headers")
+            space = head.index(b" ")
+            status = int(head[space + 1 : space + 4])
+            resp_headers = Headers(head)
+            if "content-length" in resp_headers or "chunked" in resp_headers.get("transfer-encoding", ""):
+                resp_body = await _read_body(reader, resp_headers)
+            else:
+                resp_body = await reader.read()
+            return status, resp_headers, resp_body
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
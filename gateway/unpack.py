@@ -0,0 +1,119 @@
+"""
+Gateway side of the boards' packed upload format (py/packed.py).
+
+A board registers its device fields once at POST /<db>/_device and gets
+a token; its uploads to /<db>/_packed carry that token instead of the
+fields. decode() turns an upload back into the docs BulkUploader would
+have sent, and Registry keeps the tokens in a _local doc in the
+database, so they outlive gateway restarts.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+
+import httpio
+from httpio import HTTPError
+
+VERSION = 1
+HEADER = "<BH"
+KIND_READING = 1
+KIND_REPLAY = 2
+KIND_JSON = 3
+READING = "<IhHhhH"
+REPLAY = "<IhHB"
+DEVICE_FIELDS = ("deviceId", "deviceModel", "deviceRelease", "loc")
+
+
+def _dt(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+
+def decode(body):
+    """(token, docs) of a packed upload, ValueError if it's malformed."""
+    try:
+        version, token = struct.unpack_from(HEADER, body, 0)
+        if version != VERSION:
+            raise ValueError("unknown packed format version %d" % version)
+        offset = struct.calcsize(HEADER)
+        docs = []
+        while offset < len(body):
+            kind = body[offset]
+            offset += 1
+            if kind == KIND_READING:
+                dt, temp, hum, temp_min, temp_max, samples = struct.unpack_from(READING, body, offset)
+                offset += struct.calcsize(READING)
+                docs.append({
+                    "tempF": temp / 100,
+                    "humRel": hum / 100,
+                    "tempMinF": temp_min / 100,
+                    "tempMaxF": temp_max / 100,
+                    "samples": samples,
+                    "dt": _dt(dt),
+                })
+            elif kind == KIND_REPLAY:
+                dt, temp, hum, flags = struct.unpack_from(REPLAY, body, offset)
+                offset += struct.calcsize(REPLAY)
+                docs.append({"tempF": temp / 100, "humRel": hum / 100, "dt": _dt(dt), "backlogFlags": flags})
+            elif kind == KIND_JSON:
+                (length,) = struct.unpack_from("<H", body, offset)
+                offset += 2
+                if offset + length > len(body):
+                    raise ValueError("truncated record")
+                doc = json.loads(body[offset : offset + length])
+                if not isinstance(doc, dict):
+                    raise ValueError("JSON record isn't an object")
+                docs.append(doc)
+                offset += length
+            else:
+                raise ValueError("unknown record kind %d" % kind)
+    except struct.error as e:
+        raise ValueError("truncated upload: %s" % e)
+    return token, docs
+
+
+class Registry:
+    """Device fields by token, stored in <db>/_local/gateway-devices."""
+
+    def __init__(self, couch_url, db):
+        self.url = "%s/%s/_local/gateway-devices" % (couch_url.rstrip("/"), db)
+        self._doc = None  # {"devices": [fields of token 1, token 2, ...], "_rev": ...}
+
+    async def _load(self):
+        status, headers, body = await httpio.request("GET", self.url)
+        if status == 200:
+            self._doc = json.loads(body)
+        elif status == 404:
+            self._doc = {"devices": []}
+        else:
+            raise HTTPError(502, "reading the device registry: CouchDB answered %d" % status)
+
+    async def device(self, token):
+        """The fields registered for token, or None."""
+        if self._doc is None or not 0 < token <= len(self._doc["devices"]):
+            # another gateway may have handed it out since
+            await self._load()
+        if 0 < token <= len(self._doc["devices"]):
+            return self._doc["devices"][token - 1]
+        return None
+
+    async def register(self, fields):
+        """Token for a board's device fields, the same one each time it asks."""
+        if not isinstance(fields, dict) or not isinstance(fields.get("deviceId"), str):
+            raise HTTPError(400, "expected the device fields, with a deviceId")
+        fields = {name: fields[name] for name in DEVICE_FIELDS if name in fields}
+        if self._doc is None:
+            await self._load()
+        for _ in range(3):
+            devices = self._doc["devices"]
+            if fields in devices:
+                return devices.index(fields) + 1
+            if len(devices) >= 0xFFFF:
+                raise HTTPError(502, "device registry is full")
+            devices.append(fields)
+            status, headers, body = await httpio.request("PUT", self.url, self._doc)
+            if status in (200, 201):
+                self._doc["_rev"] = json.loads(body)["rev"]
+                return len(devices)
+            # a conflict: someone else registered a device, start from theirs
+            await self._load()
+        raise HTTPError(502, "couldn't update the device registry")
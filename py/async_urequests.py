@@ -0,0 +1,256 @@
+"""
+Non-blocking counterpart of auth_urequests for use inside uasyncio tasks.
+
+Requests go out and responses come back through uasyncio streams, so
+other tasks (the sensor burst, WiFi polling, LED blinks) keep running
+while a request waits on the network. Request assembly and response
+header parsing are shared with auth_urequests. A chunked request body
+is drained to the socket chunk by chunk, so a streamed upload never
+piles up in the stream's output buffer.
+
+    resp = await async_urequests.post(url, json=doc, auth=("user", "pw"))
+    print(resp.status_code, await resp.json())
+
+The body can also be read incrementally with await resp.read(n). One
+connection per request (HTTP/1.0, Connection: close) and plain http
+only, uasyncio streams can't do TLS on every port. timeout, retry,
+parse_headers and capture work as for auth_urequests.request().
+"""
+import uasyncio as asyncio
+import dnscache
+import deadline
+from auth_urequests import _split_url, _auth_line, _is_chunked, _encode_body, _add_head, _Head, _Writer
+
+# a tracer.Tracer counting the bytes of every request, see auth_urequests.trace
+trace = None
+
+
+async def _within(aw, end):
+    """await aw, raising OSError(ETIMEDOUT) if it's not done by end (ticks_ms)."""
+    if end is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, deadline.left_ms(end) / 1000)
+    except asyncio.TimeoutError:
+        raise OSError(deadline.ETIMEDOUT)
+
+
+class AsyncResponse:
+    def __init__(self, reader, writer, end=None):
+        self.raw = reader
+        self._stream_writer = writer
+        self._end = end  # reading the body is held to the request's deadline
+        self.encoding = "utf-8"
+        # set from the response headers, see auth_urequests.Response
+        self._remaining = None
+        self._chunked = False
+        self._keep_alive = False
+
+    def close(self):
+        if self._stream_writer is not None:
+            self._stream_writer.close()
+            self._stream_writer = None
+        self.raw = None
+
+    async def _next_chunk(self):
+        n = int((await _within(self.raw.readline(), self._end)).split(b";", 1)[0], 16)
+        if not n:
+            # last chunk: skip trailers up to the closing blank line
+            while True:
+                l = await _within(self.raw.readline(), self._end)
+                if not l or l == b"\r\n":
+                    break
+        return n
+
+    async def read(self, n=-1):
+        """
+        Read up to n bytes of the body, or all that's left with n=-1,
+        decoding chunked transfer encoding on the way. Returns b"" once
+        the body is exhausted.
+        """
+        if n < 0:
+            body = bytearray()
+            while True:
+                data = await self.read(512)
+                if not data:
+                    return bytes(body)
+                body.extend(data)
+        if self.raw is None:
+            return b""
+        try:
+            if self._chunked and not self._remaining:
+                self._remaining = await self._next_chunk()
+            if self._remaining is not None:
+                if not self._remaining:
+                    self.close()
+                    return b""
+                n = min(n, self._remaining)
+            data = await _within(self.raw.read(n), self._end)
+            if not data:
+                if self._remaining is not None:
+                    raise ValueError("HTTP error: truncated body")
+                # connection closed by the server, that's the end of the body
+                self.close()
+                return b""
+            if self._remaining is not None:
+                self._remaining -= len(data)
+                if not self._remaining and self._chunked:
+                    await _within(self.raw.readline(), self._end)  # CRLF after the chunk data
+            return data
+        except Exception:
+            self.close()
+            raise
+
+    async def text(self):
+        return str(await self.read(), self.encoding)
+
+    async def json(self, paths=None):
+        if paths is not None:
+            import jsonpull
+
+            return await jsonpull.select_async(self, paths)
+        import ujson
+
+        return ujson.loads(await self.read())
+
+
+async def _send(w, writer, method, host, path, headers, data, json, auth_line, end):
+    chunked_data = _is_chunked(data)
+    data = _encode_body(data, json)
+
+    w.s = writer
+    _add_head(w, method, host, path, headers, data, json, chunked_data, False, auth_line)
+    if data and not chunked_data:
+        w.add(data)
+    w.flush()
+    await _within(writer.drain(), end)
+    if data and chunked_data:
+        for chunk in data:
+            if not chunk:
+                # a zero length chunk would end the body early
+                continue
+            w.add(b"%x\r\n" % len(chunk))
+            w.add(chunk)
+            w.add(b"\r\n")
+            w.flush()
+            await _within(writer.drain(), end)
+        w.add(b"0\r\n\r\n")
+        w.flush()
+        await _within(writer.drain(), end)
+    w.s = None
+
+
+async def _open(host, port, end):
+    if end is not None:
+        deadline.left_ms(end)
+    addr = dnscache.getaddrinfo(host, port)[0][-1]
+    try:
+        reader, writer = await _within(asyncio.open_connection(addr[0], addr[1]), end)
+    except OSError:
+        # the cached address may be stale, resolve again next time
+        dnscache.forget(host, port)
+        raise
+    if trace is not None:
+        reader, writer = trace.streams(reader, writer)
+    return reader, writer
+
+
+async def _exchange(reader, writer, method, host, path, headers, data, json, auth_line, parse_headers, capture, end):
+    """Send the request, return the AsyncResponse and the head it came with."""
+    resp = AsyncResponse(reader, writer, end)
+    try:
+        # a writer per request: concurrent requests mustn't share a buffer
+        await _send(_Writer(256), writer, method, host, path, headers, data, json, auth_line, end)
+        head = _Head(method, parse_headers, capture)
+        while not head.feed(await _within(reader.readline(), end)):
+            pass
+    except Exception:
+        resp.close()
+        raise
+    return head.apply(resp), head
+
+
+async def request(
+    method,
+    url,
+    data=None,
+    json=None,
+    headers={},
+    auth=None,
+    timeout=None,
+    parse_headers=True,
+    retry=None,
+    idempotent=None,
+    capture=None,
+):
+    """
+    Send a request and return an AsyncResponse once its headers are in.
+    timeout (seconds) covers everything, reading the body included.
+    """
+    proto, host, port, path = _split_url(url)
+    if proto != "http:":
+        raise ValueError("Unsupported protocol: " + proto)
+    auth_line = _auth_line(auth) if auth is not None else None
+
+    end = deadline.until(timeout)
+    attempt = 0
+    while True:
+        body = data() if callable(data) else data
+        sent = False
+        try:
+            reader, writer = await _open(host, port, end)
+            sent = True
+            resp, head = await _exchange(
+                reader, writer, method, host, path, headers, body, json, auth_line, parse_headers, capture, end
+            )
+        except (OSError, ValueError):
+            ms = None if retry is None else retry.backoff_ms(attempt, method, sent, idempotent, end)
+            if ms is None:
+                raise
+            await asyncio.sleep_ms(ms)
+            attempt += 1
+            continue
+        if retry is not None and resp.status_code in retry.statuses:
+            ms = retry.backoff_ms(attempt, method, True, idempotent, end)
+            if ms is not None:
+                resp.close()
+                await asyncio.sleep_ms(ms)
+                attempt += 1
+                continue
+        break
+
+    if head.redirect:
+        resp.close()
+        left = None if end is None else deadline.left_ms(end) / 1000
+        if resp.status_code in [301, 302, 303]:
+            return await request(
+                "GET", head.redirect, None, None, headers, auth, left, parse_headers, retry, None, capture
+            )
+        return await request(
+            method, head.redirect, data, json, headers, auth, left, parse_headers, retry, idempotent, capture
+        )
+    return resp
+
+
+def head(url, **kw):
+    return request("HEAD", url, **kw)
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def put(url, **kw):
+    return request("PUT", url, **kw)
+
+
+def patch(url, **kw):
+    return request("PATCH", url, **kw)
+
+
+def delete(url, **kw):
+    return request("DELETE", url, **kw)
@@ -1,62 +1,177 @@
-
-
 import usocket
+import time
+import dnscache
+import deadline
+
+# a tracer.Tracer to count the bytes every new connection sends and
+# receives; None (the default) leaves sockets unwrapped
+trace = None
 
 
 class Response:
-    def __init__(self, f):
+    def __init__(self, f, session=None, key=None):
         self.raw = f
         self.encoding = "utf-8"
         self._cached = None
+        # set from the response headers: bytes left in the body, or in the
+        # current chunk when _chunked; None when the body runs until close
+        self._remaining = None
+        self._chunked = False
+        self._keep_alive = False
+        # pool to hand the socket back to once the body has been read
+        self._session = session
+        self._key = key
 
     def close(self):
-        if self.raw:
-            self.raw.close()
-            self.raw = None
+        s = self.raw
+        self.raw = None
         self._cached = None
+        if s is not None:
+            if self._session is not None:
+                self._session._returned(s)
+            s.close()
+
+    def _release(self):
+        s = self.raw
+        self.raw = None
+        if s is None:
+            return
+        if self._session is not None:
+            self._session._returned(s)
+            if self._keep_alive:
+                self._session._checkin(self._key, s)
+                return
+        s.close()
+
+    def _read_exact(self, n):
+        data = self.raw.read(n)
+        if len(data) != n:
+            raise ValueError("HTTP error: truncated body")
+        return data
+
+    def _next_chunk(self):
+        n = int(self.raw.readline().split(b";", 1)[0], 16)
+        if not n:
+            # last chunk: skip trailers up to the closing blank line
+            while True:
+                l = self.raw.readline()
+                if not l or l == b"\r\n":
+                    break
+        return n
+
+    def readinto(self, buf, nbytes=None):
+        """
+        Read up to len(buf) (or nbytes) bytes of the body into buf, decoding
+        chunked transfer encoding on the way. Returns the number of bytes
+        read, 0 once the body is exhausted.
+        """
+        if self.raw is None:
+            return 0
+        n = len(buf) if nbytes is None else nbytes
+        try:
+            if self._chunked and not self._remaining:
+                self._remaining = self._next_chunk()
+            if self._remaining is not None:
+                if not self._remaining:
+                    self._release()
+                    return 0
+                n = min(n, self._remaining)
+            if not n:
+                return 0
+            got = self.raw.readinto(buf, n)
+            if not got:
+                if self._remaining is not None:
+                    raise ValueError("HTTP error: truncated body")
+                # connection closed by the server, that's the end of the body
+                self._release()
+                return 0
+            if self._remaining is not None:
+                self._remaining -= got
+                if not self._remaining:
+                    if self._chunked:
+                        self.raw.readline()  # CRLF after the chunk data
+                    else:
+                        self._release()
+            return got
+        except Exception:
+            self._keep_alive = False
+            self.close()
+            raise
+
+    def iter_content(self, chunk_size=256):
+        """Yield the body in pieces of at most chunk_size bytes."""
+        buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                break
+            yield bytes(mv[:n])
+
+    def iter_lines(self, chunk_size=256, delimiter=b"\n"):
+        """
+        Yield the body line by line, without the delimiter. Only the
+        current line is held in memory, so e.g. a CouchDB _changes feed can
+        be processed one row at a time.
+        """
+        pending = b""
+        for chunk in self.iter_content(chunk_size):
+            pending += chunk
+            start = 0
+            while True:
+                i = pending.find(delimiter, start)
+                if i < 0:
+                    break
+                yield pending[start:i]
+                start = i + len(delimiter)
+            pending = pending[start:]
+        if pending:
+            yield pending
 
     @property
     def content(self):
         if self._cached is None:
+            if self.raw is None:
+                # read to the end through readinto() already, or closed
+                return b""
+            if self._chunked:
+                body = bytearray()
+                for chunk in self.iter_content(512):
+                    body.extend(chunk)
+                self._cached = bytes(body)
+                return self._cached
             try:
-                self._cached = self.raw.read()
+                if self._remaining is None:
+                    self._cached = self.raw.read()
+                else:
+                    self._cached = self._read_exact(self._remaining)
+                    self._remaining = 0
+            except Exception:
+                self._keep_alive = False
+                raise
             finally:
-                self.raw.close()
-                self.raw = None
+                self._release()
         return self._cached
 
     @property
     def text(self):
         return str(self.content, self.encoding)
 
-    def json(self):
+    def json(self, paths=None):
+        """
+        The decoded body, or with paths (see jsonpull) just the values at
+        those paths, parsed as the body streams in.
+        """
+        if paths is not None:
+            import jsonpull
+
+            return jsonpull.select(self, paths)
         import ujson
 
         return ujson.loads(self.content)
 
 
-def request(
-    method,
-    url,
-    data=None,
-    json=None,
-    headers={},
-    stream=None,
-    auth=None,
-    timeout=None,
-    parse_headers=True,
-):
-    redirect = None  # redirection url, None means no redirection
-    chunked_data = data and getattr(data, "__iter__", None) and not getattr(data, "__len__", None)
-
-    if auth is not None:
-        import ubinascii
-
-        username, password = auth
-        formated = b"{}:{}".format(username, password)
-        formated = str(ubinascii.b2a_base64(formated)[:-1], "ascii")
-        headers["Authorization"] = "Basic {}".format(formated)
-
+def _split_url(url):
     try:
         proto, dummy, host, path = url.split("/", 3)
     except ValueError:
@@ -65,8 +180,6 @@ def request(
     if proto == "http:":
         port = 80
     elif proto == "https:":
-        import ussl
-
         port = 443
     else:
         raise ValueError("Unsupported protocol: " + proto)
@@ -74,106 +187,709 @@ def request(
     if ":" in host:
         host, port = host.split(":", 1)
         port = int(port)
+    return proto, host, port, path
 
-    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
-    ai = ai[0]
 
-    resp_d = None
-    if parse_headers is not False:
-        resp_d = {}
+def _auth_line(auth):
+    """Complete Authorization header line for a (username, password) pair."""
+    import ubinascii
 
-    s = usocket.socket(ai[0], usocket.SOCK_STREAM, ai[2])
+    username, password = auth
+    formated = ("%s:%s" % (username, password)).encode()
+    return b"Authorization: Basic " + ubinascii.b2a_base64(formated)[:-1] + b"\r\n"
 
-    if timeout is not None:
-        # Note: settimeout is not supported on all platforms, will raise
-        # an AttributeError if not available.
-        s.settimeout(timeout)
+
+def _is_chunked(data):
+    return data and getattr(data, "__iter__", None) and not getattr(data, "__len__", None)
+
+
+def _can_repeat(method, data, idempotent):
+    """True if the request may be sent again: safe to repeat (see deadline.Retry) and a body that can be."""
+    if idempotent is None:
+        idempotent = method in deadline.IDEMPOTENT
+    return idempotent and (callable(data) or not _is_chunked(data))
+
+
+class _Timed:
+    """
+    Socket wrapper holding every operation to a deadline (ticks_ms, set
+    with until()). Each call gets what's left as the socket timeout and
+    reads come off recv() a buffer at a time, so a server dripping one
+    byte after the other can't stretch a readline() past the deadline.
+    Sockets without recv() (TLS) are timed per call instead. Without a
+    deadline the calls go straight through.
+    """
+
+    def __init__(self, s, end=None):
+        self._s = s
+        self._recv = getattr(s, "recv", None)
+        self._buf = b""
+        self._end = None
+        self.until(end)
+
+    def until(self, end):
+        if end is None and self._end is not None:
+            self._s.settimeout(None)
+        self._end = end
+
+    def _arm(self):
+        if self._end is not None:
+            self._s.settimeout(deadline.left_ms(self._end) / 1000)
+
+    def _more(self):
+        self._arm()
+        return self._recv(512)
+
+    def _timed(self):
+        return self._end is not None and self._recv is not None
+
+    def write(self, data):
+        self._arm()
+        return self._s.write(data)
+
+    def readline(self):
+        if not self._timed() and not self._buf:
+            self._arm()
+            return self._s.readline()
+        buf = self._buf
+        start = 0
+        while True:
+            i = buf.find(b"\n", start)
+            if i >= 0:
+                self._buf = buf[i + 1 :]
+                return buf[: i + 1]
+            start = len(buf)
+            data = self._more() if self._timed() else self._s.readline()
+            if not data:
+                self._buf = b""
+                return buf
+            buf += data
+
+    def read(self, n=-1):
+        if not self._timed() and not self._buf:
+            self._arm()
+            return self._s.read(n)
+        buf = self._buf
+        while n < 0 or len(buf) < n:
+            data = self._more() if self._timed() else self._s.read(-1 if n < 0 else n - len(buf))
+            if not data:
+                break
+            buf += data
+        if n < 0:
+            n = len(buf)
+        self._buf = buf[n:]
+        return buf[:n]
+
+    def readinto(self, buf, nbytes=None):
+        n = len(buf) if nbytes is None else nbytes
+        if not self._buf:
+            if not self._timed():
+                self._arm()
+                return self._s.readinto(buf, n)
+            self._buf = self._more()
+        # one recv at most: a short read is fine, readinto callers loop
+        data = self._buf[:n]
+        self._buf = self._buf[n:]
+        buf[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._buf = b""
+        self._s.close()
+
+    def __getattr__(self, name):
+        return getattr(self._s, name)
+
+
+def _connect(proto, host, port, end):
+    """Connected socket to host, wrapped in _Timed and held to end."""
+    if end is not None:
+        deadline.left_ms(end)
+    ai = dnscache.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+    ai = ai[0]
+
+    s = usocket.socket(ai[0], usocket.SOCK_STREAM, ai[2])
 
     try:
+        if end is not None:
+            # Note: settimeout is not supported on all platforms, will raise
+            # an AttributeError if not available.
+            s.settimeout(deadline.left_ms(end) / 1000)
         s.connect(ai[-1])
         if proto == "https:":
-            s = ussl.wrap_socket(s, server_hostname=host)
-        s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-        if not "Host" in headers:
-            s.write(b"Host: %s\r\n" % host)
-        # Iterate over keys to avoid tuple alloc
-        for k in headers:
-            s.write(k)
-            s.write(b": ")
-            s.write(headers[k])
-            s.write(b"\r\n")
-        if json is not None:
-            assert data is None
-            import ujson
-
-            data = ujson.dumps(json)
-            s.write(b"Content-Type: application/json\r\n")
-        if data:
-            if chunked_data:
-                s.write(b"Transfer-Encoding: chunked\r\n")
-            else:
-                s.write(b"Content-Length: %d\r\n" % len(data))
-        s.write(b"Connection: close\r\n\r\n")
-        if data:
-            if chunked_data:
-                for chunk in data:
-                    s.write(b"%x\r\n" % len(chunk))
-                    s.write(chunk)
-                    s.write(b"\r\n")
-                s.write("0\r\n\r\n")
-            else:
-                s.write(data)
+            # one SSL context for all connections
+            import tlscache
 
-        l = s.readline()
-        # print(l)
+            if end is not None:
+                s.settimeout(deadline.left_ms(end) / 1000)
+            s = tlscache.wrap(s, host, trace)
+    except OSError:
+        s.close()
+        # the cached address may be stale, resolve again next time
+        dnscache.forget(host, port)
+        raise
+    s = _Timed(s, end)
+    if trace is not None:
+        s = trace.socket(s)
+    return s
+
+
+class _Writer:
+    """
+    Assembles a request in a preallocated buffer so the request line,
+    headers and (small) body go out in one socket write instead of one
+    per fragment. Anything that doesn't fit is flushed as it comes.
+    """
+
+    def __init__(self, size=512):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.s = None
+
+    def add(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if self.pos + n > len(self.buf):
+            self.flush()
+            if n > len(self.buf):
+                self.s.write(data)
+                return
+        self.mv[self.pos : self.pos + n] = data
+        self.pos += n
+
+    def flush(self):
+        if self.pos:
+            self.s.write(self.mv[: self.pos])
+            self.pos = 0
+
+
+_writer = None  # shared by module level request() calls, created on first use
+
+
+def _encode_body(data, json):
+    if json is not None:
+        assert data is None
+        import ujson
+
+        data = ujson.dumps(json)
+    if isinstance(data, str):
+        data = data.encode()
+    return data
+
+
+def _add_head(w, method, host, path, headers, data, json, chunked_data, keep_alive, auth_line):
+    """Request line and headers, ending with the blank line."""
+    w.add(method)
+    w.add(b" /")
+    w.add(path)
+    w.add(b" HTTP/1.1\r\n" if keep_alive else b" HTTP/1.0\r\n")
+    if not "Host" in headers:
+        w.add(b"Host: ")
+        w.add(host)
+        w.add(b"\r\n")
+    # Iterate over keys to avoid tuple alloc
+    for k in headers:
+        w.add(k)
+        w.add(b": ")
+        w.add(headers[k])
+        w.add(b"\r\n")
+    if auth_line:
+        w.add(auth_line)
+    if json is not None:
+        w.add(b"Content-Type: application/json\r\n")
+    if data:
+        if chunked_data:
+            w.add(b"Transfer-Encoding: chunked\r\n")
+        else:
+            w.add(b"Content-Length: %d\r\n" % len(data))
+    elif keep_alive and method in ("POST", "PUT", "PATCH"):
+        # without a length an HTTP/1.1 server can't tell where the body ends
+        w.add(b"Content-Length: 0\r\n")
+    if keep_alive:
+        w.add(b"Connection: keep-alive\r\n\r\n")
+    else:
+        w.add(b"Connection: close\r\n\r\n")
+
+
+def _send(w, s, method, host, path, headers, data, json, keep_alive, auth_line=None):
+    chunked_data = _is_chunked(data)
+    data = _encode_body(data, json)
+
+    w.s = s
+    w.pos = 0
+    _add_head(w, method, host, path, headers, data, json, chunked_data, keep_alive, auth_line)
+    if data:
+        if chunked_data:
+            for chunk in data:
+                if not chunk:
+                    # a zero length chunk would end the body early
+                    continue
+                w.add(b"%x\r\n" % len(chunk))
+                w.add(chunk)
+                w.add(b"\r\n")
+            w.add(b"0\r\n\r\n")
+        else:
+            w.add(data)
+    w.flush()
+    w.s = None
+
+
+class RawHeaders:
+    """
+    Response headers kept as the bytes they arrived in (parse_headers=RAW).
+    Nothing is decoded or split until a header is looked up; the first
+    lookup indexes them all. Names are matched in any case, as str or
+    bytes, and values come back as bytes:
+
+        resp.headers.get("etag")      # b'"1-9a7f"'
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._index = None  # lowercased name -> (start, end) of the value in raw
+
+    def _build(self):
+        index = {}
+        raw = self.raw
+        start = 0
+        while start < len(raw):
+            eol = raw.find(b"\n", start)
+            if eol < 0:
+                eol = len(raw)
+            colon = raw.find(b":", start, eol)
+            if colon > 0:
+                name = raw[start:colon].lower()
+                if name not in index:
+                    index[name] = (colon + 1, eol)
+            start = eol + 1
+        self._index = index
+        return index
+
+    def _span(self, name):
+        if isinstance(name, str):
+            name = name.encode()
+        return (self._index or self._build()).get(name.lower())
+
+    def get(self, name, default=None):
+        span = self._span(name)
+        if span is None:
+            return default
+        return self.raw[span[0] : span[1]].strip()
+
+    def __getitem__(self, name):
+        span = self._span(name)
+        if span is None:
+            raise KeyError(name)
+        return self.raw[span[0] : span[1]].strip()
+
+    def __contains__(self, name):
+        return self._span(name) is not None
+
+    def items(self):
+        index = self._index or self._build()
+        for name in index:
+            span = index[name]
+            yield name, self.raw[span[0] : span[1]].strip()
+
+
+RAW = "raw"  # parse_headers=RAW: resp.headers is a RawHeaders
+
+# first byte (lowercased) of the headers that decide the framing or a redirect:
+# transfer-encoding, content-length / connection, location
+_FRAMING = (0x74, 0x63, 0x6C)
+
+
+class _Head:
+    """
+    Incremental parser for a response's status line and headers, fed one
+    line at a time so the same code serves blocking sockets and uasyncio
+    streams. Works out how the body is framed and where a redirect goes.
+
+    What becomes of the headers depends on parse_headers: a dict of str
+    (True), nothing (False), a RawHeaders (RAW) or whatever the function
+    passed fills in. capture, a tuple of lowercase names as bytes, takes
+    precedence: resp.headers is then a dict of just those, bytes to
+    bytes, found by comparing the bytes of each line's name.
+    """
+
+    def __init__(self, method, parse_headers, capture=None):
+        self.method = method
+        self.parse_headers = parse_headers
+        self.capture = capture
+        if capture is not None:
+            self.headers = {}
+            # lines starting with anything else can't be one of them
+            self._initials = [name[0] for name in capture]
+        elif parse_headers is RAW:
+            self.headers = []  # the lines, joined once they're all in
+        else:
+            self.headers = {} if parse_headers is not False else None
+        self.status = None
+        self.reason = ""
+        self.redirect = None  # redirection url, None means no redirection
+        self.keep_alive = False
+        self.length = None
+        self.chunked = False
+
+    def _status_line(self, l):
         l = l.split(None, 2)
         if len(l) < 2:
             # Invalid response
             raise ValueError("HTTP error: BadStatusLine:\n%s" % l)
-        status = int(l[1])
-        reason = ""
+        self.status = int(l[1])
         if len(l) > 2:
-            reason = l[2].rstrip()
-        while True:
-            l = s.readline()
-            if not l or l == b"\r\n":
-                break
-            # print(l)
-            if l.startswith(b"Transfer-Encoding:"):
-                if b"chunked" in l:
-                    raise ValueError("Unsupported " + str(l, "utf-8"))
-            elif l.startswith(b"Location:") and not 200 <= status <= 299:
-                if status in [301, 302, 303, 307, 308]:
-                    redirect = str(l[10:-2], "utf-8")
-                else:
-                    raise NotImplementedError("Redirect %d not yet supported" % status)
-            if parse_headers is False:
-                pass
-            elif parse_headers is True:
-                l = str(l, "utf-8")
-                k, v = l.split(":", 1)
-                resp_d[k] = v.strip()
+            self.reason = l[2].rstrip()
+        # HTTP/1.1 connections stay open unless the server says otherwise
+        self.keep_alive = l[0] == b"HTTP/1.1"
+
+    def _framing(self, l, lower):
+        status = self.status
+        if lower.startswith(b"transfer-encoding:"):
+            self.chunked = b"chunked" in lower
+        elif lower.startswith(b"content-length:"):
+            self.length = int(l[15:])
+        elif lower.startswith(b"connection:"):
+            if b"close" in lower:
+                self.keep_alive = False
+            elif b"keep-alive" in lower:
+                self.keep_alive = True
+        elif lower.startswith(b"location:") and not 200 <= status <= 299:
+            if status in [301, 302, 303, 307, 308]:
+                self.redirect = str(l[10:-2], "utf-8")
             else:
-                parse_headers(l, resp_d)
-    except OSError:
-        s.close()
-        raise
+                raise NotImplementedError("Redirect %d not yet supported" % status)
+
+    def feed(self, l):
+        """Parse one line, returns True once the headers are complete."""
+        if self.status is None:
+            self._status_line(l)
+            return False
+        if not l or l == b"\r\n":
+            return True
+        # print(l)
+        # only lines that may matter to the framing get a lowercased copy
+        lower = None
+        if (l[0] | 0x20) in _FRAMING:
+            lower = l.lower()
+            self._framing(l, lower)
+        capture = self.capture
+        if capture is not None:
+            if (l[0] | 0x20) not in self._initials:
+                return False
+            colon = l.find(b":")
+            for name in capture:
+                if len(name) == colon:
+                    if lower is None:
+                        lower = l.lower()
+                    if lower.startswith(name):
+                        self.headers[name] = l[colon + 1 :].strip()
+                        break
+        elif self.parse_headers is False:
+            pass
+        elif self.parse_headers is True:
+            l = str(l, "utf-8")
+            k, v = l.split(":", 1)
+            self.headers[k] = v.strip()
+        elif self.parse_headers is RAW:
+            self.headers.append(l)
+        else:
+            self.parse_headers(l, self.headers)
+        return False
+
+    def apply(self, resp):
+        """Copy the status, headers and body framing onto resp."""
+        resp.status_code = self.status
+        resp.reason = self.reason
+        if self.headers is not None:
+            if self.capture is None and self.parse_headers is RAW:
+                self.headers = RawHeaders(b"".join(self.headers))
+            resp.headers = self.headers
+        length = self.length
+        chunked = self.chunked
+        status = self.status
+        if self.method == "HEAD" or status in (204, 304) or 100 <= status <= 199:
+            length = 0
+            chunked = False
+        resp._chunked = chunked
+        resp._remaining = 0 if chunked else length
+        # a body that runs until close can't leave the socket reusable
+        resp._keep_alive = self.keep_alive and (chunked or length is not None)
+        return resp
+
+
+def _read_head(s, method, parse_headers, capture=None):
+    """
+    Read the status line and headers off s and return (Response, redirect).
+    The Response knows how its body is framed so the socket can be reused
+    once the body has been consumed.
+    """
+    head = _Head(method, parse_headers, capture)
+    while not head.feed(s.readline()):
+        pass
+    return head.apply(Response(s)), head.redirect
+
+
+def request(
+    method,
+    url,
+    data=None,
+    json=None,
+    headers={},
+    stream=None,
+    auth=None,
+    timeout=None,
+    parse_headers=True,
+    retry=None,
+    idempotent=None,
+    capture=None,
+):
+    """
+    Send a request and return its Response. timeout (seconds) is the
+    total for DNS, connect, TLS, sending and reading the whole response,
+    cut short by the wake budget (see deadline). With retry (a
+    deadline.Retry) failures are tried again where that's safe;
+    idempotent=True marks a POST that is. data may be a function
+    returning the body, called per attempt, so a streamed body can be
+    sent again. parse_headers and capture choose what becomes of the
+    response headers, see _Head; capture=(b"etag",) for just the ETag.
+    """
+    global _writer
+    if _writer is None:
+        _writer = _Writer()
+    auth_line = _auth_line(auth) if auth is not None else None
+
+    proto, host, port, path = _split_url(url)
+    end = deadline.until(timeout)
+    attempt = 0
+    while True:
+        body = data() if callable(data) else data
+        sent = False
+        try:
+            s = _connect(proto, host, port, end)
+            sent = True
+            try:
+                _send(_writer, s, method, host, path, headers, body, json, False, auth_line)
+                resp, redirect = _read_head(s, method, parse_headers, capture)
+            except (OSError, ValueError):
+                s.close()
+                raise
+        except (OSError, ValueError):
+            ms = None if retry is None else retry.backoff_ms(attempt, method, sent, idempotent, end)
+            if ms is None:
+                raise
+            time.sleep_ms(ms)
+            attempt += 1
+            continue
+        if retry is not None and resp.status_code in retry.statuses:
+            ms = retry.backoff_ms(attempt, method, True, idempotent, end)
+            if ms is not None:
+                resp.close()
+                time.sleep_ms(ms)
+                attempt += 1
+                continue
+        break
 
     if redirect:
         s.close()
-        if status in [301, 302, 303]:
-            return request("GET", redirect, None, None, headers, stream)
+        left = None if end is None else deadline.left_ms(end) / 1000
+        if resp.status_code in [301, 302, 303]:
+            return request(
+                "GET", redirect, None, None, headers, stream, auth, left, parse_headers, retry, None, capture
+            )
         else:
-            return request(method, redirect, data, json, headers, stream)
+            return request(
+                method, redirect, data, json, headers, stream, auth, left, parse_headers, retry, idempotent, capture
+            )
     else:
-        resp = Response(s)
-        resp.status_code = status
-        resp.reason = reason
-        if resp_d is not None:
-            resp.headers = resp_d
         return resp
 
 
+class Session:
+    """
+    HTTP/1.1 client that keeps connections open between requests.
+
+    Sockets are pooled per (host, port, scheme) and handed back once a
+    response body has been fully read, so repeated requests to the same
+    server skip DNS, TCP and TLS setup. Connections idle for longer than
+    idle_timeout_ms are closed the next time the pool is used.
+
+    Requests are assembled in one buffer owned by the session and the
+    Authorization header for auth is only encoded once.
+
+        session = Session()
+        session.post("http://192.168.1.101:5984/home-sensors", json=data)
+        session.close()
+    """
+
+    def __init__(self, idle_timeout_ms=30000, max_idle=2, auth=None, buffer_size=512):
+        self.idle_timeout_ms = idle_timeout_ms
+        self.max_idle = max_idle
+        self.auth = auth
+        self._pool = {}  # (host, port, proto) -> [(socket, released ticks_ms), ...]
+        self._lent = []  # sockets of responses whose body hasn't been read or closed yet
+        self._writer = _Writer(buffer_size)
+        self._auth_for = None
+        self._auth_line = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _auth_header(self, auth):
+        if auth != self._auth_for:
+            self._auth_line = _auth_line(auth)
+            self._auth_for = auth
+        return self._auth_line
+
+    def _checkout(self, key):
+        self.evict()
+        conns = self._pool.get(key)
+        if conns:
+            s = conns.pop()[0]
+            if not conns:
+                del self._pool[key]
+            return s
+        return None
+
+    def _returned(self, s):
+        if s in self._lent:
+            self._lent.remove(s)
+
+    def _checkin(self, key, s):
+        conns = self._pool.setdefault(key, [])
+        conns.append((s, time.ticks_ms()))
+        if len(conns) > self.max_idle:
+            conns.pop(0)[0].close()
+
+    def evict(self):
+        """Close pooled connections that have been idle too long."""
+        now = time.ticks_ms()
+        for key in list(self._pool):
+            fresh = []
+            for s, released in self._pool[key]:
+                if time.ticks_diff(now, released) > self.idle_timeout_ms:
+                    s.close()
+                else:
+                    fresh.append((s, released))
+            if fresh:
+                self._pool[key] = fresh
+            else:
+                del self._pool[key]
+
+    def close(self):
+        """Close the pooled connections and those of responses not read to the end."""
+        for key in self._pool:
+            for s, released in self._pool[key]:
+                s.close()
+        self._pool = {}
+        for s in self._lent:
+            s.close()
+        self._lent = []
+
+    def request(
+        self,
+        method,
+        url,
+        data=None,
+        json=None,
+        headers={},
+        stream=None,
+        auth=None,
+        timeout=None,
+        parse_headers=True,
+        retry=None,
+        idempotent=None,
+        capture=None,
+    ):
+        """See request(); the deadline covers reusing a pooled connection too."""
+        if auth is None:
+            auth = self.auth
+        auth_line = self._auth_header(auth) if auth is not None else None
+
+        proto, host, port, path = _split_url(url)
+        key = (host, port, proto)
+        end = deadline.until(timeout)
+        s = self._checkout(key)
+        reused = s is not None
+        attempt = 0
+
+        while True:
+            body = data() if callable(data) else data
+            sent = False
+            try:
+                if s is None:
+                    s = _connect(proto, host, port, end)
+                else:
+                    s.until(end)
+                sent = True
+                _send(self._writer, s, method, host, path, headers, body, json, True, auth_line)
+                resp, redirect = _read_head(s, method, parse_headers, capture)
+            except (OSError, ValueError):
+                if s is not None:
+                    s.close()
+                    s = None
+                # the server may have dropped a pooled connection while it sat
+                # idle, or failed with the request; retry once on a fresh one
+                # where sending it twice is harmless
+                if reused and _can_repeat(method, data, idempotent):
+                    reused = False
+                    continue
+                reused = False
+                ms = None if retry is None else retry.backoff_ms(attempt, method, sent, idempotent, end)
+                if ms is None:
+                    raise
+                time.sleep_ms(ms)
+                attempt += 1
+                continue
+            if retry is not None and resp.status_code in retry.statuses:
+                ms = retry.backoff_ms(attempt, method, True, idempotent, end)
+                if ms is not None:
+                    resp.close()
+                    s = None
+                    time.sleep_ms(ms)
+                    attempt += 1
+                    continue
+            break
+
+        resp._session = self
+        resp._key = key
+        self._lent.append(s)
+        if redirect:
+            resp.close()
+            left = None if end is None else deadline.left_ms(end) / 1000
+            if resp.status_code in [301, 302, 303]:
+                return self.request(
+                    "GET", redirect, None, None, headers, stream, auth, left, parse_headers, retry, None, capture
+                )
+            else:
+                return self.request(
+                    method, redirect, data, json, headers, stream, auth, left, parse_headers, retry, idempotent, capture
+                )
+        return resp
+
+    def head(self, url, **kw):
+        return self.request("HEAD", url, **kw)
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
+
+    def put(self, url, **kw):
+        return self.request("PUT", url, **kw)
+
+    def patch(self, url, **kw):
+        return self.request("PATCH", url, **kw)
+
+    def delete(self, url, **kw):
+        return self.request("DELETE", url, **kw)
+
+
 def head(url, **kw):
     return request("HEAD", url, **kw)
 
@@ -196,4 +912,3 @@ def patch(url, **kw):
 
 def delete(url, **kw):
     return request("DELETE", url, **kw)
-
@@ -0,0 +1,108 @@
+"""
+Time limits and retries for the HTTP clients.
+
+A request to a server that accepts the connection and then goes quiet
+(a hung CouchDB, a worldtimeapi.org stuck behind a captive portal)
+would otherwise hold the wake forever, and it never gets back to
+deepsleep. Two limits apply to every request auth_urequests and
+async_urequests make:
+
+- its timeout, in seconds, as the total from the DNS lookup through
+  connect, TLS, sending and the last byte of the response read;
+- the wake budget, started once per wake, which no request outlives.
+
+    deadline.start(30000)                  # the network side gets 30 s
+    resp = auth_urequests.get(url, timeout=5, retry=deadline.Retry())
+    deadline.remaining_ms()                # what's left, None without a budget
+
+A request past its deadline raises OSError(ETIMEDOUT). DNS lookups
+can't be interrupted on the ESP32; the deadline is checked before and
+after them, dnscache keeps them rare.
+
+Retry decides whether a failed request is tried again, and after how
+long: exponential backoff with jitter, so boards that lost the server
+together don't come back in step. Requests that may have reached the
+server are only repeated when that's safe: GET, HEAD, PUT, DELETE, or
+a POST its caller says is idempotent (_bulk_docs with our own _ids).
+A POST that failed before anything was sent (DNS, connect, TLS) is
+always tried again.
+"""
+import random
+import time
+
+ETIMEDOUT = 110
+IDEMPOTENT = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+_budget_end = None  # ticks_ms the wake budget runs out at
+
+
+def start(ms):
+    """Start the wake budget: requests from now on end within ms."""
+    global _budget_end
+    _budget_end = time.ticks_add(time.ticks_ms(), ms)
+
+
+def stop():
+    global _budget_end
+    _budget_end = None
+
+
+def remaining_ms():
+    """Milliseconds left of the wake budget (0 once spent), None without one."""
+    if _budget_end is None:
+        return None
+    return max(0, time.ticks_diff(_budget_end, time.ticks_ms()))
+
+
+def until(timeout=None):
+    """
+    The ticks_ms a request with timeout (seconds, None for none) must be
+    done by, the wake budget permitting. None when neither limits it.
+    """
+    end = _budget_end
+    if timeout is not None:
+        mine = time.ticks_add(time.ticks_ms(), int(timeout * 1000))
+        if end is None or time.ticks_diff(mine, end) < 0:
+            end = mine
+    return end
+
+
+def left_ms(end):
+    """Milliseconds until end, raising OSError(ETIMEDOUT) once it's passed."""
+    ms = time.ticks_diff(end, time.ticks_ms())
+    if ms <= 0:
+        raise OSError(ETIMEDOUT)
+    return ms
+
+
+class Retry:
+    """
+    Retry policy: up to tries attempts, waiting base_ms, 2 * base_ms, ...
+    (at most cap_ms, the second half of each wait random) in between.
+    Responses with a status in statuses count as failures for requests
+    that are safe to repeat.
+    """
+
+    def __init__(self, tries=3, base_ms=250, cap_ms=4000, statuses=(429, 502, 503, 504)):
+        self.tries = tries
+        self.base_ms = base_ms
+        self.cap_ms = cap_ms
+        self.statuses = statuses
+
+    def backoff_ms(self, attempt, method, sent=True, idempotent=None, end=None):
+        """
+        How long to wait before trying again after attempt (0 for the
+        first) failed, or None to give up: out of tries, not safe to
+        repeat once sent, or the wait would run into end.
+        """
+        if attempt + 1 >= self.tries:
+            return None
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT
+        if sent and not idempotent:
+            return None
+        ms = min(self.cap_ms, self.base_ms << attempt)
+        ms = ms // 2 + ((ms - ms // 2) * random.getrandbits(8) >> 8)
+        if end is not None and time.ticks_diff(end, time.ticks_ms()) <= ms:
+            return None
+        return ms
@@ -0,0 +1,119 @@
+"""
+Caching front end for usocket.getaddrinfo.
+
+Resolved addresses are kept for TTL_S seconds (at most MAX_ENTRIES of
+them) and dotted-quad hosts such as the CouchDB LAN address skip
+resolution entirely. Expiry uses time.time(), which the ESP32 RTC keeps
+running through deepsleep, so save() / load() can carry the cache over
+to the next wake in a small file.
+
+    import dnscache
+    dnscache.load()
+    ai = dnscache.getaddrinfo("worldtimeapi.org", 80)[0]
+    ...
+    dnscache.save()
+
+stats counts hits, misses and literal lookups so the cache can be
+checked in the field.
+"""
+import usocket
+import time
+
+CACHE_FILE = "dnscache.json"
+TTL_S = 3600
+MAX_ENTRIES = 8
+
+stats = {"hits": 0, "misses": 0, "literal": 0}
+
+_cache = {}  # (host, port, af, type) -> (expires time.time(), addrinfo list)
+_dirty = False
+
+
+def _is_ipv4(host):
+    parts = host.split(".")
+    if len(parts) != 4:
+        return False
+    for p in parts:
+        if not p.isdigit() or int(p) > 255:
+            return False
+    return True
+
+
+def getaddrinfo(host, port, af=0, type=usocket.SOCK_STREAM):
+    """Drop-in replacement for usocket.getaddrinfo(host, port, af, type)."""
+    global _dirty
+    if _is_ipv4(host):
+        stats["literal"] += 1
+        return [(usocket.AF_INET, type, 0, "", (host, port))]
+
+    key = (host, port, af, type)
+    now = time.time()
+    entry = _cache.get(key)
+    # an entry further out than TTL_S means the clock was set backwards
+    if entry is not None and now < entry[0] <= now + TTL_S:
+        stats["hits"] += 1
+        return entry[1]
+
+    stats["misses"] += 1
+    ai = usocket.getaddrinfo(host, port, af, type)
+    if len(_cache) >= MAX_ENTRIES and key not in _cache:
+        # drop whichever entry expires first
+        oldest = None
+        for k in _cache:
+            if oldest is None or _cache[k][0] < _cache[oldest][0]:
+                oldest = k
+        del _cache[oldest]
+    _cache[key] = (now + TTL_S, ai)
+    _dirty = True
+    return ai
+
+
+def forget(host, port=None):
+    """Drop cached results for host, e.g. after connecting to it failed."""
+    global _dirty
+    for key in list(_cache):
+        if key[0] == host and (port is None or key[1] == port):
+            del _cache[key]
+            _dirty = True
+
+
+def clear():
+    global _dirty
+    _cache.clear()
+    _dirty = True
+
+
+def save(path=CACHE_FILE):
+    """Write the cache to flash, if it changed since the last load/save."""
+    global _dirty
+    if not _dirty:
+        return
+    import ujson
+
+    entries = []
+    for key in _cache:
+        expires, ai = _cache[key]
+        # only the parts of each addrinfo tuple that socket()/connect() use
+        entries.append([key[0], key[1], key[2], key[3], expires,
+                        [[a[0], a[1], a[2], list(a[-1])] for a in ai]])
+    with open(path, "w") as f:
+        ujson.dump(entries, f)
+    _dirty = False
+
+
+def load(path=CACHE_FILE):
+    """Restore entries written by save(); a missing or corrupt file is ignored."""
+    global _dirty
+    import ujson
+
+    try:
+        with open(path) as f:
+            entries = ujson.load(f)
+    except (OSError, ValueError):
+        return
+    now = time.time()
+    for host, port, af, type, expires, ai in entries:
+        if now < expires <= now + TTL_S:
+            _cache[(host, port, af, type)] = (
+                expires, [(a[0], a[1], a[2], "", tuple(a[3])) for a in ai])
+    _dirty = False
@@ -0,0 +1,270 @@
+"""
+Pick values out of a JSON body as it streams in, without holding it.
+
+Response.json() reads the whole body and builds every object in it,
+when the caller usually wants one or two values: the time API's
+unixtime, a doc's _rev. A Selector is fed the body piece by piece, keeps
+only the stack of keys it's inside of, and copies out just the values
+at the requested paths, so any size of body parses in a fixed buffer.
+Once every path has been found it's done and the rest of the body needn't
+be read at all.
+
+    sel = Selector(("unixtime", "utc_offset"))
+    for piece in resp.iter_content(128):
+        sel.feed(piece)
+        if sel.done:
+            break
+    sel.found  # {"unixtime": 1700000000, "utc_offset": "+00:00"}
+
+Paths are dotted keys, with array indexes as numbers ("rows.0.id").
+A "*" component matches any key or index; such a path collects all its
+matches as (path, value) pairs, e.g. for "*.error" on a _bulk_docs
+response [((3, "error"), "conflict"), ...], and keeps reading to the end.
+Response.json(paths=...) and AsyncResponse.json(paths=...) wrap this.
+"""
+import ujson
+
+# byte values, as ints: indexing bytes gives ints on both ports
+_WHITESPACE = {0x20, 0x09, 0x0D, 0x0A}
+_SCALAR_END = {0x20, 0x09, 0x0D, 0x0A, 0x2C, 0x5D, 0x7D}
+
+
+def _component(c):
+    if c == "*":
+        return c
+    if c.isdigit():
+        return int(c)
+    return c.encode()
+
+
+class Selector:
+    def __init__(self, paths, max_value=1024):
+        self.found = {}
+        self.done = False
+        self.max_value = max_value
+        self._paths = []  # (components, path, wildcard)
+        self._missing = 0  # paths without a wildcard not found yet
+        self._wildcards = False
+        self._max_key = 0
+        for path in paths:
+            components = tuple(_component(c) for c in path.split("."))
+            wildcard = "*" in components
+            if wildcard:
+                self.found[path] = []
+                self._wildcards = True
+            else:
+                self._missing += 1
+            self._paths.append((components, path, wildcard))
+            for c in components:
+                if isinstance(c, bytes):
+                    self._max_key = max(self._max_key, len(c))
+        self._stack = []  # [is_object, current key (bytes) or index] per open container
+        self._want_key = False  # just inside { or after a , in an object
+        self._str = 0  # inside a string: 1 a key, 2 a value
+        self._escape = False  # the string so far ends in an unpaired backslash
+        self._key = bytearray()
+        self._scalar = False
+        self._capture = None  # raw bytes of the value being copied out
+        self._capture_depth = 0
+        self._capture_path = None
+
+    def _start_value(self):
+        if self._capture is not None:
+            return
+        stack = self._stack
+        depth = len(stack)
+        for components, path, wildcard in self._paths:
+            if len(components) != depth:
+                continue
+            for i in range(depth):
+                if components[i] != "*" and components[i] != stack[i][1]:
+                    break
+            else:
+                if not wildcard and path in self.found:
+                    continue
+                self._capture = bytearray()
+                self._capture_depth = depth
+                self._capture_path = (path, wildcard)
+                return
+
+    def _end_value(self):
+        if self._capture is None or len(self._stack) != self._capture_depth:
+            return
+        value = ujson.loads(bytes(self._capture))
+        path, wildcard = self._capture_path
+        self._capture = None
+        if wildcard:
+            where = tuple(e[1] if isinstance(e[1], int) else str(e[1], "utf-8") for e in self._stack)
+            self.found[path].append((where, value))
+            return
+        self._found(path, value)
+        # paths inside this value weren't looked for while it was copied
+        depth = self._capture_depth
+        for components, other, wildcard in self._paths:
+            if wildcard or other in self.found or len(components) <= depth or other[: len(path) + 1] != path + ".":
+                continue
+            v = value
+            try:
+                for c in components[depth:]:
+                    v = v[c if isinstance(c, int) else str(c, "utf-8")]
+            except (KeyError, IndexError, TypeError):
+                continue
+            self._found(other, v)
+
+    def _found(self, path, value):
+        self.found[path] = value
+        self._missing -= 1
+        if not self._missing and not self._wildcards:
+            self.done = True
+
+    def _keep(self, data):
+        capture = self._capture
+        if capture is not None:
+            capture.extend(data)
+            if len(capture) > self.max_value:
+                raise ValueError("JSON value at %s longer than %d bytes" % (self._capture_path[0], self.max_value))
+
+    def _string(self, data, i):
+        """Consume string bytes from data[i:], return where to go on from."""
+        n = len(data)
+        j = i
+        while True:
+            q = data.find(b'"', j)
+            if q < 0:
+                end = n
+            else:
+                end = q
+            # backslashes right before the quote (or the end of this piece)
+            k = end
+            while k > i and data[k - 1] == 0x5C:
+                k -= 1
+            odd = (end - k) % 2 == 1
+            if k == i and self._escape:
+                odd = not odd
+            if q < 0:
+                self._escape = odd
+                break
+            if odd:
+                j = q + 1  # an escaped quote, still inside the string
+                continue
+            break
+        piece = data[i:end]
+        if self._str == 1 and len(self._key) <= self._max_key:
+            # a longer key can't be on any path, no need to keep all of it
+            self._key.extend(piece)
+        self._keep(piece)
+        if q < 0:
+            return n
+        self._escape = False
+        self._keep(b'"')
+        if self._str == 1:
+            self._str = 0
+            self._stack[-1][1] = bytes(self._key)
+        else:
+            self._str = 0
+            self._end_value()
+        return q + 1
+
+    def feed(self, data):
+        """Parse the next piece of the body (bytes). Sets done once all paths were found."""
+        i = 0
+        n = len(data)
+        stack = self._stack
+        while i < n and not self.done:
+            if self._str:
+                i = self._string(data, i)
+                continue
+            c = data[i]
+            if self._scalar:
+                if c not in _SCALAR_END:
+                    j = i + 1
+                    while j < n and data[j] not in _SCALAR_END:
+                        j += 1
+                    self._keep(data[i:j])
+                    i = j
+                    continue
+                self._scalar = False
+                self._end_value()
+                if self.done:
+                    break
+            if c in _WHITESPACE:
+                self._keep(data[i : i + 1])
+                i += 1
+                continue
+            if c == 0x22:  # "
+                if self._want_key:
+                    self._want_key = False
+                    self._str = 1
+                    self._key = bytearray()
+                else:
+                    self._start_value()
+                    self._str = 2
+                self._keep(b'"')
+            elif c == 0x7B or c == 0x5B:  # { [
+                self._start_value()
+                self._keep(data[i : i + 1])
+                if c == 0x7B:
+                    stack.append([True, None])
+                    self._want_key = True
+                else:
+                    stack.append([False, 0])
+            elif c == 0x7D or c == 0x5D:  # } ]
+                if not stack:
+                    raise ValueError("unbalanced JSON")
+                stack.pop()
+                self._want_key = False
+                self._keep(data[i : i + 1])
+                self._end_value()
+            elif c == 0x2C:  # ,
+                self._keep(b",")
+                if stack:
+                    if stack[-1][0]:
+                        self._want_key = True
+                    else:
+                        stack[-1][1] += 1
+            elif c == 0x3A:  # :
+                self._keep(b":")
+            else:
+                self._start_value()
+                self._scalar = True
+                continue
+            i += 1
+
+    def close(self):
+        """Call at the end of the body, for a bare scalar that ran up to it."""
+        if self._scalar:
+            self._scalar = False
+            self._end_value()
+
+
+def select(resp, paths, chunk_size=128):
+    """
+    The values at paths in resp's JSON body, as a dict by path. Reads
+    with a chunk_size buffer and closes the response as soon as every
+    path was found, without reading the rest.
+    """
+    sel = Selector(paths)
+    buf = bytearray(chunk_size)
+    mv = memoryview(buf)
+    while not sel.done:
+        n = resp.readinto(buf)
+        if not n:
+            sel.close()
+            break
+        sel.feed(bytes(mv[:n]))
+    # the rest of the body is still on the socket, which can't be reused
+    resp.close()
+    return sel.found
+
+
+async def select_async(resp, paths, chunk_size=128):
+    """select() for an async_urequests.AsyncResponse."""
+    sel = Selector(paths)
+    while not sel.done:
+        data = await resp.read(chunk_size)
+        if not data:
+            sel.close()
+            break
+        sel.feed(data)
+    resp.close()
+    return sel.found
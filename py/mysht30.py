@@ -1,10 +1,69 @@
 
 import time
+from array import array
 from machine import Pin, SoftI2C
 
 # I2C address B 0x45 ADDR (pin 2) connected to VDD
 DEFAULT_I2C_ADDRESS = 0x45
 
+# CRC-8 lookup for polynomial 0x31 (MySht30.POLYNOMIAL), one byte per step
+CRC_TABLE = (
+    b"\x00\x31\x62\x53\xc4\xf5\xa6\x97\xb9\x88\xdb\xea\x7d\x4c\x1f\x2e"
+    b"\x43\x72\x21\x10\x87\xb6\xe5\xd4\xfa\xcb\x98\xa9\x3e\x0f\x5c\x6d"
+    b"\x86\xb7\xe4\xd5\x42\x73\x20\x11\x3f\x0e\x5d\x6c\xfb\xca\x99\xa8"
+    b"\xc5\xf4\xa7\x96\x01\x30\x63\x52\x7c\x4d\x1e\x2f\xb8\x89\xda\xeb"
+    b"\x3d\x0c\x5f\x6e\xf9\xc8\x9b\xaa\x84\xb5\xe6\xd7\x40\x71\x22\x13"
+    b"\x7e\x4f\x1c\x2d\xba\x8b\xd8\xe9\xc7\xf6\xa5\x94\x03\x32\x61\x50"
+    b"\xbb\x8a\xd9\xe8\x7f\x4e\x1d\x2c\x02\x33\x60\x51\xc6\xf7\xa4\x95"
+    b"\xf8\xc9\x9a\xab\x3c\x0d\x5e\x6f\x41\x70\x23\x12\x85\xb4\xe7\xd6"
+    b"\x7a\x4b\x18\x29\xbe\x8f\xdc\xed\xc3\xf2\xa1\x90\x07\x36\x65\x54"
+    b"\x39\x08\x5b\x6a\xfd\xcc\x9f\xae\x80\xb1\xe2\xd3\x44\x75\x26\x17"
+    b"\xfc\xcd\x9e\xaf\x38\x09\x5a\x6b\x45\x74\x27\x16\x81\xb0\xe3\xd2"
+    b"\xbf\x8e\xdd\xec\x7b\x4a\x19\x28\x06\x37\x64\x55\xc2\xf3\xa0\x91"
+    b"\x47\x76\x25\x14\x83\xb2\xe1\xd0\xfe\xcf\x9c\xad\x3a\x0b\x58\x69"
+    b"\x04\x35\x66\x57\xc0\xf1\xa2\x93\xbd\x8c\xdf\xee\x79\x48\x1b\x2a"
+    b"\xc1\xf0\xa3\x92\x05\x34\x67\x56\x78\x49\x1a\x2b\xbc\x8d\xde\xef"
+    b"\x82\xb3\xe0\xd1\x46\x77\x24\x15\x3b\x0a\x59\x68\xff\xce\x9d\xac"
+)
+
+
+def crc8(buf, start=0, end=None):
+    """CRC-8 (init 0xFF) of buf[start:end], without slicing buf"""
+    if end is None:
+        end = len(buf)
+    crc = 0xFF
+    for i in range(start, end):
+        crc = CRC_TABLE[crc ^ buf[i]]
+    return crc
+
+
+def check_frame(buf, offset=0, words=2):
+    """
+    True if the words 3 byte groups (2 data bytes + CRC) starting at
+    offset in buf all carry a valid CRC. buf can be a bytes, bytearray or
+    memoryview holding many frames; nothing is copied.
+    """
+    table = CRC_TABLE
+    for i in range(offset, offset + 3 * words, 3):
+        if table[table[0xFF ^ buf[i]] ^ buf[i + 1]] != buf[i + 2]:
+            return False
+    return True
+
+
+def check_frames(buf, count, frame_size=6):
+    """
+    Validate count measurement frames stored back to back in buf, e.g.
+    samples buffered while oversampling or replayed from flash. Returns a
+    bytearray with 1 for each valid frame and 0 for each corrupt one.
+    """
+    ok = bytearray(count)
+    words = frame_size // 3
+    for n in range(count):
+        if check_frame(buf, n * frame_size, words):
+            ok[n] = 1
+    return ok
+
+
 class MySht30:
     """
     Based on class written by Roberto S鐠嬶箯chez, see https://github.com/rsc1975/micropython-sht30/blob/master/sht30.py
@@ -25,27 +84,62 @@ class MySht30:
     ENABLE_HEATER_CMD = b'\x30\x6D'
     DISABLE_HEATER_CMD = b'\x30\x66'
 
-    def __init__(self, scl_pin_num=23, sda_pin_num=22, delta_temp=0, delta_hum=0):
+    # repeatability, used as index into the command and delay tables below
+    HIGH = 0
+    MEDIUM = 1
+    LOW = 2
+
+    # single shot without clock stretching, the result is read once it's ready
+    SINGLE_SHOT_CMDS = (b'\x24\x00', b'\x24\x0B', b'\x24\x16')
+    # max measurement duration per repeatability (datasheet 15.5 / 6.5 / 4.5 ms)
+    MEASURE_DELAYS_MS = (16, 7, 5)
+    # periodic acquisition, measurements per second -> command per repeatability
+    PERIODIC_CMDS = {
+        0.5: (b'\x20\x32', b'\x20\x24', b'\x20\x2F'),
+        1: (b'\x21\x30', b'\x21\x26', b'\x21\x2D'),
+        2: (b'\x22\x36', b'\x22\x20', b'\x22\x2B'),
+        4: (b'\x23\x34', b'\x23\x22', b'\x23\x29'),
+        10: (b'\x27\x37', b'\x27\x21', b'\x27\x2A'),
+    }
+    ART_CMD = b'\x2B\x32'  # accelerated response time, 4 mps
+    FETCH_CMD = b'\xE0\x00'
+    BREAK_CMD = b'\x30\x93'  # stop periodic acquisition
+
+    def __init__(self, scl_pin_num=23, sda_pin_num=22, delta_temp=0, delta_hum=0, repeatability=LOW, i2c=None, address=None):
         self._current_data = None
-        self.scl_pin = Pin(scl_pin_num)
-        self.sda_pin = Pin(sda_pin_num)
-        self.i2c = SoftI2C(scl=self.scl_pin, sda=self.sda_pin)
-        self.i2c_address = self.i2c.scan()[0]
-        time.sleep_ms(50)
+        self.repeatability = repeatability
+        self._ready_at = None  # ticks_ms when a started single shot is done
+        self._periodic = False
+        # last measurement in centi-degrees C and centi-percent RH, and the
+        # frame it came from, both reused for every measurement
+        self._centi = array('h', (0, 0))
+        # raw words of the last measurement that passed the CRC check
+        self._raw = array('H', (0, 0))
+        self._frame = bytearray(6)
+        self._measured = False
+        if i2c is None:
+            self.scl_pin = Pin(scl_pin_num)
+            self.sda_pin = Pin(sda_pin_num)
+            i2c = SoftI2C(scl=self.scl_pin, sda=self.sda_pin)
+        self.i2c = i2c
+        # a SensorBus (sensorbus.py) passes the address it already knows
+        if address is None:
+            address = i2c.scan()[0]
+            time.sleep_ms(50)
+        self.i2c_address = address
 
     def _check_crc(self, data):
-        # calculates 8-Bit checksum with given polynomial
-        crc = 0xFF
-
-        for b in data[:-1]:
-            crc ^= b;
-            for _ in range(8, 0, -1):
-                if crc & 0x80:
-                    crc = (crc << 1) ^ self.POLYNOMIAL
-                else:
-                    crc <<= 1
-        crc_to_check = data[-1]
-        return crc_to_check == crc
+        # data is one word: 2 data bytes followed by their CRC
+        return crc8(data, 0, len(data) - 1) == data[-1]
+
+    def _read_response(self, response_size=6):
+        """Read response_size bytes from the sensor, validated by CRC"""
+        data = self.i2c.readfrom(self.i2c_address, response_size)
+        if not check_frame(data, 0, response_size // 3):  # pos 2 and 5 are CRC
+            raise SHT30Error(SHT30Error.CRC_ERROR)
+        if data == bytearray(response_size):
+            raise SHT30Error(SHT30Error.DATA_ERROR)
+        return data
 
     def send_cmd(self, cmd_request, response_size=6, read_delay_ms=100):
         """
@@ -53,28 +147,121 @@ class MySht30:
         The responsed data is validated by CRC
         """
         try:
-            self.i2c.start();
-            self.i2c.writeto(self.i2c_address, cmd_request);
+            # writeto() and readfrom() each send their own START and STOP; the
+            # ESP32's hardware I2C has no bare start()/stop() to call
+            self.i2c.writeto(self.i2c_address, cmd_request)
             if not response_size:
-                self.i2c.stop()
                 return
             time.sleep_ms(read_delay_ms)
-            data = self.i2c.readfrom(self.i2c_address, response_size)
-            self.i2c.stop()
-            for i in range(response_size // 3):
-                if not self._check_crc(data[i * 3:(i + 1) * 3]):  # pos 2 and 5 are CRC
-                    raise Exception('OH NO')
-            if data == bytearray(response_size):
-                raise Exception('OH NO')
-            return data
-        except Exception as ex:
-            if 'I2C' in ex.args[0]:
-                raise Exception('OH NO')
-            raise ex
+            return self._read_response(response_size)
+        except OSError:
+            raise SHT30Error(SHT30Error.BUS_ERROR)
+
+    def _collect(self):
+        """Read a finished measurement into self._frame, validated by CRC"""
+        try:
+            self.i2c.readfrom_into(self.i2c_address, self._frame)
+        except OSError:
+            raise SHT30Error(SHT30Error.BUS_ERROR)
+        if not check_frame(self._frame):
+            raise SHT30Error(SHT30Error.CRC_ERROR)
+        return self._frame
+
+    def _decode(self, data):
+        t_raw = data[0] << 8 | data[1]
+        h_raw = data[3] << 8 | data[4]
+        self._raw[0] = t_raw
+        self._raw[1] = h_raw
+        self._centi[0] = self.centi_c(t_raw)
+        self._centi[1] = self.centi_rh(h_raw)
+        self._measured = True
+        return t_raw, h_raw
+
+    def _measurement(self, data, raw):
+        t_raw, h_raw = self._decode(data)
+        if raw:
+            return bytes(data)
+        self._current_data = self.words_to_int(t_raw, h_raw)
+        return self._current_data
+
+    def _wait(self):
+        if self._ready_at is None:
+            raise SHT30Error(SHT30Error.DATA_ERROR)
+        wait = time.ticks_diff(self._ready_at, time.ticks_ms())
+        if wait > 0:
+            time.sleep_ms(wait)
+        self._ready_at = None
+
+    def start(self, repeatability=None):
+        """
+        Trigger a single shot measurement and return without waiting for it.
+        Poll ready() and collect the result with read().
+        """
+        if repeatability is None:
+            repeatability = self.repeatability
+        if self._periodic:
+            self.stop_periodic()
+        self.send_cmd(self.SINGLE_SHOT_CMDS[repeatability], 0)
+        self._ready_at = time.ticks_add(time.ticks_ms(), self.MEASURE_DELAYS_MS[repeatability])
+
+    def ready(self):
+        """True once the measurement triggered by start() is done."""
+        return self._ready_at is not None and time.ticks_diff(time.ticks_ms(), self._ready_at) >= 0
+
+    def remaining_ms(self):
+        """Milliseconds left until the measurement triggered by start() is done."""
+        if self._ready_at is None:
+            return 0
+        return max(0, time.ticks_diff(self._ready_at, time.ticks_ms()))
+
+    def read(self, raw=False):
+        """
+        Collect the measurement triggered by start(), waiting out whatever is
+        left of its conversion time. Returns the same as measure_int().
+        """
+        self._wait()
+        return self._measurement(self._collect(), raw)
+
+    def start_periodic(self, mps=1, repeatability=None):
+        """
+        Put the sensor in periodic acquisition mode, measuring mps (0.5, 1,
+        2, 4 or 10) times per second. Results are collected with fetch().
+        """
+        if repeatability is None:
+            repeatability = self.repeatability
+        self.send_cmd(self.PERIODIC_CMDS[mps][repeatability], 0)
+        self._periodic = True
+
+    def start_art(self):
+        """Periodic acquisition in accelerated response time mode (4 mps)."""
+        self.send_cmd(self.ART_CMD, 0)
+        self._periodic = True
+
+    def stop_periodic(self):
+        """Back to single shot mode."""
+        self.send_cmd(self.BREAK_CMD, 0)
+        self._periodic = False
+        time.sleep_ms(1)
+
+    def fetch(self, raw=False):
+        """
+        Read the latest periodic measurement without triggering a new one.
+        Returns the same as measure_int(), or None if the sensor has no new
+        sample since the last fetch (it NACKs the read).
+        """
+        self.send_cmd(self.FETCH_CMD, 0)
+        try:
+            self.i2c.readfrom_into(self.i2c_address, self._frame)
+        except OSError:
+            return None
+        if not check_frame(self._frame):
+            raise SHT30Error(SHT30Error.CRC_ERROR)
+        return self._measurement(self._frame, raw)
 
     def measure_int(self, raw=False):
         """
         Get the temperature (T) and humidity (RH) measurement using integers.
+        Blocks only for the conversion time of the configured repeatability.
         If raw==True returns a bytearrya(6) with sensor direct measurement otherwise
         It returns a tuple with 4 values: T integer, T decimal, H integer, H decimal
         For instance to return T=24.0512 and RH= 34.662 This method will return
@@ -83,18 +270,76 @@ class MySht30:
         The units are Celsius and percent.
         """
 
-        data = self.send_cmd(self.MEASURE_CMD, 6);
-        if raw:
-            return data
-        aux = (data[0] << 8 | data[1]) * 175
+        if self._periodic:
+            self.stop_periodic()
+        self.start()
+        return self.read(raw)
+
+    def readinto(self, buf, start=True):
+        """
+        Measure and store the temperature in centi-degrees C in buf[0] and
+        the humidity in centi-percent in buf[1], e.g. 2405 and 3466 for
+        24.05 C and 34.66 %. buf is typically an array('h', (0, 0)) reused
+        across calls; no objects are allocated on the way. Returns buf.
+        With start=False the measurement already triggered by start() is
+        collected instead of a new one.
+        """
+        if start:
+            self.start()
+        self._wait()
+        data = self._collect()
+        self._raw[0] = data[0] << 8 | data[1]
+        self._raw[1] = data[3] << 8 | data[4]
+        buf[0] = self.centi_c(self._raw[0])
+        buf[1] = self.centi_rh(self._raw[1])
+        self._centi[0] = buf[0]
+        self._centi[1] = buf[1]
+        self._measured = True
+        return buf
+
+    def measure_centi(self):
+        """readinto() the driver's own buffer: array('h', (centi C, centi RH))"""
+        return self.readinto(self._centi)
+
+    # raw word * 175 / 0xffff, reduced to 3500 / 13107 so the product stays
+    # a small int on the ESP32 (no long int allocation)
+    @staticmethod
+    def centi_c(t_raw):
+        """Raw temperature word to centi-degrees C"""
+        return t_raw * 3500 // 13107 - 4500
+
+    @staticmethod
+    def centi_rh(h_raw):
+        """Raw humidity word to centi-percent RH"""
+        return h_raw * 2000 // 13107
+
+    @staticmethod
+    def raw_c(centi_c):
+        """Centi-degrees C to the raw temperature word centi_c() maps back to it"""
+        return max(0, min(0xffff, -(-(centi_c + 4500) * 13107 // 3500)))
+
+    @staticmethod
+    def raw_rh(centi_rh):
+        """Centi-percent RH to the raw humidity word centi_rh() maps back to it"""
+        return max(0, min(0xffff, -(-centi_rh * 13107 // 2000)))
+
+    @staticmethod
+    def centi_c_to_f(centi_c):
+        """Centi-degrees C to centi-degrees F"""
+        return centi_c * 9 // 5 + 3200
+
+    @staticmethod
+    def words_to_int(t_raw, h_raw):
+        """
+        Convert the raw 16 bit temperature and humidity words (as kept in
+        current_raw) to the (T int, T dec, H int, H dec) tuple measure_int returns.
+        """
+        aux = t_raw * 175
         t_int = (aux // 0xffff) - 45;
         t_dec = (aux % 0xffff * 100) // 0xffff
-        aux = (data[3] << 8 | data[4]) * 100
+        aux = h_raw * 100
         h_int = aux // 0xffff
         h_dec = (aux % 0xffff * 100) // 0xffff
-
-
-        self._current_data = t_int, t_dec, h_int, h_dec
         return t_int, t_dec, h_int, h_dec
 
     @staticmethod
@@ -103,11 +348,9 @@ class MySht30:
 
     @property
     def current_temp_c(self):
-        try:
-            return float(str(self._current_data[0]) + '.' + str(self._current_data[1]))
-        except Exception as e:
-            print(str(e))
-            return
+        if not self._measured:
+            return None
+        return self._centi[0] / 100
 
     @property
     def current_temp_f(self):
@@ -118,13 +361,22 @@ class MySht30:
         return self._current_data
 
     @property
-    def current_humidity(self):
-        try:
+    def current_raw(self):
+        """Raw (temperature, humidity) words of the last measurement that passed the CRC check."""
+        if not self._measured:
+            return None
+        return self._raw[0], self._raw[1]
 
-            return float(str(self._current_data[2]) + '.' + str(self._current_data[3]))
-        except Exception as e:
-            print(str(e))
-            return
+    @property
+    def current_centi(self):
+        """(centi-degrees C, centi-percent RH) of the last measurement, as an array"""
+        return self._centi
+
+    @property
+    def current_humidity(self):
+        if not self._measured:
+            return None
+        return self._centi[1] / 100
 
 
 class SHT30Error(Exception):
@@ -0,0 +1,192 @@
+"""
+Compact upload format for boards that post through gateway/gateway.py.
+
+A _bulk_docs upload repeats deviceId, deviceModel, deviceRelease and loc
+in every doc, and spells out every key and number as JSON text. Here the
+board registers those fields with the gateway once (POST <db>/_device)
+and gets back a small token; uploads then go to <db>/_packed as
+
+    header  <BH   format version, device token
+    record  kind byte, then
+              READING  <IhHhhH  dt, tempF, humRel, tempMinF, tempMaxF
+                                (all x100), samples
+              REPLAY   <IhHB    dt, tempF, humRel (x100), backlogFlags
+              JSON     <H       length, then the doc as JSON
+
+dt is Unix seconds. Docs that aren't plain readings (wake metrics) go as
+JSON records, still without the device fields they share. A reading is
+15 bytes instead of ~250. The gateway answers with _bulk_docs' per doc
+results, so what the board keeps and drops works as for BulkUploader.
+
+    uploader = PackedUploader("http://192.168.1.50:8080/home-sensors",
+                              {"deviceId": ..., "deviceModel": ...,
+                               "deviceRelease": ..., "loc": "sauna"})
+
+The token is kept in token_path across deepsleep; a board registers
+again when its device fields change (a firmware update) or the gateway
+no longer knows the token (412).
+"""
+import os
+import struct
+import ujson
+from uploader import BulkUploader
+
+VERSION = 1
+CONTENT_TYPE = "application/x-sauna-packed"
+HEADER = "<BH"
+KIND_READING = 1
+KIND_REPLAY = 2
+KIND_JSON = 3
+READING = "<IhHhhH"
+REPLAY = "<IhHB"
+DEVICE_FIELDS = ("deviceId", "deviceModel", "deviceRelease", "loc")
+
+
+def unix_seconds(dt):
+    """Unix seconds of an ISO 8601 UTC timestamp as TimeSource.isoformat() writes them."""
+    y = int(dt[0:4])
+    m = int(dt[5:7])
+    d = int(dt[8:10])
+    # days since 1970-01-01 without time.mktime, whose epoch differs by port
+    if m <= 2:
+        y -= 1
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m - 3 if m > 2 else m + 9) + 2) // 5 + d - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    return days * 86400 + int(dt[11:13]) * 3600 + int(dt[14:16]) * 60 + int(dt[17:19])
+
+
+def _x100(value, lo=-32768, hi=32767):
+    v = round(value * 100)
+    if not lo <= v <= hi:
+        raise ValueError("out of range")
+    return v
+
+
+def encode(doc, device):
+    """
+    One record for doc, leaving out its _id and the device fields it
+    shares with device (the registered ones). A doc with a field of its
+    own, say another zone's loc, goes as JSON to keep it.
+    """
+    for name in DEVICE_FIELDS:
+        if name in doc and doc[name] == device.get(name):
+            del doc[name]
+    doc.pop("_id", None)
+    try:
+        for name in DEVICE_FIELDS:
+            if name in doc:
+                raise ValueError("differs from the registered device")
+        if "samples" in doc:
+            return bytes([KIND_READING]) + struct.pack(
+                READING,
+                unix_seconds(doc["dt"]),
+                _x100(doc["tempF"]),
+                _x100(doc["humRel"], 0, 65535),
+                _x100(doc["tempMinF"]),
+                _x100(doc["tempMaxF"]),
+                doc["samples"],
+            )
+        if "backlogFlags" in doc:
+            return bytes([KIND_REPLAY]) + struct.pack(
+                REPLAY,
+                unix_seconds(doc["dt"]),
+                _x100(doc["tempF"]),
+                _x100(doc["humRel"], 0, 65535),
+                doc["backlogFlags"],
+            )
+    except (KeyError, TypeError, ValueError, OverflowError):
+        pass  # not a reading of the usual shape, send it as it is
+    data = ujson.dumps(doc).encode()
+    return bytes([KIND_JSON]) + struct.pack("<H", len(data)) + data
+
+
+class PackedUploader(BulkUploader):
+    """BulkUploader sending its buffer in the packed format."""
+
+    endpoint = "/_packed"
+    content_type = CONTENT_TYPE
+
+    def __init__(self, db_url, device, token_path="device.tok", **kw):
+        super().__init__(db_url, **kw)
+        # the gateway dedups docs without an _id by deviceId + dt + loc
+        self.replayable = True
+        self.token_path = token_path
+        self.device = None
+        self.use_device(device)
+
+    def use_device(self, device):
+        """
+        Send as device from the next flush on, registering it then unless
+        token_path has a token for it already.
+        """
+        if device == self.device:
+            return
+        self.device = device
+        self.token = None
+        try:
+            with open(self.token_path) as f:
+                saved = ujson.load(f)
+            if saved["device"] == device:
+                self.token = saved["token"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _registered(self, token):
+        self.token = token
+        with open(self.token_path, "w") as f:
+            ujson.dump({"token": token, "device": self.device}, f)
+
+    def _refused(self, status):
+        if status == 412:
+            # the gateway lost track of the token, register again
+            self.token = None
+            try:
+                os.remove(self.token_path)
+            except OSError:
+                pass
+
+    def _body(self):
+        yield struct.pack(HEADER, VERSION, self.token)
+        for line in self._lines():
+            yield encode(ujson.loads(line.split(" ", 1)[1]), self.device)
+
+    def flush(self):
+        # a second go if the gateway forgot the token
+        for _ in range(2):
+            if self.token is None and self.pending()[0]:
+                if self.session is None:
+                    import auth_urequests
+
+                    self.session = auth_urequests.Session()
+                resp = self.session.post(
+                    self.db_url + "/_device", json=self.device, auth=self.auth, parse_headers=False
+                )
+                if resp.status_code not in (200, 201):
+                    resp.close()
+                    return 0
+                self._registered(resp.json()["token"])
+            posted = super().flush()
+            if self.token is not None:
+                return posted
+        return 0
+
+    async def flush_async(self):
+        if self.db_url.startswith("https:"):
+            return self.flush()  # see BulkUploader.flush_async
+        import async_urequests
+
+        for _ in range(2):
+            if self.token is None and self.pending()[0]:
+                resp = await async_urequests.post(
+                    self.db_url + "/_device", json=self.device, auth=self.auth, parse_headers=False
+                )
+                if resp.status_code not in (200, 201):
+                    resp.close()
+                    return 0
+                self._registered((await resp.json())["token"])
+            posted = await super().flush_async()
+            if self.token is not None:
+                return posted
+        return 0
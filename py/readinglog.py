@@ -0,0 +1,159 @@
+"""
+Append-only on-flash log of readings that couldn't be uploaded.
+
+Each reading is one fixed-width binary record (see RECORD) rather than a
+JSON doc: the timestamp, the two raw SHT30 words and a flags byte,
+followed by a check byte so a torn or erased record is recognised. A
+separate cursor file holds the offset of the first record not yet
+replayed; it is replaced via rename, so a crash mid-commit leaves either
+the old or the new cursor and never loses or double-counts a batch.
+
+    log = ReadingLog()
+    log.append(time.time(), t_raw, h_raw, FLAG_NO_WIFI)
+    ...
+    log.drain(send)  # once the network is back
+
+Once the log holds max_records the oldest quarter is dropped to make
+room for new ones.
+"""
+import os
+import struct
+
+RECORD = "<IHHBB"  # time.time(), raw T word, raw RH word, flags, check
+RECORD_SIZE = struct.calcsize(RECORD)
+
+FLAG_NO_WIFI = 0x01  # WiFi association failed
+FLAG_POST_FAILED = 0x02  # connected but the upload failed
+FLAG_NO_TIME = 0x04  # timestamp from the local RTC, not synced from the network
+
+
+def _check(buf, offset):
+    c = 0x5A
+    for i in range(offset, offset + RECORD_SIZE - 1):
+        c = (c + buf[i]) & 0xFF
+    return c
+
+
+class ReadingLog:
+    def __init__(self, path="readings.log", max_records=2048):
+        self.path = path
+        self.cursor_path = path + ".cur"
+        self.max_records = max_records
+        self._buf = bytearray(RECORD_SIZE)
+
+    def _size(self):
+        try:
+            return os.stat(self.path)[6]
+        except OSError:
+            return 0
+
+    def _cursor(self):
+        try:
+            with open(self.cursor_path, "rb") as f:
+                return struct.unpack("<I", f.read(4))[0]
+        except Exception:
+            # missing, short or corrupt cursor file: replay from the start
+            return 0
+
+    def _set_cursor(self, offset):
+        tmp = self.cursor_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack("<I", offset))
+        os.rename(tmp, self.cursor_path)
+
+    def pending(self):
+        """Number of records waiting to be replayed."""
+        # a partial trailing record (power lost mid-append) is ignored
+        return max(0, self._size() // RECORD_SIZE * RECORD_SIZE - self._cursor()) // RECORD_SIZE
+
+    def append(self, timestamp, t_raw, h_raw, flags=0):
+        size = self._size()
+        if size % RECORD_SIZE:
+            # cut off a torn record so the new one starts on a boundary
+            size -= size % RECORD_SIZE
+            self._compact(0, size)
+        if size // RECORD_SIZE >= self.max_records:
+            self._evict()
+        buf = self._buf
+        struct.pack_into(RECORD, buf, 0, timestamp, t_raw, h_raw, flags, 0)
+        buf[RECORD_SIZE - 1] = _check(buf, 0)
+        with open(self.path, "ab") as f:
+            f.write(buf)
+
+    def _evict(self):
+        # drop the oldest quarter at once, so a full log isn't rewritten on every append
+        start = max(self._cursor(), self.max_records // 4 * RECORD_SIZE)
+        self._compact(start, self._size())
+
+    def _compact(self, start, end):
+        """Keep only bytes [start, end) of the log, resetting the cursor to 0."""
+        tmp = self.path + ".tmp"
+        cursor = max(0, self._cursor() - start)
+        chunk = bytearray(RECORD_SIZE * 32)
+        mv = memoryview(chunk)
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(start)
+            left = end - start
+            while left > 0:
+                n = src.readinto(mv[: min(left, len(chunk))])
+                if not n:
+                    break
+                dst.write(mv[:n])
+                left -= n
+        os.rename(tmp, self.path)
+        self._set_cursor(cursor)
+
+    def read(self, n):
+        """
+        Peek at up to n records from the cursor on. Returns (records, nbytes):
+        the valid records as (timestamp, t_raw, h_raw, flags) tuples and the
+        number of bytes covered, to be passed to commit() once handled.
+        """
+        cursor = self._cursor()
+        end = self._size() // RECORD_SIZE * RECORD_SIZE
+        nbytes = min(n * RECORD_SIZE, end - cursor)
+        if nbytes <= 0:
+            return [], 0
+        buf = bytearray(nbytes)
+        with open(self.path, "rb") as f:
+            f.seek(cursor)
+            f.readinto(buf)
+        records = []
+        for offset in range(0, nbytes, RECORD_SIZE):
+            if buf[offset + RECORD_SIZE - 1] != _check(buf, offset):
+                continue  # corrupt record, skip it
+            records.append(struct.unpack_from(RECORD, buf, offset)[:4])
+        return records, nbytes
+
+    def commit(self, nbytes):
+        """Mark nbytes worth of records (as returned by read) as replayed."""
+        cursor = self._cursor() + nbytes
+        if cursor >= self._size():
+            # everything replayed, start over with an empty log
+            self.clear()
+        else:
+            self._set_cursor(cursor)
+
+    def drain(self, send, batch=16):
+        """
+        Replay the backlog oldest first: send(records) is called with up to
+        batch records at a time and the cursor only moves on once it
+        returns. If send raises the remaining records stay queued.
+        Returns the number of records replayed.
+        """
+        total = 0
+        while True:
+            records, nbytes = self.read(batch)
+            if not nbytes:
+                return total
+            if records:
+                send(records)
+            self.commit(nbytes)
+            total += len(records)
+
+    def clear(self):
+        for path in (self.path, self.cursor_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
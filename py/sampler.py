@@ -0,0 +1,233 @@
+"""
+Oversampling and report suppression around MySht30.
+
+Sampler takes a burst of measurements and folds them into running
+statistics (Welford, O(1) memory), dropping frames that fail their CRC
+and samples that jump away from the rest. Deadband then decides whether
+the result is worth uploading: only when it moved by more than the
+deadband since the last reported value, or the heartbeat interval ran
+out, so a cold sauna isn't posted every wake.
+
+    stats = Sampler(sensor).sample()
+    deadband = Deadband()
+    if deadband.due(stats.temp.mean, stats.hum.mean):
+        ...upload...
+        deadband.reported(stats.temp.mean, stats.hum.mean)
+
+From a uasyncio task use await sampler.sample_async(), which yields
+during each conversion instead of sleeping. BusSampler does the same
+for all the sensors of a sensorbus.SensorBus at once.
+"""
+import time
+from array import array
+from mysht30 import SHT30Error
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream of numbers."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return self.variance ** 0.5
+
+
+class Sample:
+    """Result of one Sampler.sample() burst, values in centi-units."""
+
+    def __init__(self):
+        self.temp = RunningStats()  # centi-degrees C
+        self.hum = RunningStats()  # centi-percent RH
+        self.rejected = 0
+
+
+class Sampler:
+    def __init__(self, sensor, samples=8, max_dev=50, outlier_sigmas=3):
+        self.sensor = sensor
+        self.samples = samples
+        # a sample further than this (centi-units) from the mean so far, and
+        # more than outlier_sigmas standard deviations, is an outlier
+        self.max_dev = max_dev
+        self.outlier_sigmas = outlier_sigmas
+        self._buf = array('h', (0, 0))
+
+    def _outlier(self, stats, x):
+        if stats.count < 3:
+            return False
+        dev = abs(x - stats.mean)
+        return dev > self.max_dev and dev > self.outlier_sigmas * stats.stddev
+
+    def _add(self, result, buf):
+        if self._outlier(result.temp, buf[0]) or self._outlier(result.hum, buf[1]):
+            result.rejected += 1
+            return
+        result.temp.add(buf[0])
+        result.hum.add(buf[1])
+
+    def _result(self, result, error):
+        if not result.temp.count:
+            raise error if error is not None else SHT30Error(SHT30Error.DATA_ERROR)
+        return result
+
+    def sample(self):
+        """
+        Take self.samples measurements and return a Sample. Raises
+        SHT30Error if none of them could be used.
+        """
+        result = Sample()
+        buf = self._buf
+        error = None
+        for _ in range(self.samples):
+            try:
+                self.sensor.readinto(buf)
+            except SHT30Error as e:
+                error = e
+                result.rejected += 1
+                continue
+            self._add(result, buf)
+        return self._result(result, error)
+
+    async def sample_async(self):
+        """
+        Like sample(), but sleeps through each conversion with uasyncio so
+        other tasks run while the sensor is busy.
+        """
+        import uasyncio as asyncio
+
+        result = Sample()
+        buf = self._buf
+        sensor = self.sensor
+        error = None
+        for _ in range(self.samples):
+            try:
+                sensor.start()
+                await asyncio.sleep_ms(sensor.remaining_ms())
+                sensor.readinto(buf, False)
+            except SHT30Error as e:
+                error = e
+                result.rejected += 1
+                continue
+            self._add(result, buf)
+        return self._result(result, error)
+
+
+class BusSampler(Sampler):
+    """
+    Sampler over every sensor of a sensorbus.SensorBus: each round
+    triggers all of them, waits once for the slowest and collects them
+    all. sample() returns a Sample per sensor, in bus.sensors order. The
+    first sensor is the board's main one and raises SHT30Error like
+    Sampler if none of its measurements could be used; any other sensor
+    that gave nothing is None.
+    """
+
+    def _collect(self, results, errors, started):
+        sensors = self.sensor.sensors
+        buf = self._buf
+        for i in range(len(sensors)):
+            if i not in started:
+                results[i].rejected += 1
+                errors[i] = SHT30Error(SHT30Error.BUS_ERROR)
+                continue
+            try:
+                sensors[i].readinto(buf, False)
+            except SHT30Error as e:
+                errors[i] = e
+                results[i].rejected += 1
+                continue
+            self._add(results[i], buf)
+
+    def _results(self, results, errors):
+        out = [self._result(results[0], errors[0])]
+        for result in results[1:]:
+            out.append(result if result.temp.count else None)
+        return out
+
+    def sample(self):
+        bus = self.sensor
+        results = [Sample() for _ in bus.sensors]
+        errors = [None] * len(results)
+        for _ in range(self.samples):
+            started = bus.start_all()
+            time.sleep_ms(bus.remaining_ms())
+            self._collect(results, errors, started)
+        return self._results(results, errors)
+
+    async def sample_async(self):
+        import uasyncio as asyncio
+
+        bus = self.sensor
+        results = [Sample() for _ in bus.sensors]
+        errors = [None] * len(results)
+        for _ in range(self.samples):
+            started = bus.start_all()
+            await asyncio.sleep_ms(bus.remaining_ms())
+            self._collect(results, errors, started)
+        return self._results(results, errors)
+
+
+class Deadband:
+    """
+    Remembers the last reported values (in a small file, so it survives
+    deepsleep) and says when a new reading differs enough to be sent.
+    """
+
+    def __init__(self, temp=50, hum=200, heartbeat_s=1800, path="deadband.json"):
+        self.temp = temp  # centi-degrees C
+        self.hum = hum  # centi-percent RH
+        self.heartbeat_s = heartbeat_s
+        self.path = path
+        self.last = None  # (time.time(), temp, hum) of the last report
+        try:
+            import ujson
+
+            with open(path) as f:
+                self.last = tuple(ujson.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def heartbeat_due(self, now=None):
+        """True when the next reading is due whatever its value."""
+        if self.last is None:
+            return True
+        if now is None:
+            now = time.time()
+        return not 0 <= now - self.last[0] < self.heartbeat_s
+
+    def due(self, temp, hum, now=None):
+        if self.heartbeat_due(now):
+            return True
+        reported_at, last_temp, last_hum = self.last
+        return abs(temp - last_temp) >= self.temp or abs(hum - last_hum) >= self.hum
+
+    def reported(self, temp, hum, now=None):
+        import ujson
+
+        if now is None:
+            now = time.time()
+        self.last = (now, temp, hum)
+        with open(self.path, "w") as f:
+            ujson.dump(self.last, f)
@@ -0,0 +1,143 @@
+"""
+Picks how long to deepsleep before the next wake.
+
+While the stove is heating towards the target temperature the sauna is
+sampled often; once it's cold or holding steady the board sleeps long.
+Network failures back off exponentially so a dead access point doesn't
+keep the radio busy. State lives in a small file so the slope and the
+failure count survive deepsleep.
+
+    schedule = WakeScheduler()
+    ...
+    deepsleep(schedule.next_sleep_ms(temp_c=stats.temp.mean / 100, ok=posted))
+
+No machine or network imports: it runs unchanged on Linux, see
+simulate() for replaying a temperature trace.
+"""
+import time
+
+
+class WakeScheduler:
+    def __init__(
+        self,
+        target_c=80.0,
+        cold_c=35.0,
+        min_sleep_s=60,
+        max_sleep_s=900,
+        steady_c_per_min=0.1,
+        max_backoff_s=3600,
+        path="schedule.json",
+    ):
+        self.target_c = target_c
+        self.cold_c = cold_c  # below this and not warming: nobody's using it
+        self.min_sleep_s = min_sleep_s
+        self.max_sleep_s = max_sleep_s
+        self.steady_c_per_min = steady_c_per_min
+        self.max_backoff_s = max_backoff_s
+        self.path = path
+        self.last = None  # (time.time(), temp_c) of the previous wake
+        self.slope = 0.0  # degrees C per minute, smoothed
+        self.failures = 0
+        self._load()
+
+    def _load(self):
+        if self.path is None:
+            return
+        import ujson
+
+        try:
+            with open(self.path) as f:
+                state = ujson.load(f)
+            self.last = state["last"] and tuple(state["last"])
+            self.slope = state["slope"]
+            self.failures = state["failures"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        if self.path is None:
+            return
+        import ujson
+
+        with open(self.path, "w") as f:
+            ujson.dump({"last": self.last, "slope": self.slope, "failures": self.failures}, f)
+
+    def interval_s(self, temp_c):
+        """Sleep for a healthy wake at temp_c, given the current slope."""
+        if temp_c is None:
+            return self.max_sleep_s
+        if self.slope > self.steady_c_per_min and temp_c < self.target_c:
+            # heating: wake often enough to catch the target, sooner the closer it is
+            minutes_left = (self.target_c - temp_c) / self.slope
+            interval = minutes_left * 60 / 4
+        elif abs(self.slope) <= self.steady_c_per_min:
+            # holding steady, hot or cold
+            interval = self.max_sleep_s if temp_c < self.target_c else self.max_sleep_s / 2
+        elif temp_c < self.cold_c:
+            interval = self.max_sleep_s
+        else:
+            # cooling down after a session
+            interval = self.max_sleep_s / 2
+        return int(max(self.min_sleep_s, min(self.max_sleep_s, interval)))
+
+    def update(self, temp_c, now=None):
+        """Fold this wake's temperature into the slope estimate."""
+        if now is None:
+            now = time.time()
+        if temp_c is None:
+            return
+        if self.last is not None:
+            minutes = (now - self.last[0]) / 60
+            if 0 < minutes < 120:
+                slope = (temp_c - self.last[1]) / minutes
+                self.slope = slope if self.slope == 0.0 else (self.slope + slope) / 2
+            else:
+                # too long ago (or clock jumped), start over
+                self.slope = 0.0
+        self.last = (now, temp_c)
+
+    def next_sleep_ms(self, temp_c=None, ok=True, now=None):
+        """
+        Record this wake (temperature in C, or None if the sensor failed,
+        and whether the network part succeeded) and return how long to
+        sleep in milliseconds.
+        """
+        self.update(temp_c, now)
+        if ok:
+            self.failures = 0
+        else:
+            self.failures += 1
+        self._save()
+        return self.sleep_s(temp_c) * 1000
+
+    def sleep_s(self, temp_c):
+        """Sleep at temp_c, backed off for the failures in a row so far."""
+        sleep_s = self.interval_s(temp_c)
+        if self.failures:
+            # back off from the normal interval, doubling per failure
+            sleep_s = min(self.max_backoff_s, sleep_s * 2 ** min(self.failures, 10))
+        return sleep_s
+
+    def wakes_per_day(self, temp_c):
+        """Wakes per day if the current temperature, slope and failures held."""
+        return 86400 / self.sleep_s(temp_c)
+
+
+def simulate(trace, scheduler=None, failures=()):
+    """
+    Replay a temperature trace: trace(t) returns degrees C at t seconds.
+    failures is a set of wake numbers whose network part fails. Returns
+    the (t, temp_c, sleep_s) of every wake over one day.
+    """
+    if scheduler is None:
+        scheduler = WakeScheduler(path=None)
+    t = 0
+    wake = 0
+    wakes = []
+    while t < 86400:
+        temp_c = trace(t)
+        sleep_ms = scheduler.next_sleep_ms(temp_c, ok=wake not in failures, now=t)
+        wakes.append((t, temp_c, sleep_ms // 1000))
+        t += sleep_ms // 1000
+        wake += 1
+    return wakes
@@ -0,0 +1,132 @@
+"""
+All the SHT30s of a board, on one or more I2C buses, measured together.
+
+A multi-zone board (bench, ceiling, changing room) has a sensor per
+zone: up to two per bus (ADDR pin low 0x44, high 0x45) and as many
+buses as it has pin pairs. Their conversions run at the same time:
+start_all() triggers every sensor, one shared wait covers the slowest,
+then each result is collected, so N sensors cost one conversion time
+instead of N.
+
+    bus = SensorBus(((23, 22), (19, 18)))   # (scl, sda) per bus
+    started = bus.start_all()
+    time.sleep_ms(bus.remaining_ms())
+    for i in started:
+        bus.sensors[i].readinto(buf, False)
+
+The buses are scanned once and the addresses found are kept in path,
+so later wakes skip the scan (and the settle time after it). A sensor
+that stops answering drops the cache and the next wake scans again.
+With expected (how many sensors the board has) a scan that finds fewer
+isn't cached, and a cache with fewer is scanned again, so a sensor that
+was slow to power up on the first wake is picked up on a later one.
+With hardware=True the ESP32's I2C controllers (two at most) are used
+instead of bit-banged SoftI2C, at freq (default 1 MHz, Fast-mode Plus,
+which the SHT30 supports).
+
+sampler.BusSampler takes a burst from all sensors this way.
+"""
+import os
+import ujson
+from machine import Pin, SoftI2C, I2C
+from mysht30 import MySht30, SHT30Error
+
+SHT30_ADDRESSES = (0x44, 0x45)  # ADDR pin low, high
+
+
+class SensorBus:
+    def __init__(
+        self,
+        buses=((23, 22),),
+        hardware=False,
+        freq=None,
+        path="sensors.json",
+        repeatability=MySht30.LOW,
+        expected=None,
+    ):
+        if hardware and len(buses) > 2:
+            raise ValueError("the ESP32 has two I2C controllers")
+        if freq is None:
+            freq = 1000000 if hardware else 400000
+        self.path = path
+        self.buses = []
+        for i in range(len(buses)):
+            scl, sda = buses[i]
+            if hardware:
+                self.buses.append(I2C(i, scl=Pin(scl), sda=Pin(sda), freq=freq))
+            else:
+                self.buses.append(SoftI2C(scl=Pin(scl), sda=Pin(sda), freq=freq))
+        # the cache is only good for the same wiring
+        key = [list(b) for b in buses]
+        found = self._load(key)
+        if found is not None and expected is not None and self._count(found) < expected:
+            found = None  # one missed the scan that was cached, look again
+        self.scanned = found is None
+        if found is None:
+            found = [[a for a in bus.scan() if a in SHT30_ADDRESSES] for bus in self.buses]
+            if expected is None or self._count(found) >= expected:
+                self._save(key, found)
+            else:
+                print("%d of %d sensors found" % (self._count(found), expected))
+        self.sensors = []
+        self.where = []  # (bus index, address) of each sensor
+        for i in range(len(found)):
+            for address in found[i]:
+                self.sensors.append(MySht30(i2c=self.buses[i], address=address, repeatability=repeatability))
+                self.where.append((i, address))
+        if not self.sensors:
+            self.forget()
+            raise SHT30Error(SHT30Error.BUS_ERROR)
+
+    @staticmethod
+    def _count(found):
+        n = 0
+        for addresses in found:
+            n += len(addresses)
+        return n
+
+    def _load(self, key):
+        try:
+            with open(self.path) as f:
+                cached = ujson.load(f)
+            if cached["buses"] == key:
+                return cached["found"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _save(self, key, found):
+        try:
+            with open(self.path, "w") as f:
+                ujson.dump({"buses": key, "found": found}, f)
+        except OSError:
+            pass  # scan again next wake
+
+    def forget(self):
+        """Drop the cached addresses, the next SensorBus scans again."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def start_all(self):
+        """
+        Trigger a single shot measurement on every sensor. Returns the
+        indexes (into sensors) of those that took the command.
+        """
+        started = []
+        for i in range(len(self.sensors)):
+            try:
+                self.sensors[i].start()
+                started.append(i)
+            except SHT30Error:
+                # unplugged or readdressed since the scan
+                self.forget()
+        return started
+
+    def remaining_ms(self):
+        """Milliseconds until every started measurement is done."""
+        wait = 0
+        for sensor in self.sensors:
+            wait = max(wait, sensor.remaining_ms())
+        return wait
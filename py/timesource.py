@@ -0,0 +1,235 @@
+"""
+Wall clock for timestamping readings without a network round trip.
+
+The ESP32 RTC keeps counting through deepsleep, so once it has been set
+from the network a reading can be timestamped locally. TimeSource only
+syncs (SNTP, falling back to an HTTP time API) when the last sync is
+older than max_age_s or the RTC was reset, and in between corrects the
+RTC for the drift it measured across earlier syncs.
+
+    clock = TimeSource()
+    clock.ensure()              # syncs only if stale, needs the network
+    clock.isoformat()           # '2022-10-01T18:21:07.123456Z'
+
+Timestamps are microseconds since the Unix epoch, UTC. The clock and the
+sync functions are injectable, so it runs on Linux against a fake clock.
+ensure_async() does the same from a uasyncio task.
+"""
+import time
+
+# seconds between the Unix epoch and time.gmtime()'s epoch on this port
+_EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+# drift estimates from syncs closer together than this are too noisy
+_MIN_DRIFT_SPAN_US = 600 * 1000000
+_MAX_DRIFT = 0.001  # 1000 ppm, anything beyond that is a bad sync
+# a sync earlier than this (2020-01-01) is a broken reply, e.g. an SNTP
+# kiss-of-death read as a time, which would put the RTC back to 1900
+_MIN_SYNC_US = 1577836800 * 1000000
+
+
+class RtcClock:
+    """The board's RTC, read and set in Unix microseconds."""
+
+    def now_us(self):
+        try:
+            return time.time_ns() // 1000 + _EPOCH_OFFSET * 1000000
+        except AttributeError:
+            return (time.time() + _EPOCH_OFFSET) * 1000000
+
+    def set_us(self, us):
+        from machine import RTC
+
+        secs, frac = divmod(us, 1000000)
+        t = time.gmtime(secs - _EPOCH_OFFSET)
+        RTC().datetime((t[0], t[1], t[2], t[6], t[3], t[4], t[5], frac))
+
+
+def sntp_time(host="pool.ntp.org"):
+    import ntptime
+
+    ntptime.host = host
+    return (ntptime.time() + _EPOCH_OFFSET) * 1000000
+
+
+def http_time(session=None, url="http://worldtimeapi.org/api/timezone/Etc/UTC"):
+    if session is None:
+        import auth_urequests as session
+    start = time.ticks_us()
+    resp = session.get(url, parse_headers=False)
+    # only unixtime, not the whole response
+    unixtime = resp.json(paths=("unixtime",))["unixtime"]
+    # the server's second was read somewhere during the round trip
+    return unixtime * 1000000 + time.ticks_diff(time.ticks_us(), start) // 2
+
+
+def network_time(session=None):
+    """SNTP, or the HTTP time API when UDP/123 isn't getting through."""
+    try:
+        return sntp_time()
+    except (OSError, ValueError):
+        return http_time(session)
+
+
+_NTP_DELTA = 2208988800  # seconds between the NTP (1900) and Unix epochs
+
+
+async def sntp_time_async(host="pool.ntp.org", port=123, timeout_ms=1000):
+    """sntp_time() on a non-blocking socket, yielding while the reply is out."""
+    import usocket
+    import uasyncio as asyncio
+    import dnscache
+
+    addr = dnscache.getaddrinfo(host, port, 0, usocket.SOCK_DGRAM)[0][-1]
+    query = bytearray(48)
+    query[0] = 0x1B  # LI 0, version 3, client mode
+    s = usocket.socket(usocket.AF_INET, usocket.SOCK_DGRAM)
+    try:
+        s.setblocking(False)
+        s.sendto(query, addr)
+        start = time.ticks_ms()
+        while True:
+            try:
+                msg = s.recv(48)
+                break
+            except OSError:
+                if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                    raise OSError("SNTP timeout")
+                await asyncio.sleep_ms(5)
+    finally:
+        s.close()
+    return _sntp_reply(msg)
+
+
+def _sntp_reply(msg):
+    """Unix microseconds from an SNTP reply, ValueError if it carries no usable time."""
+    import struct
+
+    if len(msg) < 48:
+        raise ValueError("SNTP reply too short")
+    if msg[0] & 0x07 != 4:
+        raise ValueError("SNTP reply not from a server")
+    if msg[1] == 0:
+        # kiss-of-death: the server wants us to back off, the code says why
+        raise ValueError("SNTP kiss-of-death " + str(bytes(msg[12:16]), "ascii"))
+    secs, frac = struct.unpack("!II", msg[40:48])
+    if not secs:
+        raise ValueError("SNTP reply without a transmit time")
+    return (secs - _NTP_DELTA) * 1000000 + (frac >> 12) * 1000000 // 0x100000
+
+
+async def http_time_async(url="http://worldtimeapi.org/api/timezone/Etc/UTC"):
+    import async_urequests
+
+    start = time.ticks_us()
+    resp = await async_urequests.get(url, parse_headers=False)
+    unixtime = (await resp.json(paths=("unixtime",)))["unixtime"]
+    return unixtime * 1000000 + time.ticks_diff(time.ticks_us(), start) // 2
+
+
+async def network_time_async():
+    """network_time() for a uasyncio task."""
+    try:
+        return await sntp_time_async()
+    except (OSError, ValueError):
+        return await http_time_async()
+
+
+class TimeSource:
+    def __init__(self, clock=None, sync=None, state_path="timesync.json", max_age_s=6 * 3600, sync_async=None):
+        self.clock = clock if clock is not None else RtcClock()
+        self._sync = sync if sync is not None else network_time
+        self._sync_async = sync_async if sync_async is not None else network_time_async
+        self.state_path = state_path
+        self.max_age_us = max_age_s * 1000000
+        # RTC reading right after the last sync, measured drift (fraction),
+        # number of syncs so far
+        self.synced_at = None
+        self.drift = 0.0
+        self.syncs = 0
+        self._load()
+
+    def _load(self):
+        import ujson
+
+        try:
+            with open(self.state_path) as f:
+                state = ujson.load(f)
+            self.synced_at = state["synced_at"]
+            self.drift = state["drift"]
+            self.syncs = state["syncs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        import ujson
+
+        with open(self.state_path, "w") as f:
+            ujson.dump({"synced_at": self.synced_at, "drift": self.drift, "syncs": self.syncs}, f)
+
+    @property
+    def synced(self):
+        """True while the RTC holds a time set by a sync (it hasn't been reset since)."""
+        return self.synced_at is not None and self.clock.now_us() >= self.synced_at
+
+    def stale(self):
+        if not self.synced:
+            return True
+        return self.clock.now_us() - self.synced_at > self.max_age_us
+
+    def sync(self):
+        """Set the RTC from the network and update the drift estimate."""
+        self._apply(self._sync())
+
+    async def sync_async(self):
+        self._apply(await self._sync_async())
+
+    def _apply(self, true_us):
+        if true_us < _MIN_SYNC_US:
+            raise ValueError("time from the network is before 2020")
+        rtc_us = self.clock.now_us()
+        if self.synced:
+            span = rtc_us - self.synced_at
+            if span >= _MIN_DRIFT_SPAN_US:
+                drift = (true_us - rtc_us) / span
+                if -_MAX_DRIFT < drift < _MAX_DRIFT:
+                    self.drift = drift if self.syncs < 2 else (self.drift + drift) / 2
+        self.clock.set_us(true_us)
+        self.synced_at = true_us
+        self.syncs += 1
+        self._save()
+
+    def ensure(self):
+        """
+        Sync if the RTC can't be trusted anymore. Returns whether the time
+        is good; a failed sync leaves an already synced RTC in use.
+        """
+        if self.stale():
+            try:
+                self.sync()
+            except (OSError, ValueError, KeyError) as e:
+                print("Time sync failed: " + str(e))
+        return self.synced
+
+    async def ensure_async(self):
+        """ensure() for a uasyncio task, the sync doesn't block other tasks."""
+        if self.stale():
+            try:
+                await self.sync_async()
+            except (OSError, ValueError, KeyError) as e:
+                print("Time sync failed: " + str(e))
+        return self.synced
+
+    def now_us(self):
+        """Drift corrected Unix time in microseconds."""
+        rtc_us = self.clock.now_us()
+        if self.synced:
+            rtc_us += int((rtc_us - self.synced_at) * self.drift)
+        return rtc_us
+
+    def isoformat(self, us=None):
+        if us is None:
+            us = self.now_us()
+        secs, frac = divmod(us, 1000000)
+        t = time.gmtime(secs - _EPOCH_OFFSET)
+        return "%04d-%02d-%02dT%02d:%02d:%02d.%06dZ" % (t[0], t[1], t[2], t[3], t[4], t[5], frac)
@@ -0,0 +1,74 @@
+"""
+TLS for auth_urequests: one SSL context for every connection.
+
+ussl.wrap_socket() sets up a new context for each connection it wraps,
+CA certificates parsed again included, on top of the handshake itself,
+which costs the ESP32 seconds of CPU and a large heap spike. Here the
+context is set up once and every connection of the wake shares it.
+
+    tlscache.configure(cadata=ca_der)    # optional, see below
+    s = tlscache.wrap(sock, "couch.example.com")
+    tlscache.stats                      # {"full": 2, "resumed": 0, "full_ms": ..., "resumed_ms": ...}
+
+Without configure() certificates aren't verified, as with the
+ussl.wrap_socket() this replaces; cadata turns verification on. Without
+ussl.SSLContext (older MicroPython) every connection goes through
+ussl.wrap_socket(), counted in stats all the same.
+
+Every handshake is a full one: no TLS session resumption. That would
+need wrap_socket(session=) and the socket's session / session_reused,
+which no MicroPython port has, and keeping sessions across deepsleep
+would need them serialized, which CPython can't do either. A handshake
+is only counted as resumed if the socket says so (session_reused), which
+on the board it never does.
+"""
+import time
+import ussl
+
+stats = {"full": 0, "resumed": 0, "full_ms": 0, "resumed_ms": 0}
+
+_context = None
+_cadata = None
+
+
+def configure(cadata=None):
+    """Verify servers against the CA certificate(s) in cadata (DER or PEM)."""
+    global _context, _cadata
+    _cadata = cadata
+    _context = None
+
+
+def context():
+    """The shared SSLContext, None on ports without one."""
+    global _context
+    if _context is None and hasattr(ussl, "SSLContext"):
+        ctx = ussl.SSLContext(ussl.PROTOCOL_TLS_CLIENT)
+        if _cadata is None:
+            ctx.verify_mode = ussl.CERT_NONE
+        else:
+            ctx.load_verify_locations(cadata=_cadata)
+            ctx.verify_mode = ussl.CERT_REQUIRED
+        _context = ctx
+    return _context
+
+
+def wrap(sock, host, trace=None):
+    """
+    TLS client socket over the connected sock, through the shared
+    context. trace (a tracer.Tracer) counts the handshake as tlsFull or
+    tlsResumed.
+    """
+    ctx = context()
+    start = time.ticks_ms()
+    if ctx is None:
+        s = ussl.wrap_socket(sock, server_hostname=host)
+    else:
+        s = ctx.wrap_socket(sock, server_hostname=host)
+    resumed = bool(getattr(s, "session_reused", False))
+    ms = time.ticks_diff(time.ticks_ms(), start)
+    kind = "resumed" if resumed else "full"
+    stats[kind] += 1
+    stats[kind + "_ms"] += ms
+    if trace is not None:
+        trace.count("tlsResumed" if resumed else "tlsFull")
+    return s
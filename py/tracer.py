@@ -0,0 +1,243 @@
+"""
+Lightweight tracing for a wake: where the time and the heap go.
+
+Spans and marks are timed with ticks_us and carry a gc.mem_free()
+snapshot. They're packed into a preallocated bytearray (RECORD, 10 bytes
+each), so tracing a wake doesn't allocate per event. Counters sum up
+things like the bytes a socket sent and received.
+
+    trace = Tracer()
+    with trace.span("wifi"):
+        ...
+    s = trace.socket(s)    # counts "tx" / "rx" bytes
+    trace.summary()        # {'ms': {'wifi': 315}, 'heapMin': 81232, 'tx': 512, 'rx': 230}
+
+NullTracer has the same interface and does nothing, so tracing can be
+switched off without touching the code being traced. Hot paths (the
+HTTP clients) only hold a reference to a tracer when one is enabled, see
+auth_urequests.trace.
+"""
+import struct
+import time
+
+try:
+    from gc import mem_free
+except ImportError:
+    mem_free = None  # CPython
+
+RECORD = "<BBII"  # name index, kind, ticks_us since the start, gc.mem_free()
+RECORD_SIZE = struct.calcsize(RECORD)
+
+BEGIN = 0
+END = 1
+MARK = 2
+
+
+class _Span:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.tracer.begin(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.end(self.name)
+
+
+class Tracer:
+    def __init__(self, capacity=48, start_us=None):
+        # ticks_us the trace is relative to, e.g. taken before the imports
+        self._t0 = time.ticks_us() if start_us is None else start_us
+        self._buf = bytearray(capacity * RECORD_SIZE)
+        self._n = 0
+        self._names = []
+        self._spans = {}
+        self.counters = {}
+        self.dropped = 0  # records that didn't fit
+
+    def _index(self, name):
+        try:
+            return self._names.index(name)
+        except ValueError:
+            self._names.append(name)
+            return len(self._names) - 1
+
+    def _record(self, name, kind):
+        if (self._n + 1) * RECORD_SIZE > len(self._buf):
+            self.dropped += 1
+            return
+        t = time.ticks_diff(time.ticks_us(), self._t0)
+        free = mem_free() if mem_free is not None else 0
+        struct.pack_into(RECORD, self._buf, self._n * RECORD_SIZE, self._index(name), kind, t, free)
+        self._n += 1
+
+    def begin(self, name):
+        self._record(name, BEGIN)
+
+    def end(self, name):
+        """End span name; without a begin() it's measured from the start."""
+        self._record(name, END)
+
+    def mark(self, name):
+        self._record(name, MARK)
+
+    def span(self, name):
+        """Context manager around begin(name) / end(name)."""
+        span = self._spans.get(name)
+        if span is None:
+            span = self._spans[name] = _Span(self, name)
+        return span
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def records(self):
+        """(us since the start, kind, name, mem_free) for every record so far."""
+        for i in range(self._n):
+            index, kind, t, free = struct.unpack_from(RECORD, self._buf, i * RECORD_SIZE)
+            yield t, kind, self._names[index], free
+
+    def durations_us(self):
+        """Total us spent in each span, in the order they first ended."""
+        begun = {}
+        out = {}
+        for t, kind, name, free in self.records():
+            if kind == BEGIN:
+                begun[name] = t
+            elif kind == END:
+                out[name] = out.get(name, 0) + t - begun.pop(name, 0)
+        return out
+
+    def summary(self):
+        """Compact dict for a metrics doc: span ms, lowest free heap, counters."""
+        ms = {}
+        durations = self.durations_us()
+        for name in durations:
+            ms[name] = durations[name] // 1000
+        summary = {"ms": ms}
+        if mem_free is not None and self._n:
+            summary["heapMin"] = min(free for t, kind, name, free in self.records())
+        for name in self.counters:
+            summary[name] = self.counters[name]
+        if self.dropped:
+            summary["dropped"] = self.dropped
+        return summary
+
+    def socket(self, s):
+        return _CountingSocket(s, self)
+
+    def streams(self, reader, writer):
+        return _CountingReader(reader, self), _CountingWriter(writer, self)
+
+
+class NullTracer:
+    """Tracer that records nothing, for when tracing is off."""
+
+    counters = {}
+    dropped = 0
+
+    def begin(self, name):
+        pass
+
+    def end(self, name):
+        pass
+
+    def mark(self, name):
+        pass
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def count(self, name, n=1):
+        pass
+
+    def records(self):
+        return iter(())
+
+    def durations_us(self):
+        return {}
+
+    def summary(self):
+        return None
+
+    def socket(self, s):
+        return s
+
+    def streams(self, reader, writer):
+        return reader, writer
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _CountingSocket:
+    """Socket wrapper adding the bytes through it to the tracer's tx / rx counters."""
+
+    def __init__(self, s, tracer):
+        self._s = s
+        self._tracer = tracer
+
+    def write(self, data):
+        n = self._s.write(data)
+        self._tracer.count("tx", len(data) if n is None else n)
+        return n
+
+    def read(self, n=-1):
+        data = self._s.read(n)
+        self._tracer.count("rx", len(data))
+        return data
+
+    def readline(self):
+        data = self._s.readline()
+        self._tracer.count("rx", len(data))
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        n = self._s.readinto(buf) if nbytes is None else self._s.readinto(buf, nbytes)
+        self._tracer.count("rx", n or 0)
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._s, name)
+
+
+class _CountingReader:
+    def __init__(self, reader, tracer):
+        self._r = reader
+        self._tracer = tracer
+
+    async def read(self, n=-1):
+        data = await self._r.read(n)
+        self._tracer.count("rx", len(data))
+        return data
+
+    async def readline(self):
+        data = await self._r.readline()
+        self._tracer.count("rx", len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._r, name)
+
+
+class _CountingWriter:
+    def __init__(self, writer, tracer):
+        self._w = writer
+        self._tracer = tracer
+
+    def write(self, data):
+        self._tracer.count("tx", len(data))
+        return self._w.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._w, name)
@@ -0,0 +1,187 @@
+"""
+Buffers readings on flash and uploads them to CouchDB in batches.
+
+Every add() appends one line to a small file; once max_count readings
+are waiting, or the oldest one is max_age_s old, flush() sends them all
+in a single POST to <db>/_bulk_docs. Documents CouchDB rejected stay in
+the buffer for the next flush, everything it stored is dropped.
+
+    uploader = BulkUploader("http://192.168.1.101:5984/home-sensors",
+                            session=session, auth=["COUCHUSER", "COUCHPW"])
+    uploader.add(data)
+    if uploader.due():
+        uploader.flush()
+"""
+import os
+import random
+import time
+import ujson
+
+
+class BulkUploader:
+    # where flush() posts the buffer and as what, see packed.PackedUploader
+    endpoint = "/_bulk_docs"
+    content_type = "application/json"
+
+    def __init__(
+        self,
+        db_url,
+        session=None,
+        auth=None,
+        path="readings.buf",
+        max_count=10,
+        max_age_s=1800,
+        max_buffered=200,
+        id_prefix=None,
+        tries=3,
+    ):
+        self.db_url = db_url
+        self.session = session
+        self.auth = auth
+        self.path = path
+        self.max_count = max_count
+        self.max_age_s = max_age_s
+        self.max_buffered = max_buffered
+        # with a prefix each doc gets its own _id, so a batch that reached
+        # CouchDB but whose response was lost comes back as conflicts
+        # instead of duplicates when it's retried
+        self.id_prefix = id_prefix
+        # a failed upload is tried again within the wake (see deadline.Retry);
+        # once it may have reached CouchDB, only if that can't duplicate docs
+        self.tries = tries
+        self.replayable = id_prefix is not None
+
+    def _lines(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        yield line
+        except OSError:
+            return
+
+    def _rewrite(self, keep):
+        """Replace the buffer with the lines for which keep(index) is true."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            i = 0
+            for line in self._lines():
+                if keep(i):
+                    f.write(line)
+                i += 1
+        # rename so a crash leaves either the old or the new buffer
+        os.rename(tmp, self.path)
+
+    def pending(self):
+        """Return (number of buffered readings, time.time() of the oldest)."""
+        count = 0
+        oldest = None
+        for line in self._lines():
+            if oldest is None:
+                oldest = int(line.split(" ", 1)[0])
+            count += 1
+        return count, oldest
+
+    def add(self, doc):
+        now = time.time()
+        count, oldest = self.pending()
+        if self.id_prefix is not None and "_id" not in doc:
+            # random bits, not a count: an RTC reset before the next sync can
+            # bring the same seconds back, and an _id CouchDB already has
+            # would drop the new reading as a conflict
+            doc["_id"] = "%s-%d-%08x" % (self.id_prefix, now, random.getrandbits(32))
+        if count >= self.max_buffered:
+            # ring buffer: drop the oldest readings to make room
+            drop = count - self.max_buffered + 1
+            self._rewrite(lambda i: i >= drop)
+        with open(self.path, "a") as f:
+            f.write("%d %s\n" % (now, ujson.dumps(doc)))
+
+    def due(self):
+        count, oldest = self.pending()
+        if not count:
+            return False
+        return count >= self.max_count or time.time() - oldest >= self.max_age_s
+
+    def _body(self):
+        # streamed as a chunked request so the batch is never held in memory
+        sep = b'{"docs":['
+        for line in self._lines():
+            yield sep
+            yield line.split(" ", 1)[1].rstrip().encode()
+            sep = b","
+        yield b"]}"
+
+    def flush(self):
+        """
+        Upload everything buffered. Returns the number of docs CouchDB
+        stored; rejected docs are kept for the next flush. Raises OSError
+        if the request itself fails, leaving the buffer untouched.
+        """
+        count, oldest = self.pending()
+        if not count:
+            return 0
+        if self.session is None:
+            import auth_urequests
+
+            self.session = auth_urequests.Session()
+        import deadline
+
+        resp = self.session.post(
+            self.db_url + self.endpoint,
+            data=self._body,
+            headers={"Content-Type": self.content_type},
+            auth=self.auth,
+            retry=deadline.Retry(self.tries),
+            idempotent=self.replayable,
+            parse_headers=False,
+        )
+        if resp.status_code not in (200, 201):
+            self._refused(resp.status_code)
+            resp.close()
+            return 0
+        return self._settle(resp.json())
+
+    async def flush_async(self):
+        """flush() for a uasyncio task, sent through async_urequests."""
+        if self.db_url.startswith("https:"):
+            # async_urequests has no TLS, the blocking client has (tlscache)
+            return self.flush()
+        import async_urequests
+        import deadline
+
+        count, oldest = self.pending()
+        if not count:
+            return 0
+        resp = await async_urequests.post(
+            self.db_url + self.endpoint,
+            data=self._body,
+            headers={"Content-Type": self.content_type},
+            auth=self.auth,
+            retry=deadline.Retry(self.tries),
+            idempotent=self.replayable,
+            parse_headers=False,
+        )
+        if resp.status_code not in (200, 201):
+            self._refused(resp.status_code)
+            resp.close()
+            return 0
+        return self._settle(await resp.json())
+
+    def _refused(self, status):
+        """Called with the status of an upload that wasn't accepted."""
+        pass
+
+    def _settle(self, results):
+        """Drop what CouchDB stored from the buffer, return how many that was."""
+        failed = {}
+        for i in range(len(results)):
+            r = results[i]
+            # a conflict on a doc with our own _id means it's already stored
+            if "error" in r and r["error"] != "conflict":
+                failed[i] = r["error"]
+        if failed:
+            self._rewrite(lambda i: i in failed)
+        else:
+            os.remove(self.path)
+        return len(results) - len(failed)
@@ -1,5 +1,11 @@
 import usocket
 
+try:
+    # caching resolver from the sauna-monitor tree, when it's on the device
+    from dnscache import getaddrinfo
+except ImportError:
+    getaddrinfo = usocket.getaddrinfo
+
 
 class Response:
     def __init__(self, f):
@@ -73,7 +79,7 @@ def request(
         host, port = host.split(":", 1)
         port = int(port)
 
-    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+    ai = getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
     ai = ai[0]
 
     resp_d = None
@@ -0,0 +1,411 @@
+"""
+One wake, from power-on to deepsleep, as concurrent uasyncio tasks.
+
+The SHT30 burst, WiFi association and the time sync overlap instead of
+running one after the other, the LEDs blink from background tasks and
+nothing sleeps longer than it has to:
+
+    sensor burst    |===|
+    wifi            |===========|
+    time sync                   |=|
+    upload                        |==|
+    leds            |~~~~~~~~~~~~~~~~~~|
+
+WiFi is started alongside the burst only when the network is needed
+whatever the reading says (a batch or the offline backlog is due, or
+the deadband's heartbeat ran out). Otherwise the burst, a few tens of
+milliseconds, decides first and the radio stays off when nothing moved.
+
+    import wake
+    deepsleep(wake.run())
+
+run() returns the deepsleep interval in ms. Each phase is a span on
+Wake.trace (a tracer.Tracer, timed from the ticks_us boot.py passes as
+start), which also counts the bytes the HTTP clients move and tracks
+the free heap. run() prints the spans as the boot report. Wakes that
+went online keep their summary in METRICS_PATH; the next batch upload
+takes them along as "wakeMetrics" docs, so the metrics never cost a
+request (or a wake) of their own. Set TRACE = False to switch all of
+it off.
+sim/harness.py runs wakes on Linux and prints their traces.
+
+Only what every wake needs is imported up front. The network stack
+(network, usocket, the HTTP client, the DNS cache) is imported the
+first time a wake actually goes online, so the most common wake, a
+reading that didn't move, never loads it. bench/bench_imports.py
+measures what each module costs to import.
+"""
+import os
+import sys
+import uasyncio as asyncio
+from machine import Pin, unique_id
+from mysht30 import MySht30
+from sensorbus import SensorBus
+from uploader import BulkUploader
+from readinglog import ReadingLog, FLAG_NO_WIFI, FLAG_POST_FAILED, FLAG_NO_TIME
+from timesource import TimeSource
+from sampler import BusSampler, Deadband
+from scheduler import WakeScheduler
+from tracer import Tracer, NullTracer
+
+DB_URL = "http://192.168.1.101:5984/home-sensors"
+DB_AUTH = ["COUCHUSER", "COUCHPW"]
+WIFI_SSID = "MYWIFI"
+WIFI_PASSWORD = "MYWIFIPW"
+TRACE = True
+# DB_URL is a gateway/gateway.py: upload in its compact format (packed.py)
+PACKED = False
+# (scl, sda) of each I2C bus with SHT30s on it, see sensorbus.py
+I2C_BUSES = ((23, 22),)
+I2C_HARDWARE = False
+# loc of each sensor by (bus index, address); the first sensor found (in
+# bus, then address order) is the main one, which decides when to report,
+# the others go along with it. While fewer sensors answer than there are
+# ZONES, every wake scans the buses again
+ZONES = {}
+METRICS_PATH = "metrics.buf"  # one JSON trace summary per line
+# how long the requests of a wake may take all told, from going online,
+# so a hung server can't keep the board from deepsleep (see deadline.py)
+NET_BUDGET_MS = 30000
+
+
+class Leds:
+    """Status LEDs, blinked from background tasks."""
+
+    def __init__(self):
+        self.embedded = Pin(2, Pin.OUT)
+        self.pending = Pin(18, Pin.OUT)
+        self.success = Pin(19, Pin.OUT)
+        self.error = Pin(21, Pin.OUT)
+        self._tasks = []
+
+    async def _blink(self, pin, times, on_ms, off_ms):
+        for _ in range(times):
+            pin.value(1)
+            await asyncio.sleep_ms(on_ms)
+            pin.value(0)
+            await asyncio.sleep_ms(off_ms)
+
+    def blink(self, pin, times=1, on_ms=100, off_ms=100):
+        """Blink pin in the background and return straight away."""
+        self._tasks.append(asyncio.create_task(self._blink(pin, times, on_ms, off_ms)))
+
+    async def idle(self):
+        """Wait for the blinks started so far to finish."""
+        for task in self._tasks:
+            await task
+        self._tasks = []
+
+    def off(self):
+        for pin in (self.embedded, self.pending, self.success, self.error):
+            pin.value(0)
+
+
+class Wake:
+    def __init__(
+        self,
+        db_url=DB_URL,
+        auth=DB_AUTH,
+        wifi=None,
+        clock=None,
+        bus=None,
+        backlog=None,
+        uploader=None,
+        deadband=None,
+        leds=None,
+        trace=None,
+        start=None,
+    ):
+        if trace is None:
+            # start is the ticks_us the wake began at, boot.py takes it before its imports
+            trace = Tracer(start_us=start) if TRACE else NullTracer()
+        self.trace = trace
+        trace.end("imports")
+        self.db_url = db_url
+        self.auth = auth
+        self._wifi = wifi
+        self._online = False  # network stack imported and the DNS cache loaded
+        # RTC backed clock, only synced over the network when it goes stale
+        self.clock = clock if clock is not None else TimeSource()
+        self.bus = bus
+        self.loc = 'sauna'  # of the main sensor
+        self.zones = []  # (loc, Sample) of the other sensors, from the last burst
+        # readings from earlier wakes that never made it to couch
+        self.backlog = backlog if backlog is not None else ReadingLog()
+        # the b'...' repr docs have always carried as deviceId, kept so existing data still matches
+        self.device_id = str(unique_id())
+        device_info = os.uname()
+        self.device_model = device_info.sysname
+        self.device_release = device_info.release
+        # readings are kept on flash and sent to couch in batches via _bulk_docs
+        if uploader is None:
+            if PACKED:
+                from packed import PackedUploader
+
+                # registered as the main sensor's loc once _measure() knows it
+                uploader = PackedUploader(db_url, self._doc({}), auth=auth)
+            else:
+                from ubinascii import hexlify
+
+                # _ids get the plain hex of the chip ID
+                uploader = BulkUploader(db_url, auth=auth, id_prefix=str(hexlify(unique_id()), "ascii"))
+        self.uploader = uploader
+        # only report when the reading moved or the heartbeat is due
+        self.deadband = deadband if deadband is not None else Deadband()
+        self.leds = leds if leds is not None else Leds()
+        self.reading = None  # raw sensor words, logged to flash if this wake can't upload them
+        self.reading_us = None
+        self.buffered = False
+        self.temp_c = None  # for the wake scheduler
+        self.ok = True
+        self._was_synced = False
+
+    @property
+    def wifi(self):
+        if self._wifi is None:
+            from wifi import WifiManager
+
+            # remembers the access point and DHCP lease for a fast reconnect next wake
+            self._wifi = WifiManager(WIFI_SSID, WIFI_PASSWORD)
+        return self._wifi
+
+    def _connected(self):
+        # without importing the network stack just to find out it's down
+        return self._wifi is not None and self._wifi.isconnected()
+
+    def _doc(self, fields, loc=None):
+        fields['loc'] = self.loc if loc is None else loc
+        fields['deviceModel'] = self.device_model
+        fields['deviceId'] = self.device_id
+        fields['deviceRelease'] = self.device_release
+        return fields
+
+    def record_doc(self, record):
+        # rebuild the couch doc for a reading replayed from the backlog
+        timestamp, t_raw, h_raw, flags = record
+        return self._doc({
+            'tempF': MySht30.centi_c_to_f(MySht30.centi_c(t_raw)) / 100,
+            'humRel': MySht30.centi_rh(h_raw) / 100,
+            'dt': self.clock.isoformat(timestamp * 1000000),
+            'backlogFlags': flags,
+        })
+
+    def reading_doc(self, stats, loc=None):
+        return self._doc({
+            'tempF': MySht30.centi_c_to_f(stats.temp.mean) / 100,
+            'humRel': stats.hum.mean / 100,
+            'tempMinF': MySht30.centi_c_to_f(stats.temp.min) / 100,
+            'tempMaxF': MySht30.centi_c_to_f(stats.temp.max) / 100,
+            'samples': stats.temp.count,
+            'dt': self.clock.isoformat(self.reading_us),
+        }, loc)
+
+    async def _measure(self):
+        with self.trace.span("sensor"):
+            if self.bus is None:
+                self.bus = SensorBus(I2C_BUSES, I2C_HARDWARE, expected=len(ZONES) or None)
+            bus = self.bus
+            # all sensors convert at once, one wait for the lot
+            samples = await BusSampler(bus).sample_async()
+            stats = samples[0]
+            self.zones = []
+            for i in range(1, len(samples)):
+                if samples[i] is not None:
+                    bus_index, address = bus.where[i]
+                    self.zones.append((ZONES.get(bus.where[i], "zone-%d-%x" % (bus_index, address)), samples[i]))
+            self.loc = ZONES.get(bus.where[0], 'sauna')
+            use_device = getattr(self.uploader, "use_device", None)
+            if use_device is not None:
+                use_device(self._doc({}))
+            # what goes to the offline log is the reported mean, not the burst's last frame
+            self.reading = (MySht30.raw_c(round(stats.temp.mean)), MySht30.raw_rh(round(stats.hum.mean)))
+            self._was_synced = self.clock.synced
+            self.reading_us = self.clock.now_us()
+        print(f"{stats.temp.count} samples, {stats.rejected} rejected")
+        return stats
+
+    def _go_online(self):
+        import deadline
+        import dnscache
+        import async_urequests
+
+        deadline.start(NET_BUDGET_MS)
+
+        # resolved addresses from the previous wake
+        dnscache.load()
+        if not isinstance(self.trace, NullTracer):
+            async_urequests.trace = self.trace
+        self._online = True
+
+    async def _network(self):
+        trace = self.trace
+        with trace.span("wifi"):
+            if not self._online:
+                self._go_online()
+            if not await self.wifi.connect_async():
+                raise Exception('Unable to connect to WIFI')
+        print(f"WiFi: {self.wifi.metrics}")
+        # timestamps come from the RTC, the network is only asked when it's stale
+        with trace.span("time"):
+            if not await self.clock.ensure_async():
+                raise Exception('Unable to get the time')
+
+    async def main(self):
+        leds = self.leds
+        # startup blinks so we know we're starting, without holding anything up
+        leds.blink(leds.embedded, 3, 50, 50)
+        leds.pending.value(1)
+        net = None
+        uploader = self.uploader
+        deadband = self.deadband
+        try:
+            if uploader.due() or self.backlog.pending() or deadband.heartbeat_due():
+                net = asyncio.create_task(self._network())
+
+            stats = await self._measure()
+            self.temp_c = stats.temp.mean / 100
+            report = deadband.due(stats.temp.mean, stats.hum.mean)
+            if not report:
+                self.reading = None
+            if net is None:
+                if not (report or uploader.due() or self.backlog.pending()):
+                    print("No significant change, skipping upload")
+                    leds.pending.value(0)
+                    return
+                net = asyncio.create_task(self._network())
+            await net
+            if not self._was_synced:
+                # the RTC was only just set, stamp the reading with the real time
+                self.reading_us = self.clock.now_us()
+
+            if report:
+                data = self.reading_doc(stats)
+                print(data)
+                uploader.add(data)
+                for loc, zone in self.zones:
+                    uploader.add(self.reading_doc(zone, loc))
+                self.buffered = True
+                deadband.reported(stats.temp.mean, stats.hum.mean)
+
+            if self.backlog.pending():
+                print(f"Replaying {self.backlog.pending()} readings from the offline log")
+
+                def replay(records):
+                    for record in records:
+                        uploader.add(self.record_doc(record))
+
+                self.backlog.drain(replay)
+            if uploader.due():
+                self._queue_metrics()
+                pending = uploader.pending()[0]
+                with self.trace.span("upload"):
+                    posted = await uploader.flush_async()
+                leds.pending.value(0)
+                if posted == pending:
+                    print(f"{posted} docs successfully posted!")
+                    leds.blink(leds.success, 1, 300, 0)
+                else:
+                    print(f"Error posting, {pending - posted} of {pending} docs still buffered")
+                    leds.blink(leds.error, 1, 300, 0)
+            else:
+                print(f"Buffered, {uploader.pending()[0]} readings waiting")
+                leds.pending.value(0)
+
+        except Exception as e:
+            self.ok = False
+            leds.pending.value(0)
+            print(str(e))
+            if self.reading is not None and not self.buffered:
+                # keep the reading for the next wake that gets through
+                flags = 0 if self.clock.synced else FLAG_NO_TIME
+                if not self._connected():
+                    flags |= FLAG_NO_WIFI
+                else:
+                    flags |= FLAG_POST_FAILED
+                self.backlog.append(self.reading_us // 1000000, self.reading[0], self.reading[1], flags)
+            leds.blink(leds.error, 5)
+            if self._connected() and self._budget_left():
+                import async_urequests
+
+                try:
+                    resp = await async_urequests.post(
+                        self.db_url, json={'exc': str(e)}, auth=["admin", "admin"], parse_headers=False
+                    )
+                    resp.close()
+                except Exception as post_error:
+                    print(str(post_error))
+
+        finally:
+            if net is not None and not net.done():
+                net.cancel()
+            if self._online:
+                import dnscache
+
+                dnscache.save()
+                print(f"DNS cache: {dnscache.stats}")
+                # only loaded if an https request was made
+                tlscache = sys.modules.get("tlscache")
+                if tlscache is not None:
+                    print(f"TLS: {tlscache.stats}")
+            await leds.idle()
+            leds.off()
+            if self._connected():
+                # a blocking scan, now that nothing else runs; once per cached access point
+                self.wifi.learn_ap()
+            self.trace.end("wake")
+            if self._online:
+                self._save_metrics()
+
+    def _budget_left(self, ms=1000):
+        import deadline
+
+        left = deadline.remaining_ms()
+        return left is None or left >= ms
+
+    def _save_metrics(self):
+        summary = self.trace.summary()
+        if summary is None:
+            return
+        import ujson
+
+        summary['dt'] = self.clock.isoformat()
+        summary['ok'] = self.ok
+        try:
+            with open(METRICS_PATH, "a") as f:
+                f.write(ujson.dumps(summary) + "\n")
+        except OSError as e:
+            print("Couldn't save wake metrics: " + str(e))
+
+    def _queue_metrics(self):
+        # summaries of earlier wakes go out with this batch
+        import ujson
+
+        try:
+            with open(METRICS_PATH) as f:
+                for line in f:
+                    if line.strip():
+                        doc = ujson.loads(line)
+                        doc['type'] = 'wakeMetrics'
+                        self.uploader.add(self._doc(doc))
+            os.remove(METRICS_PATH)
+        except (OSError, ValueError):
+            pass
+
+
+def run(wake=None, start=None):
+    """
+    Run one wake and return how long to deepsleep, in ms. start is the
+    ticks_us the wake began at, so the boot report includes the imports.
+    """
+    if wake is None:
+        wake = Wake(start=start)
+    asyncio.run(wake.main())
+    summary = wake.trace.summary()
+    if summary is not None:
+        ms = summary['ms']
+        print("Boot: " + ", ".join("%s %d ms" % (name, ms[name]) for name in ms))
+    # sleep short while the stove heats up, long when cold, back off on failures
+    schedule = WakeScheduler()
+    sleep_ms = schedule.next_sleep_ms(wake.temp_c, wake.ok)
+    print(f"Sleeping {sleep_ms // 1000} s, ~{schedule.wakes_per_day(wake.temp_c):.0f} wakes/day at this rate")
+    return sleep_ms
@@ -0,0 +1,244 @@
+"""
+WiFi station connection with a fast path for repeat wakes.
+
+A cold connect scans, associates and runs DHCP, which dominates the wake
+time. After the first success the access point's channel and the DHCP
+lease are cached in a small file; later wakes connect with the lease
+applied as a static config (or the static config passed in), and only
+fall back to the full scan + DHCP when that fails. Connection state is
+polled with a yielding sleep instead of a busy loop; begin() and poll()
+split a connect up so it can run alongside other work (connect_async()
+does that under uasyncio).
+
+The fast path also skips the scan when the cache has the access point's
+BSSID to connect to. MicroPython doesn't say which AP a connect picked,
+and a scan of our own blocks for a second or two, which would stall
+everything running alongside the connect. So connect() scans by itself,
+in the background, and the BSSID is looked up afterwards with
+learn_ap(), once nothing else needs to run.
+
+    wifi = WifiManager("MYWIFI", "MYWIFIPW")
+    if not wifi.connect():
+        raise Exception('Unable to connect to WIFI')
+    print(wifi.metrics)  # {'path': 'fast', 'ms': 412, 'attempts': 1}
+"""
+import time
+import network
+
+# statuses after which waiting any longer is pointless
+_FAILED = (getattr(network, "STAT_WRONG_PASSWORD", None), getattr(network, "STAT_NO_AP_FOUND", None))
+
+
+class WifiManager:
+    def __init__(
+        self,
+        ssid,
+        password,
+        static=None,
+        path="wifi.json",
+        timeout_ms=10000,
+        fast_timeout_ms=3000,
+        poll_ms=20,
+        lease_s=3600,
+        wlan=None,
+    ):
+        self.ssid = ssid
+        self.password = password
+        # (ip, netmask, gateway, dns) to use instead of DHCP
+        self.static = static
+        self.path = path
+        self.timeout_ms = timeout_ms
+        self.fast_timeout_ms = fast_timeout_ms
+        self.poll_ms = poll_ms
+        # how long a cached DHCP lease is reused as a static config
+        self.lease_s = lease_s
+        self.wlan = wlan if wlan is not None else network.WLAN(network.STA_IF)
+        self.cache = None  # {"bssid": hex or None, "channel": n, "ifconfig": [...], "leased": time.time()}
+        self.metrics = {}
+        self._path = None  # attempt in progress: "already", "fast" or "full"
+        self._load()
+
+    def _load(self):
+        import ujson
+
+        try:
+            with open(self.path) as f:
+                self.cache = ujson.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        import ujson
+
+        with open(self.path, "w") as f:
+            ujson.dump(self.cache, f)
+
+    def forget(self):
+        """Drop the cached access point and lease, next connect does a full one."""
+        import os
+
+        self.cache = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def isconnected(self):
+        return self.wlan.isconnected()
+
+    def _cached_ifconfig(self):
+        if self.static is not None:
+            return self.static
+        cache = self.cache
+        if cache and cache.get("ifconfig") and 0 <= time.time() - cache.get("leased", 0) < self.lease_s:
+            return tuple(cache["ifconfig"])
+        return None
+
+    def _fast(self):
+        from ubinascii import unhexlify
+
+        cache = self.cache
+        if cache.get("channel") is not None:
+            try:
+                self.wlan.config(channel=cache["channel"])
+            except (OSError, ValueError, TypeError):
+                pass  # not settable on this port, connecting by BSSID still skips the scan
+        ifconfig = self._cached_ifconfig()
+        if ifconfig is not None:
+            self.wlan.ifconfig(ifconfig)
+        if cache.get("bssid"):
+            self.wlan.connect(self.ssid, self.password, bssid=unhexlify(cache["bssid"]))
+        else:
+            # no learn_ap() yet: the connect scans, the lease still saves DHCP
+            self.wlan.connect(self.ssid, self.password)
+        self._attempt("fast", self.fast_timeout_ms)
+
+    def _full(self):
+        if self.static is not None:
+            self.wlan.ifconfig(self.static)
+        else:
+            try:
+                self.wlan.ifconfig("dhcp")
+            except (OSError, ValueError, TypeError):
+                pass
+        # the connect scans without holding up the event loop, a scan here wouldn't
+        self.wlan.connect(self.ssid, self.password)
+        self._attempt("full", self.timeout_ms)
+
+    def _attempt(self, path, timeout_ms):
+        self._path = path
+        self._attempts += 1
+        self._deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+
+    def _config(self, name):
+        try:
+            return self.wlan.config(name)
+        except (OSError, ValueError, TypeError):
+            return None  # not known on this port
+
+    def _cache_ap(self):
+        from ubinascii import hexlify
+
+        bssid = self._config("bssid")
+        self.cache = {
+            "bssid": None if bssid is None else str(hexlify(bssid), "ascii"),
+            "channel": self._config("channel"),
+            "ifconfig": list(self.wlan.ifconfig()),
+            "leased": time.time(),
+        }
+        self._save()
+
+    def learn_ap(self):
+        """
+        Scan for the BSSID and channel of the strongest access point with
+        our SSID, so the next fast path connects without scanning. Only
+        while connected and not known yet. The scan blocks for a second or
+        two, so call it when nothing else has to run, e.g. after the upload.
+        """
+        from ubinascii import hexlify
+
+        cache = self.cache
+        if not cache or cache.get("bssid") or not self.wlan.isconnected():
+            return
+        best = None
+        try:
+            for ap in self.wlan.scan():
+                if ap[0] == self.ssid.encode() and (best is None or ap[3] > best[3]):
+                    best = ap
+        except OSError:
+            return
+        if best is not None:
+            cache["bssid"] = str(hexlify(best[1]), "ascii")
+            cache["channel"] = best[2]
+            self._save()
+
+    def _done(self, ok):
+        self.metrics = {
+            "path": self._path,
+            "ms": time.ticks_diff(time.ticks_ms(), self._started),
+            "attempts": self._attempts,
+            "ok": ok,
+        }
+        self._path = None
+        return ok
+
+    def begin(self):
+        """
+        Start connecting, trying the cached access point first, and return
+        without waiting. Follow up with poll() until it says how it went.
+        """
+        self._started = time.ticks_ms()
+        self._attempts = 0
+        self._path = "already"
+        self.wlan.active(True)
+        if self.wlan.isconnected():
+            return
+        if self.cache:
+            self._fast()
+        else:
+            self._full()
+
+    def poll(self):
+        """
+        None while the connect started by begin() is still going, then
+        True once connected or False when every path failed. A failed fast
+        path falls back to the full one from in here.
+        """
+        if self._path is None:
+            return self.wlan.isconnected()
+        if self.wlan.isconnected():
+            if self._path == "full":
+                self._cache_ap()
+            return self._done(True)
+        status = self.wlan.status()
+        if time.ticks_diff(time.ticks_ms(), self._deadline) < 0 and (status is None or status not in _FAILED):
+            return None
+        if self._path == "fast":
+            self.wlan.disconnect()
+            self._full()
+            return None
+        self.forget()
+        return self._done(False)
+
+    def connect(self):
+        """
+        Connect, trying the cached access point first. Returns whether the
+        station is connected; self.metrics says how and how long it took.
+        """
+        self.begin()
+        while True:
+            ok = self.poll()
+            if ok is not None:
+                return ok
+            time.sleep_ms(self.poll_ms)
+
+    async def connect_async(self):
+        """connect() for a uasyncio task, other tasks run between polls."""
+        import uasyncio as asyncio
+
+        self.begin()
+        while True:
+            ok = self.poll()
+            if ok is not None:
+                return ok
+            await asyncio.sleep_ms(self.poll_ms)
@@ -0,0 +1,27 @@
+"""
+Manually advanced stand-in for timesource.RtcClock.
+
+    clock = FakeClock(start_us, rate=1.00005)  # RTC running 50 ppm fast
+    clock.advance(600 * 1000000)               # ten minutes of true time
+"""
+
+
+class FakeClock:
+    def __init__(self, start_us=1664650000 * 1000000, rate=1.0):
+        self.true_us = start_us  # what a perfect clock would read
+        self.rtc_us = start_us
+        self.rate = rate
+
+    def advance(self, us):
+        self.true_us += us
+        self.rtc_us += int(us * self.rate)
+
+    def now_us(self):
+        return self.rtc_us
+
+    def set_us(self, us):
+        self.rtc_us = us
+
+    def sync(self):
+        # use as TimeSource(sync=clock.sync)
+        return self.true_us
@@ -0,0 +1,167 @@
+"""
+Run the HTTP clients against a local server that misbehaves and check
+that every request ends within its deadline (see py/deadline.py).
+
+    python sim/faults.py
+
+Each path of the server fails in its own way: it accepts and never
+answers, drips the response a byte at a time, resets the connection or
+answers 503 a couple of times before it gives in. Every case runs with
+auth_urequests, a Session and async_urequests; a line per case shows the
+outcome, how long it took and how many connections the server saw.
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import upy  # noqa: E402
+
+upy.install()
+
+import auth_urequests  # noqa: E402
+import async_urequests  # noqa: E402
+import deadline  # noqa: E402
+
+OK = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+class Server:
+    """One thread per connection, behaviour chosen by the request path."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self.hits = {}
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            conn, addr = self.sock.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            head = b""
+            while b"\r\n\r\n" not in head:
+                data = conn.recv(1024)
+                if not data:
+                    return
+                head += data
+            path = head.split(b" ", 2)[1].decode()
+            n = self.hits[path] = self.hits.get(path, 0) + 1
+            getattr(self, path.strip("/").split("?")[0])(conn, n)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def ok(self, conn, n):
+        conn.sendall(OK)
+
+    def stall(self, conn, n):
+        time.sleep(30)
+
+    def stall_body(self, conn, n):
+        conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\npartial")
+        time.sleep(30)
+
+    def drip(self, conn, n):
+        for b in OK:
+            conn.sendall(bytes([b]))
+            time.sleep(0.05)
+
+    def reset(self, conn, n):
+        # RST instead of FIN
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b"\x01\x00\x00\x00\x00\x00\x00\x00")
+
+    def flaky(self, conn, n):
+        if n <= 2:
+            conn.sendall(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n")
+        else:
+            conn.sendall(OK)
+
+    def flaky_reset(self, conn, n):
+        if n <= 2:
+            self.reset(conn, n)
+        else:
+            conn.sendall(OK)
+
+
+def sync_get(url, **kw):
+    resp = auth_urequests.request(kw.pop("method", "GET"), url, **kw)
+    return resp.status_code, resp.content
+
+
+def session_get(url, **kw):
+    with auth_urequests.Session() as session:
+        resp = session.request(kw.pop("method", "GET"), url, **kw)
+        return resp.status_code, resp.content
+
+
+def async_get(url, **kw):
+    async def go():
+        resp = await async_urequests.request(kw.pop("method", "GET"), url, **kw)
+        return resp.status_code, await resp.read()
+
+    return asyncio.run(go())
+
+
+CASES = (
+    # path, request kwargs, what should happen
+    ("stall", {"timeout": 1}, "timeout"),
+    ("stall_body", {"timeout": 1}, "timeout"),
+    ("drip", {"timeout": 0.5}, "timeout"),
+    ("drip", {"timeout": 6}, 200),
+    ("reset", {"timeout": 2}, "error"),
+    ("flaky", {"timeout": 5, "retry": deadline.Retry(base_ms=50)}, 200),
+    ("flaky", {"timeout": 5, "retry": deadline.Retry(base_ms=50), "method": "POST"}, 503),
+    ("flaky_reset", {"timeout": 5, "retry": deadline.Retry(base_ms=50)}, 200),
+    ("flaky_reset", {"timeout": 5, "retry": deadline.Retry(base_ms=50), "method": "POST"}, "error"),
+    ("flaky_reset", {"timeout": 5, "retry": deadline.Retry(base_ms=50), "method": "POST", "idempotent": True}, 200),
+    ("stall", {"retry": deadline.Retry(base_ms=50), "budget": 1500}, "timeout"),
+)
+
+
+def main():
+    server = Server()
+    failed = 0
+    print("%-8s %-12s %-50s %-9s %7s %5s" % ("client", "path", "options", "outcome", "ms", "conns"))
+    for name, client in (("request", sync_get), ("session", session_get), ("async", async_get)):
+        for path, kw, expect in CASES:
+            kw = dict(kw)
+            budget = kw.pop("budget", None)
+            options = ", ".join("%s=%s" % (k, "Retry" if k == "retry" else kw[k]) for k in kw)
+            if budget:
+                options += ", budget=%d" % budget
+                deadline.start(budget)
+            limit = kw.get("timeout", (budget or 0) / 1000)
+            url = "http://127.0.0.1:%d/%s?%s-%d" % (server.port, path, name, len(server.hits))
+            before = dict(server.hits)
+            start = time.monotonic()
+            try:
+                outcome = client(url, **kw)[0]
+            except OSError as e:
+                timed_out = isinstance(e, TimeoutError) or (e.args and e.args[0] == deadline.ETIMEDOUT)
+                outcome = "timeout" if timed_out else "error"
+            except ValueError:
+                outcome = "error"
+            ms = (time.monotonic() - start) * 1000
+            deadline.stop()
+            conns = sum(server.hits.values()) - sum(before.values())
+            # a little slack for the event loop and the thread switches
+            good = outcome == expect and ms <= limit * 1000 + 200
+            failed += not good
+            print("%-8s %-12s %-50s %-9s %7.0f %5d%s" % (name, path, options, outcome, ms, conns, "" if good else "  FAILED"))
+    print("\n%d failed" % failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Run wakes of py/wake.py on Linux and print their timelines.
+
+    python sim/harness.py
+
+Everything the board talks to is faked locally: the SHT30 on the I2C
+bus and the WLAN station come from the machine / network stand-ins
+(association, scan and DHCP take network.config's times), CouchDB is a
+small HTTP server that accepts _bulk_docs and SNTP a UDP responder on
+127.0.0.1. The scenarios run one after the other in one temporary
+directory, so each wake finds the state files the previous one left,
+like a board waking from deepsleep.
+"""
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import upy  # noqa: E402
+
+upy.install()
+
+import machine  # noqa: E402
+import network  # noqa: E402
+from fakeclock import FakeClock  # noqa: E402
+from timesource import TimeSource, sntp_time_async  # noqa: E402
+from uploader import BulkUploader  # noqa: E402
+from sampler import Deadband  # noqa: E402
+import wake  # noqa: E402
+
+
+class CouchStub(BaseHTTPRequestHandler):
+    docs = []
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                n = int(self.rfile.readline().split(b";")[0], 16)
+                if not n:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(n)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        import json
+
+        body = json.loads(self._body())
+        time.sleep(0.02)  # CouchDB writing to disk
+        docs = body.get("docs", [body])
+        CouchStub.docs.extend(docs)
+        out = json.dumps([{"ok": True, "id": d.get("_id", "x"), "rev": "1-a"} for d in docs]).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+def sntp_server():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            data, addr = sock.recvfrom(48)
+            now = time.time() + 2208988800
+            reply = bytearray(48)
+            reply[0] = 0x24  # version 4, server mode
+            reply[1] = 2  # stratum, 0 would be a kiss-of-death
+            struct.pack_into("!II", reply, 40, int(now), int((now % 1) * 2 ** 32))
+            time.sleep(0.015)  # a LAN round trip
+            sock.sendto(reply, addr)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock.getsockname()[1]
+
+
+def run_wake(db_url, ntp_port, clock, **kw):
+    network.reset()
+    w = wake.Wake(
+        db_url=db_url,
+        clock=TimeSource(clock=clock, sync_async=lambda: sntp_time_async("127.0.0.1", ntp_port)),
+        uploader=BulkUploader(db_url, auth=wake.DB_AUTH, max_count=1),
+        deadband=Deadband(),
+        **kw
+    )
+    start = time.monotonic()
+    sleep_ms = wake.run(w)
+    return w, (time.monotonic() - start) * 1000, sleep_ms
+
+
+def show(name, w, wall_ms):
+    print("\n== %s: %.0f ms" % (name, wall_ms))
+    kinds = ("begin", "end", "mark")
+    for us, kind, event, free in w.trace.records():
+        print("  %6d ms  %-5s %s" % (us // 1000, kinds[kind], event))
+    print("  %s" % w.trace.summary())
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CouchStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    db_url = "http://127.0.0.1:%d/home-sensors" % server.server_port
+    ntp_port = sntp_server()
+    sensor = machine.i2c_devices[0x45]
+    clock = FakeClock(int(time.time() * 1000000))
+
+    os.chdir(tempfile.mkdtemp())
+    # first boot: nothing cached, heartbeat due so WiFi starts with the burst
+    show("cold boot", *run_wake(db_url, ntp_port, clock)[:2])
+    # deepsleep wake, reading unchanged: the radio stays off
+    show("no change", *run_wake(db_url, ntp_port, clock)[:2])
+    # reading moved: WiFi after the burst, fast path from the cached AP
+    sensor.temp_c += 5
+    show("moved", *run_wake(db_url, ntp_port, clock)[:2])
+    # AP gone: reading goes to the offline log
+    network.config["fail"] = True
+    sensor.temp_c += 5
+    show("no wifi", *run_wake(db_url, ntp_port, clock)[:2])
+    network.config["fail"] = False
+    # backlog pending: WiFi overlaps the burst again, backlog replayed
+    show("replay", *run_wake(db_url, ntp_port, clock)[:2])
+    print("\n%d docs reached the CouchDB stub" % len(CouchStub.docs))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
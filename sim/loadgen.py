@@ -0,0 +1,238 @@
+"""
+Fleet load test: many simulated boards running py/boot.py against a
+local CouchDB stand-in, to size the server and catch client regressions.
+
+    python sim/loadgen.py --devices 500 --duration 60
+    python sim/loadgen.py --devices 2000 --gateway --radio 0.1
+
+Every board has its own flash (a directory holding the state files its
+wakes leave), unique_id and SHT30, whose temperature drifts by up to
+--jump degrees per wake so the deadband lets a share of them through.
+Each wake executes boot.py unchanged: the usocket host table sends its
+CouchDB (192.168.1.101:5984) and pool.ntp.org to local servers, and
+machine.deepsleep() ends it with the interval the board asked for.
+That interval, divided by --speedup, is when the board wakes next.
+Only deepsleep is compressed: the uploader's max_age_s and the
+heartbeat still go by the real clock. Boards post once they have
+--batch readings waiting (the uploader's max_count, 1 by default so
+every reading is posted in the wake that took it; raise --jump for more
+readings).
+
+The boards are spread over --procs worker processes. Each forks a child
+per wake, so a process runs up to --inflight wakes at once and the wakes
+of one board never overlap. The children are forked from a process that
+has imported py/ already, so wake times don't include imports (see
+bench/bench_imports.py for those), but every wake starts with fresh
+module state, as after a real deepsleep. network.config's association
+times are scaled by --radio.
+
+Reports wakes and docs per second, p50 / p99 of the upload span (the
+_bulk_docs POST as the boards saw it) and of the whole wake, against
+gateway/fakecouch.py, or gateway/gateway.py in front of it with
+--gateway.
+"""
+import argparse
+import ast
+import asyncio
+import contextlib
+import functools
+import io
+import multiprocessing
+import os
+import random
+import re
+import runpy
+import select
+import sys
+import tempfile
+import threading
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SIM_DIR)
+sys.path.insert(0, os.path.join(os.path.dirname(SIM_DIR), "gateway"))
+
+COUCH = ("192.168.1.101", 5984)  # wake.DB_URL
+NTP = ("pool.ntp.org", 123)
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_wake(boot, n, flash, sensor):
+    """One wake of board n, in a forked child: (wall ms, upload span ms, went online, deepsleep ms)."""
+    import machine
+    import network
+
+    os.chdir(flash)
+    machine.uid = n.to_bytes(6, "big")
+    machine.i2c_devices = {0x45: sensor}
+    network.reset()
+    out = io.StringIO()
+    began = time.monotonic()
+    sleep_ms = None
+    with contextlib.redirect_stdout(out):
+        try:
+            runpy.run_path(boot)
+        except machine.DeepSleep as e:
+            sleep_ms = e.ms
+        except Exception as e:
+            print("wake failed: %r" % e)
+    wall_ms = (time.monotonic() - began) * 1000
+    # the boot report: "Boot: imports 0 ms, sensor 41 ms, ..."
+    spans = {}
+    report = re.search(r"^Boot: (.*)$", out.getvalue(), re.M)
+    if report:
+        for name, ms in re.findall(r"(\w+) (\d+) ms", report.group(1)):
+            spans[name] = int(ms)
+    return wall_ms, spans.get("upload"), sleep_ms is not None and "wifi" in spans, sleep_ms
+
+
+def worker(devices, couch_port, ntp_port, args, base):
+    """Run the wakes of devices until args.duration is up, return what each took."""
+    import upy
+
+    upy.install()
+    import machine
+    import network
+    import usocket
+    from uploader import BulkUploader
+    import wake  # noqa: F401, imported once here rather than in every child
+
+    usocket.hosts[COUCH] = ("127.0.0.1", couch_port)
+    usocket.hosts[NTP] = ("127.0.0.1", ntp_port)
+    for key in ("scan_ms", "assoc_ms", "dhcp_ms"):
+        network.config[key] = int(network.config[key] * args.radio)
+    wake.BulkUploader = functools.partial(BulkUploader, max_count=args.batch)
+    boot = os.path.join(upy.PY_DIR, "boot.py")
+
+    rng = random.Random(devices[0])
+    boards = []
+    start = time.monotonic()
+    for n in devices:
+        flash = os.path.join(base, "dev%05d" % n)
+        os.makedirs(flash, exist_ok=True)
+        sensor = machine.FakeSht30(rng.uniform(20, 90), rng.uniform(10, 50))
+        # first wakes spread over a second, not all at once
+        boards.append([start + rng.random(), n, flash, sensor])
+
+    wakes = []
+    running = {}  # pipe of a child -> (its pid, the board it's waking)
+    while True:
+        # boards not awake right now, by when they're due
+        asleep = sorted((b for b in boards if b[0] is not None), key=lambda b: b[0])
+        now = time.monotonic()
+        for board in asleep:
+            due, n, flash, sensor = board
+            if due > now or due - start >= args.duration or len(running) >= args.inflight:
+                break
+            sensor.temp_c += rng.uniform(-args.jump, args.jump)
+            board[0] = None
+            r, w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(r)
+                try:
+                    result = repr(run_wake(boot, n, flash, sensor)).encode()
+                    os.write(w, result)
+                finally:
+                    os._exit(0)
+            os.close(w)
+            running[r] = (pid, board)
+        asleep = [b for b in asleep if b[0] is not None and b[0] - start < args.duration]
+        if not running and not asleep:
+            break
+        timeout = None
+        if asleep and len(running) < args.inflight:
+            timeout = max(0, asleep[0][0] - time.monotonic())
+        ready, _, _ = select.select(list(running), [], [], timeout)
+        for r in ready:
+            pid, board = running.pop(r)
+            with os.fdopen(r, "rb") as f:
+                data = f.read()
+            os.waitpid(pid, 0)
+            wall_ms, upload_ms, online, sleep_ms = ast.literal_eval(data.decode()) if data else (0, None, False, None)
+            wakes.append((wall_ms, upload_ms, online))
+            board[0] = time.monotonic() + (sleep_ms or 60000) / 1000 / args.speedup
+    return wakes
+
+
+def serve(args, ready):
+    """Run the CouchDB stand-in (and the gateway) on an event loop of their own."""
+    from fakecouch import FakeCouch
+    from gateway import Gateway
+
+    loop = asyncio.new_event_loop()
+
+    async def start():
+        couch = await FakeCouch().start()
+        couch.delay = args.couch_ms / 1000
+        port = int(couch.url.rsplit(":", 1)[1])
+        gateway = None
+        if args.gateway:
+            gateway = await Gateway(couch.url).start()
+            port = gateway.port
+        ready.append((couch, gateway, port, loop))
+
+    loop.run_until_complete(start())
+    loop.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--procs", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--speedup", type=float, default=1000, help="deepsleep is this many times shorter")
+    parser.add_argument("--radio", type=float, default=1.0, help="scale for WiFi scan / association / DHCP times")
+    parser.add_argument("--jump", type=float, default=1.0, help="max temperature change per wake, degrees C")
+    parser.add_argument("--batch", type=int, default=1, help="readings a board buffers before it posts")
+    parser.add_argument("--inflight", type=int, default=64, help="most wakes a process runs at once")
+    parser.add_argument("--couch-ms", type=float, default=5, help="added to every CouchDB request")
+    parser.add_argument("--gateway", action="store_true", help="put gateway/gateway.py in front of CouchDB")
+    args = parser.parse_args()
+
+    import harness  # noqa: F401, for its SNTP responder
+
+    ready = []
+    threading.Thread(target=serve, args=(args, ready), daemon=True).start()
+    while not ready:
+        time.sleep(0.01)
+    couch, gateway, port, loop = ready[0]
+    ntp_port = harness.sntp_server()
+
+    base = tempfile.mkdtemp(prefix="loadgen-")
+    procs = max(1, min(args.procs, args.devices))
+    slices = [list(range(i, args.devices, procs)) for i in range(procs)]
+    print("%d devices in %d processes, up to %d wakes each at once, for %.0f s, deepsleep / %g, radio x%g%s" % (
+        args.devices, procs, args.inflight, args.duration, args.speedup, args.radio,
+        ", through the gateway" if args.gateway else ""))
+
+    began = time.monotonic()
+    with multiprocessing.get_context("spawn").Pool(procs) as pool:
+        results = pool.starmap(worker, [(s, port, ntp_port, args, base) for s in slices])
+    elapsed = time.monotonic() - began
+
+    wakes = [w for r in results for w in r]
+    walls = [w[0] for w in wakes]
+    uploads = [w[1] for w in wakes if w[1] is not None]
+    online = sum(1 for w in wakes if w[2])
+    db = couch.dbs["home-sensors"]
+    posts = sum(1 for method, path in couch.requests if method == "POST")
+    print("wakes      %6d  %7.1f/s  (%d online)" % (len(wakes), len(wakes) / elapsed, online))
+    print("posts      %6d  %7.1f/s  at CouchDB" % (posts, posts / elapsed))
+    print("docs       %6d  %7.1f/s  stored" % (len(db.docs), len(db.docs) / elapsed))
+    print("upload ms  p50 %6d  p99 %6d  (%d uploads)" % (percentile(uploads, 50), percentile(uploads, 99), len(uploads)))
+    print("wake ms    p50 %6d  p99 %6d  max %d" % (percentile(walls, 50), percentile(walls, 99), max(walls) if walls else 0))
+    if gateway is not None:
+        print("gateway    %s" % gateway.stats)
+    if not posts:
+        sys.exit("no POST reached CouchDB, the upload latencies above measure nothing")
+
+
+if __name__ == "__main__":
+    main()
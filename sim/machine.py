@@ -0,0 +1,215 @@
+"""
+machine stand-in: pins that remember their value, an I2C bus with fake
+SHT30 sensors on it, the RTC and deepsleep.
+
+    import machine
+    machine.i2c_devices[0x45].temp_c = 80.0
+    machine.i2c_buses[19] = {0x44: machine.FakeSht30(90.0)}  # a second bus, scl on 19
+    machine.uid = b"\x00\x00\x00\x00\x00\x07"            # which board this is
+
+deepsleep() raises DeepSleep instead of returning, like the board
+resetting, so whoever ran boot.py learns how long it asked to sleep.
+"""
+import calendar
+import time
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+
+    def __init__(self, id, mode=None, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+
+def _crc8(data):
+    crc = 0xFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x131) if crc & 0x80 else crc << 1
+    return crc & 0xFF
+
+
+class FakeSht30:
+    """
+    Answers a single shot (or any other) command with a frame for temp_c /
+    humidity, with valid CRCs. Set corrupt to flip a CRC bit in the next N
+    frames, or no_data to NACK the next N reads.
+
+    A periodic or ART command starts periodic acquisition: a sample every
+    period_ms from then on. While it runs only fetch and break get through
+    (anything else is NACKed), and a read after a fetch answers once per
+    new sample and NACKs otherwise, as the sensor does. Break stops it.
+    """
+
+    FETCH = b"\xe0\x00"
+    BREAK = b"\x30\x93"
+    ART = b"\x2b\x32"
+    # first byte of the periodic commands -> ms between samples (0.5 to 10 mps)
+    PERIODS_MS = {0x20: 2000, 0x21: 1000, 0x22: 500, 0x23: 250, 0x27: 100}
+
+    def __init__(self, temp_c=25.0, humidity=40.0):
+        self.temp_c = temp_c
+        self.humidity = humidity
+        self.commands = []
+        self.corrupt = 0
+        self.no_data = 0
+        self.period_ms = None  # set while in periodic acquisition
+        self._started = None
+        self._samples = 0  # samples fetched since periodic acquisition started
+        self._fetched = False  # a fetched sample is waiting to be read
+
+    def frame(self):
+        t_raw = min(0xFFFF, max(0, int((self.temp_c + 45) * 0xFFFF / 175 + 0.5)))
+        h_raw = min(0xFFFF, max(0, int(self.humidity * 0xFFFF / 100 + 0.5)))
+        data = bytearray()
+        for word in (t_raw, h_raw):
+            pair = bytes((word >> 8, word & 0xFF))
+            data += pair + bytes((_crc8(pair),))
+        if self.corrupt:
+            self.corrupt -= 1
+            data[2] ^= 0x01
+        return bytes(data)
+
+    def write(self, buf):
+        cmd = bytes(buf)
+        self.commands.append(cmd)
+        if cmd == self.BREAK:
+            self.period_ms = None
+            self._fetched = False
+        elif cmd == self.FETCH:
+            # a new sample since the last fetch, or the read gets NACKed
+            samples = -1
+            if self.period_ms is not None:
+                samples = time.ticks_diff(time.ticks_ms(), self._started) // self.period_ms
+            self._fetched = samples > self._samples
+            if self._fetched:
+                self._samples = samples
+        elif self.period_ms is not None:
+            raise OSError(19)  # busy measuring, break first
+        elif cmd == self.ART or cmd[0] in self.PERIODS_MS:
+            self.period_ms = 250 if cmd == self.ART else self.PERIODS_MS[cmd[0]]
+            self._started = time.ticks_ms()
+            self._samples = 0
+            self._fetched = False
+
+    def read(self, n):
+        if self.no_data:
+            self.no_data -= 1
+            raise OSError(19)  # ENODEV, the sensor NACKed its address
+        if self.period_ms is not None:
+            if not self._fetched:
+                raise OSError(19)  # no new sample, or no fetch before the read
+            self._fetched = False
+        return self.frame()[:n]
+
+
+# devices on every bus created from here on, by address
+i2c_devices = {0x45: FakeSht30()}
+# devices of buses with their own, by scl pin number
+i2c_buses = {}
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000, timeout=50000):
+        self.freq = freq
+        self.devices = i2c_buses.get(getattr(scl, "id", scl), i2c_devices)
+
+    def _device(self, addr):
+        try:
+            return self.devices[addr]
+        except KeyError:
+            raise OSError(19)
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        self._device(addr).write(buf)
+        return 1
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._device(addr).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        data = self._device(addr).read(len(buf))
+        buf[: len(data)] = data
+
+
+class SoftI2C(I2C):
+    def __init__(self, scl=None, sda=None, freq=400000, timeout=50000):
+        super().__init__(-1, scl, sda, freq, timeout)
+
+    # only the bit-banged bus has these, machine.I2C raises OSError
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+uid = b"\x0c\xb8\x15\xc4\xa1\x9c"
+
+
+def unique_id():
+    return uid
+
+
+DEEPSLEEP_RESET = 4
+PWRON_RESET = 1
+_reset_cause = PWRON_RESET
+
+
+def reset_cause():
+    return _reset_cause
+
+
+class DeepSleep(Exception):
+    """What deepsleep() raises, with the requested sleep in ms."""
+
+    def __init__(self, ms):
+        super().__init__(ms)
+        self.ms = ms
+
+
+def deepsleep(ms=0):
+    global _reset_cause
+    _reset_cause = DEEPSLEEP_RESET
+    raise DeepSleep(ms)
+
+
+class RTC:
+    """
+    Keeps the datetime it was last set to, counting on from there with
+    the host clock. Reading it doesn't move time.time(), which the code
+    under py/ reads instead.
+    """
+
+    _set = None  # (datetime tuple, time.time() when set), shared like the one RTC
+
+    def datetime(self, dt=None):
+        if dt is not None:
+            RTC._set = (tuple(dt), time.time())
+            return
+        if RTC._set is None:
+            t = time.gmtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        dt, at = RTC._set
+        secs = calendar.timegm((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0, 0)) + int(time.time() - at)
+        t = time.gmtime(secs)
+        return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], dt[7])
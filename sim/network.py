@@ -0,0 +1,118 @@
+"""
+network stand-in: a WLAN station whose association takes configurable
+time, so connect paths can be timed on Linux.
+
+    import network
+    network.config.update(assoc_ms=2500, dhcp_ms=900)
+
+A connect with a bssid skips the scan_ms part, a preset ifconfig skips
+dhcp_ms. Set fail=True to make every association time out.
+"""
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+
+config = {
+    "ssid": b"MYWIFI",
+    "password": "MYWIFIPW",
+    "bssid": b"\x24\x0a\xc4\x11\x22\x33",
+    "channel": 6,
+    "scan_ms": 1200,  # the scan a connect without bssid does internally
+    "assoc_ms": 300,
+    "dhcp_ms": 800,
+    "fail": False,
+    "ifconfig": ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1"),
+}
+
+_stations = {}
+
+
+class WLAN:
+    def __new__(cls, interface=STA_IF):
+        # like on the board, there's one object per interface
+        if interface not in _stations:
+            wlan = object.__new__(cls)
+            wlan._init(interface)
+            _stations[interface] = wlan
+        return _stations[interface]
+
+    def _init(self, interface):
+        self.interface = interface
+        self._active = False
+        self._ready_at = None
+        self._status = STAT_IDLE
+        self._static = None
+        self._channel = 1
+        self.connects = []  # (ssid, bssid) of every connect() call
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def scan(self):
+        time.sleep_ms(config["scan_ms"])
+        return [(config["ssid"], config["bssid"], config["channel"], -58, 3, False)]
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        if not self._active:
+            raise OSError("STA must be active")
+        self.connects.append((ssid, bssid))
+        if config["fail"] or (bssid is not None and bssid != config["bssid"]):
+            self._ready_at = None
+            self._status = STAT_NO_AP_FOUND
+            return
+        if key != config["password"]:
+            self._ready_at = None
+            self._status = STAT_WRONG_PASSWORD
+            return
+        delay = config["assoc_ms"]
+        if bssid is None:
+            delay += config["scan_ms"]
+        if self._static is None:
+            delay += config["dhcp_ms"]
+        self._ready_at = time.ticks_add(time.ticks_ms(), delay)
+        self._status = STAT_CONNECTING
+
+    def disconnect(self):
+        self._ready_at = None
+        self._status = STAT_IDLE
+
+    def isconnected(self):
+        if self._ready_at is None:
+            return False
+        if time.ticks_diff(time.ticks_ms(), self._ready_at) >= 0:
+            self._status = STAT_GOT_IP
+            return True
+        return False
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -58
+        self.isconnected()
+        return self._status
+
+    def ifconfig(self, cfg=None):
+        if cfg is None:
+            return self._static or config["ifconfig"]
+        self._static = None if cfg == "dhcp" else tuple(cfg)
+
+    def config(self, *args, **kwargs):
+        if "channel" in kwargs:
+            self._channel = kwargs["channel"]
+        if args == ("mac",):
+            return b"\x0c\xb8\x15\xc4\xa1\x9c"
+        if args == ("channel",):
+            return self._channel
+
+
+def reset():
+    """Forget all interface state, like a deepsleep wake does."""
+    _stations.clear()
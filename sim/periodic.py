@@ -0,0 +1,78 @@
+"""
+Run py/mysht30.py's periodic acquisition against the fake SHT30: start,
+fetch and break, in normal and ART mode.
+
+    python sim/periodic.py
+
+A fetch answers once per new sample and returns None in between, a
+single shot while the sensor measures periodically is refused until a
+break, and a measurement after stop_periodic() is a single shot again.
+A line per check, then how many failed.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import upy  # noqa: E402
+
+upy.install()
+
+import machine  # noqa: E402
+from mysht30 import MySht30, SHT30Error  # noqa: E402
+
+
+def main():
+    fake = machine.FakeSht30(62.5, 18.0)
+    machine.i2c_devices = {0x45: fake}
+    sensor = MySht30(i2c=machine.I2C(0), address=0x45)
+    checks = []
+
+    sensor.start_periodic(mps=10)
+    checks.append(("periodic: 10 mps", fake.period_ms == 100, fake.period_ms))
+    checks.append(("periodic: no sample right away", sensor.fetch() is None, None))
+    time.sleep_ms(120)
+    fetched = sensor.fetch()
+    checks.append(("periodic: a sample after 100 ms", fetched is not None and fetched[0] == 62, fetched))
+    checks.append(("periodic: current values from the fetch", abs(sensor.current_centi[0] - 6250) <= 1,
+                   sensor.current_centi[0]))
+    checks.append(("periodic: None until the next sample", sensor.fetch() is None, None))
+    time.sleep_ms(220)
+    checks.append(("periodic: a sample again", sensor.fetch() is not None, None))
+
+    # without the driver's break, the sensor NACKs a single shot command
+    try:
+        sensor.send_cmd(MySht30.SINGLE_SHOT_CMDS[sensor.repeatability], 0)
+        refused = False
+    except SHT30Error:
+        refused = True
+    checks.append(("periodic: single shot refused", refused, None))
+
+    sensor.stop_periodic()
+    checks.append(("break: back to idle", fake.period_ms is None, fake.period_ms))
+    fake.temp_c = 70.0
+    centi = sensor.measure_centi()
+    checks.append(("break: single shot again", abs(centi[0] - 7000) <= 1, centi[0]))
+
+    sensor.start_art()
+    checks.append(("ART: 4 mps", fake.period_ms == 250, fake.period_ms))
+    time.sleep_ms(270)
+    checks.append(("ART: a sample after 250 ms", sensor.fetch() is not None, None))
+    # measure_centi() breaks out of periodic mode by itself
+    del fake.commands[:]
+    centi = sensor.measure_centi()
+    single = MySht30.SINGLE_SHOT_CMDS[sensor.repeatability]
+    sent = [c.hex() for c in fake.commands]
+    checks.append(("ART: a single shot breaks first", fake.commands[:2] == [fake.BREAK, single], sent))
+    checks.append(("ART: the single shot measured", abs(centi[0] - 7000) <= 1, centi[0]))
+
+    failed = 0
+    for name, good, seen in checks:
+        failed += not good
+        print("%-42s %s%s" % (name, "ok" if good else "FAILED", "" if seen is None else "  %s" % (seen,)))
+    print("\n%d failed" % failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Replay a day with a sauna session through py/scheduler.py and check the
+deepsleep intervals it picks.
+
+    python sim/schedule.py
+
+The trace is cold until 17:00, heats up at about 1 C a minute, holds
+85 C for an hour and a half and then cools off. A line per check, then
+the wakes of the day around the session.
+"""
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import upy  # noqa: E402
+
+upy.install()
+
+from scheduler import WakeScheduler, simulate  # noqa: E402
+
+COLD_C = 20.0
+HOT_C = 85.0
+
+
+def session(t):
+    """Degrees C at t seconds into the day."""
+    h = t / 3600
+    if h < 17:
+        return COLD_C
+    if h < 18:
+        return COLD_C + (HOT_C - COLD_C) * (h - 17)
+    if h < 19.5:
+        return HOT_C
+    return COLD_C + (HOT_C - COLD_C) * math.exp(-(h - 19.5) / 1.5)
+
+
+def cold(t):
+    return COLD_C
+
+
+def main():
+    s = WakeScheduler(path=None)
+    day = simulate(session)
+    before = [w for w in day if w[0] < 17 * 3600]
+    heating = [w for w in day if 17 * 3600 < w[0] < 18 * 3600 and w[1] < s.target_c]
+    after = [w for w in day if w[0] > 19.5 * 3600 and w[1] < s.cold_c]
+    heating_s = [w[2] for w in heating]
+
+    # failures on wakes 10 to 13 of a cold day, the network back from 14 on
+    outage = simulate(cold, failures=set(range(10, 14)))
+    backoff = [w[2] for w in outage[9:15]]
+
+    s.next_sleep_ms(COLD_C, ok=True, now=0)
+    healthy = s.wakes_per_day(COLD_C)
+    sleep_ms = s.next_sleep_ms(COLD_C, ok=False, now=900)
+    sleep_ms = s.next_sleep_ms(COLD_C, ok=False, now=900 + sleep_ms // 1000)
+
+    checks = (
+        ("cold: the longest sleep", all(w[2] == s.max_sleep_s for w in before), before[-1][2]),
+        ("heating: shorter than when cold", max(heating_s) < s.max_sleep_s, heating_s),
+        ("heating: shorter the closer to target", heating_s == sorted(heating_s, reverse=True), None),
+        ("heating: the shortest sleep near target", heating_s[-1] == s.min_sleep_s, heating_s[-1]),
+        ("cooled off: the longest sleep again", all(w[2] == s.max_sleep_s for w in after), after[0][2]),
+        ("failures: back off, doubling", backoff == [900, 1800, 3600, 3600, 3600, 900], backoff),
+        ("wakes/day: healthy", healthy == 86400 / s.max_sleep_s, healthy),
+        ("wakes/day: backed off", s.wakes_per_day(COLD_C) == 86400000 / sleep_ms, s.wakes_per_day(COLD_C)),
+        ("wakes/day: a session day wakes more", len(day) > len(simulate(cold)), (len(day), len(simulate(cold)))),
+    )
+    failed = 0
+    for name, good, seen in checks:
+        failed += not good
+        print("%-42s %s%s" % (name, "ok" if good else "FAILED", "" if seen is None else "  %s" % (seen,)))
+
+    print("\n%8s %8s %8s" % ("h", "temp C", "sleep s"))
+    for t, temp_c, sleep_s in day:
+        if 16.5 * 3600 <= t <= 22.5 * 3600:
+            print("%8.2f %8.1f %8d" % (t / 3600, temp_c, sleep_s))
+    print("\n%d failed" % failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Check py/timesource.py: SNTP replies that carry no usable time, and the
+drift correction between syncs.
+
+    python sim/timesync.py
+
+A local SNTP server answers with a good reply, a kiss-of-death, a
+truncated packet, a zero transmit time or a client mode packet; only
+the first may set the clock. Then days of wakes every ten minutes on a
+FakeClock running fast and one running slow, syncing every six hours:
+how far off the RTC gets on its own, and how far TimeSource.now_us() is
+once the drift is known. A line per check, then how many failed.
+"""
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import upy  # noqa: E402
+
+upy.install()
+
+import uasyncio as asyncio  # noqa: E402
+from fakeclock import FakeClock  # noqa: E402
+from timesource import TimeSource, sntp_time_async  # noqa: E402
+
+START_US = 1700000000 * 1000000
+
+
+def reply(kind):
+    now = time.time() + 2208988800
+    msg = bytearray(48)
+    msg[0] = 0x24  # version 4, server mode
+    msg[1] = 2  # stratum
+    struct.pack_into("!II", msg, 40, int(now), int((now % 1) * 2 ** 32))
+    if kind == "kiss-of-death":
+        msg[1] = 0
+        msg[12:16] = b"RATE"
+        msg[40:48] = bytes(8)
+    elif kind == "short":
+        msg = msg[:40]
+    elif kind == "zero time":
+        msg[40:48] = bytes(8)
+    elif kind == "client mode":
+        msg[0] = 0x23
+    return msg
+
+
+def sntp_server(answer):
+    """UDP server answering with reply(answer[0])."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            data, addr = sock.recvfrom(48)
+            sock.sendto(reply(answer[0]), addr)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return sock.getsockname()[1]
+
+
+def replies(port, answer):
+    checks = []
+    for kind in ("good", "kiss-of-death", "short", "zero time", "client mode"):
+        answer[0] = kind
+        try:
+            us = asyncio.run(sntp_time_async("127.0.0.1", port))
+            outcome = "time" if abs(us / 1000000 - time.time()) < 5 else "wrong time"
+        except ValueError as e:
+            outcome = "ValueError"
+            print("  %s: %s" % (kind, e))
+        checks.append(("SNTP %s" % kind, outcome == ("time" if kind == "good" else "ValueError"), outcome))
+
+    # a kiss-of-death must leave the RTC alone, not set it to 1900
+    answer[0] = "kiss-of-death"
+    clock = FakeClock(0)
+    ts = TimeSource(clock=clock, sync_async=lambda: sntp_time_async("127.0.0.1", port), state_path="kod.json")
+    synced = asyncio.run(ts.ensure_async())
+    checks.append(("ensure_async() after a kiss-of-death", not synced and clock.now_us() == 0, clock.now_us()))
+    return checks
+
+
+def drift(rate, days=3):
+    """(worst RTC error, worst now_us() error once two syncs are in), in ms."""
+    clock = FakeClock(START_US, rate)
+    ts = TimeSource(clock=clock, sync=clock.sync, state_path="drift-%s.json" % rate)
+    rtc_worst = 0
+    corrected_worst = 0
+    for _ in range(days * 144):
+        clock.advance(600 * 1000000)
+        rtc_worst = max(rtc_worst, abs(clock.now_us() - clock.true_us))
+        ts.ensure()
+        if ts.syncs >= 2:
+            corrected_worst = max(corrected_worst, abs(ts.now_us() - clock.true_us))
+    return rtc_worst / 1000, corrected_worst / 1000
+
+
+def main():
+    os.chdir(tempfile.mkdtemp())
+    answer = ["good"]
+    checks = replies(sntp_server(answer), answer)
+    for rate in (1.00005, 0.99997):
+        rtc_ms, corrected_ms = drift(rate)
+        checks.append(("drift x%g: RTC off by a lot" % rate, rtc_ms > 500, "%.0f ms" % rtc_ms))
+        checks.append(("drift x%g: corrected within 10 ms" % rate, corrected_ms < 10, "%.1f ms" % corrected_ms))
+
+    failed = 0
+    for name, good, seen in checks:
+        failed += not good
+        print("%-42s %s  %s" % (name, "ok" if good else "FAILED", seen))
+    print("\n%d failed" % failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
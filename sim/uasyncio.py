@@ -0,0 +1,17 @@
+"""
+uasyncio stand-in: CPython's asyncio plus the sleep_ms() MicroPython has,
+and open_connection() going through the usocket host table.
+"""
+from asyncio import *  # noqa: F401,F403
+from asyncio import sleep
+import asyncio as _asyncio
+import usocket as _usocket
+
+
+def sleep_ms(ms):
+    return sleep(ms / 1000)
+
+
+def open_connection(host, port, **kw):
+    host, port = _usocket.route((host, port))
+    return _asyncio.open_connection(host, port, **kw)
@@ -0,0 +1 @@
+from json import dumps, loads, dump, load  # noqa: F401
@@ -0,0 +1,30 @@
+"""
+Make CPython look enough like MicroPython to run the code under py/.
+
+    import upy
+    upy.install()
+
+puts sim/ and py/ on sys.path (so usocket, ujson, ... resolve to the
+stand-ins next to this file) and adds the ticks_* / sleep_* helpers that
+MicroPython's time module has and CPython's lacks.
+"""
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+PY_DIR = os.path.join(os.path.dirname(SIM_DIR), "py")
+
+
+def install():
+    for path in (PY_DIR, SIM_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    if not hasattr(time, "ticks_ms"):
+        time.ticks_ms = lambda: int(time.monotonic() * 1000)
+        time.ticks_us = lambda: int(time.monotonic() * 1000000)
+        time.ticks_add = lambda ticks, delta: ticks + delta
+        time.ticks_diff = lambda new, old: new - old
+        time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+        time.sleep_us = lambda us: time.sleep(us / 1000000)
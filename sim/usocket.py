@@ -0,0 +1,101 @@
+"""
+usocket stand-in backed by real CPython sockets.
+
+MicroPython sockets are streams: write() takes str or bytes and sends it
+all, read()/readline()/readinto() behave like a buffered file. This
+wrapper gives a CPython socket the same surface.
+"""
+import socket as _socket
+
+AF_INET = _socket.AF_INET
+AF_INET6 = _socket.AF_INET6
+SOCK_STREAM = _socket.SOCK_STREAM
+SOCK_DGRAM = _socket.SOCK_DGRAM
+SOL_SOCKET = _socket.SOL_SOCKET
+SO_REUSEADDR = _socket.SO_REUSEADDR
+
+
+# (host, port) -> (host, port) it is served at here, like /etc/hosts
+# with ports: e.g. pool.ntp.org:123 answered by a local responder. Names
+# are mapped when looked up, addresses (the CouchDB LAN IP, which is
+# never looked up) when connected or sent to.
+hosts = {}
+
+
+def route(addr):
+    return hosts.get(tuple(addr), addr)
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    host, port = route((host, port))
+    return _socket.getaddrinfo(host, port, af, type, proto, flags)
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, sock=None):
+        self._sock = sock if sock is not None else _socket.socket(af, type, proto)
+        self._file = None
+
+    def _reader(self):
+        if self._file is None:
+            self._file = self._sock.makefile("rb")
+        return self._file
+
+    def settimeout(self, timeout):
+        self._sock.settimeout(timeout)
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def setsockopt(self, level, opt, value):
+        self._sock.setsockopt(level, opt, value)
+
+    def connect(self, addr):
+        self._sock.connect(route(addr))
+
+    def bind(self, addr):
+        self._sock.bind(addr)
+
+    def listen(self, backlog=5):
+        self._sock.listen(backlog)
+
+    def accept(self):
+        conn, addr = self._sock.accept()
+        return socket(sock=conn), addr
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self._sock.sendall(data)
+        return len(data)
+
+    send = write
+
+    def sendto(self, data, addr):
+        return self._sock.sendto(data, route(addr))
+
+    def recv(self, n):
+        return self._sock.recv(n)
+
+    def recvfrom(self, n):
+        return self._sock.recvfrom(n)
+
+    def read(self, n=-1):
+        return self._reader().read(n)
+
+    def readline(self):
+        return self._reader().readline()
+
+    def readinto(self, buf, nbytes=None):
+        if nbytes is not None:
+            buf = memoryview(buf)[:nbytes]
+        return self._reader().readinto(buf)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._sock.close()
@@ -0,0 +1,58 @@
+"""
+ussl stand-in on CPython's ssl: wrap_socket() as MicroPython has always
+had it, and SSLContext as newer ports have it. Like MicroPython, no TLS
+sessions: wrap_socket() takes no session= and the sockets have no
+session / session_reused.
+
+The sockets it returns are usocket sockets, so they read and write the
+same way as plain ones. key and cert are file names here, not bytes.
+"""
+import ssl as _ssl
+import usocket
+
+PROTOCOL_TLS_CLIENT = _ssl.PROTOCOL_TLS_CLIENT
+PROTOCOL_TLS_SERVER = _ssl.PROTOCOL_TLS_SERVER
+CERT_NONE = _ssl.CERT_NONE
+CERT_OPTIONAL = _ssl.CERT_OPTIONAL
+CERT_REQUIRED = _ssl.CERT_REQUIRED
+
+
+class SSLContext:
+    def __init__(self, protocol):
+        self._ctx = _ssl.SSLContext(protocol)
+
+    @property
+    def verify_mode(self):
+        return self._ctx.verify_mode
+
+    @verify_mode.setter
+    def verify_mode(self, mode):
+        # MicroPython has no separate hostname check to switch off first
+        if mode == CERT_NONE:
+            self._ctx.check_hostname = False
+        self._ctx.verify_mode = mode
+
+    def load_verify_locations(self, cafile=None, cadata=None):
+        self._ctx.load_verify_locations(cafile=cafile, cadata=cadata)
+
+    def load_cert_chain(self, certfile, keyfile):
+        self._ctx.load_cert_chain(certfile, keyfile)
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, server_hostname=None):
+        tls = self._ctx.wrap_socket(
+            sock._sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            server_hostname=server_hostname,
+        )
+        return usocket.socket(sock=tls)
+
+
+def wrap_socket(sock, server_side=False, key=None, cert=None, cert_reqs=CERT_NONE, cadata=None, server_hostname=None):
+    ctx = SSLContext(PROTOCOL_TLS_SERVER if server_side else PROTOCOL_TLS_CLIENT)
+    ctx.verify_mode = cert_reqs
+    if cadata is not None:
+        ctx.load_verify_locations(cadata=cadata)
+    if cert is not None:
+        ctx.load_cert_chain(cert, key)
+    return ctx.wrap_socket(sock, server_side=server_side, server_hostname=server_hostname)
@@ -0,0 +1,75 @@
+"""
+Precompile the modules under py/ to .mpy bytecode for the board.
+
+    pip install mpy-cross==1.19.1       # must match the firmware version
+    python tools/build_mpy.py           # writes build/mpy/
+    mpremote cp build/mpy/*.mpy :       # plus py/boot.py as source
+
+A .mpy skips parsing and compiling on import, which on the ESP32 is most
+of a module's import time and a large transient heap spike, see
+bench/bench_imports.py. boot.py stays a .py: MicroPython only runs
+boot.py/main.py from source.
+
+To go further the same list can be frozen into a custom firmware build
+with a manifest.py containing freeze("py", MODULES).
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "py")
+OUT = os.path.join(ROOT, "build", "mpy")
+
+MODULES = (
+    "mysht30.py",
+    "sensorbus.py",
+    "sampler.py",
+    "readinglog.py",
+    "uploader.py",
+    "timesource.py",
+    "scheduler.py",
+    "tracer.py",
+    "wake.py",
+    "packed.py",
+    "wifi.py",
+    "dnscache.py",
+    "deadline.py",
+    "tlscache.py",
+    "auth_urequests.py",
+    "async_urequests.py",
+    "jsonpull.py",
+)
+
+
+def mpy_cross():
+    exe = shutil.which("mpy-cross")
+    if exe:
+        return [exe]
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        sys.exit("mpy-cross not found, pip install mpy-cross matching the firmware version")
+    return [sys.executable, "-m", "mpy_cross"]
+
+
+def main():
+    cmd = mpy_cross()
+    os.makedirs(OUT, exist_ok=True)
+    total_py = total_mpy = 0
+    for name in MODULES:
+        src = os.path.join(SRC, name)
+        dst = os.path.join(OUT, name[:-3] + ".mpy")
+        # -s keeps tracebacks pointing at the module rather than a build path
+        subprocess.check_call(cmd + ["-march=xtensawin", "-s", name, "-o", dst, src])
+        py_size = os.path.getsize(src)
+        mpy_size = os.path.getsize(dst)
+        total_py += py_size
+        total_mpy += mpy_size
+        print("%-20s %6d -> %6d bytes" % (name, py_size, mpy_size))
+    print("%-20s %6d -> %6d bytes" % ("total", total_py, total_mpy))
+
+
+if __name__ == "__main__":
+    main()